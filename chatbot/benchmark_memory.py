@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import sys
+
+import google.generativeai as genai
+
+from config import settings
+from database import connect_to_mongo, close_mongo_connection, get_mongo_db
+from models import ChatHistory, ChatContext, ConversationMemory
+from services import ChatService, SYSTEM_PROMPT_ROUTER, MEMORY_SUMMARY_WORDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Giả lập bản tóm tắt cuốn chiếu đã đầy (trường hợp xấu nhất về độ dài)
+FULL_SUMMARY_PLACEHOLDER = " ".join(["từ"] * MEMORY_SUMMARY_WORDS)
+
+def _legacy_router_prompt(query: str, history: list, context: ChatContext) -> str:
+    chronological_history = list(reversed(history))
+    history_txt = "\n".join([f"User: {h.query}\nBot: {h.answer}" for h in chronological_history])
+    return (
+        f"{SYSTEM_PROMPT_ROUTER}\n\n"
+        f"--- RUNTIME DATA ---\n"
+        f"Context Page: {context.current_page}\n"
+        f"Chat History:\n{history_txt}\n"
+        f"Current Query: {query}\n"
+    )
+
+def _memory_router_prompt(query: str, memory: ConversationMemory, context: ChatContext) -> str:
+    return (
+        f"{SYSTEM_PROMPT_ROUTER}\n\n"
+        f"--- RUNTIME DATA ---\n"
+        f"Context Page: {context.current_page}\n"
+        f"Conversation Memory:\n{ChatService._format_memory(memory)}\n"
+        f"Current Query: {query}\n"
+    )
+
+async def benchmark_conversation(conversation_id: str):
+    """
+    Phát lại một hội thoại đã lưu và đếm số token prompt Router mỗi lượt:
+    lịch sử thô (5 cặp Q&A gần nhất) so với bộ nhớ rút gọn (tóm tắt + câu hỏi cuối + nguồn).
+    """
+    genai.configure(api_key=settings.google_api_key)
+    model = genai.GenerativeModel('gemini-2.5-flash')
+
+    await connect_to_mongo()
+    db = get_mongo_db()
+    docs = await db['chat_histories'].find({"conversation_id": conversation_id}).sort("created_at", 1).to_list(length=None)
+    if not docs:
+        print(f"❌ Không tìm thấy hội thoại {conversation_id}")
+        await close_mongo_connection()
+        return
+
+    turns = [ChatHistory(**d) for d in docs]
+    context = ChatContext()
+    print(f"\n--- ROUTER PROMPT TOKENS: {conversation_id} ({len(turns)} lượt) ---")
+    print(f"{'Turn':>4} | {'Legacy':>8} | {'Memory':>8} | {'Saved':>8}")
+
+    total_legacy = total_memory = 0
+    for i, turn in enumerate(turns):
+        history = list(reversed(turns[max(0, i - 5):i]))
+        memory = ConversationMemory(
+            summary=FULL_SUMMARY_PLACEHOLDER if i else "",
+            last_query=turns[i - 1].query if i else None,
+            sources=turns[i - 1].sources if i else [],
+            turns=i
+        )
+        legacy_tokens = model.count_tokens(_legacy_router_prompt(turn.query, history, context)).total_tokens
+        memory_tokens = model.count_tokens(_memory_router_prompt(turn.query, memory, context)).total_tokens
+        total_legacy += legacy_tokens; total_memory += memory_tokens
+        print(f"{i + 1:>4} | {legacy_tokens:>8} | {memory_tokens:>8} | {legacy_tokens - memory_tokens:>8}")
+
+    print(f"TOTAL | {total_legacy:>8} | {total_memory:>8} | {total_legacy - total_memory:>8}")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python benchmark_memory.py <conversation_id>")
+        sys.exit(1)
+    asyncio.run(benchmark_conversation(sys.argv[1]))
@@ -0,0 +1,79 @@
+import json
+import logging
+import statistics
+import sys
+import time
+
+import google.generativeai as genai
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from config import settings
+from services import RENDER_PAYLOAD_SELECTOR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "Giá vàng hôm nay",
+    "Lãi suất ngân hàng tháng này",
+    "Thị trường chứng khoán tuần qua",
+    "Tóm tắt tài liệu của tôi",
+    "Xuất khẩu gạo năm nay",
+]
+LIMIT = 10
+ROUNDS = 5
+
+def _payload_bytes(points) -> int:
+    return sum(len(json.dumps(p.payload or {}, ensure_ascii=False, default=str).encode("utf-8")) for p in points)
+
+def _run(client: QdrantClient, vector, query_filter, with_payload):
+    t0 = time.perf_counter()
+    points = client.search(
+        collection_name=settings.qdrant_collection_name,
+        query_vector=vector,
+        query_filter=query_filter,
+        limit=LIMIT,
+        with_payload=with_payload,
+        with_vectors=False
+    )
+    return (time.perf_counter() - t0) * 1000, _payload_bytes(points)
+
+def benchmark_payload_projection(queries):
+    """
+    So sánh payload đầy đủ (with_payload=True) với payload rút gọn (RENDER_PAYLOAD_SELECTOR)
+    cho cùng một vector truy vấn: số byte payload và độ trễ Qdrant mỗi query.
+    """
+    genai.configure(api_key=settings.google_api_key)
+    client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
+
+    scenarios = {
+        "chunk": rest.Filter(must=[rest.FieldCondition(key="type", match=rest.MatchValue(value="chunk"))]),
+        "my_page": rest.Filter(must=[rest.FieldCondition(key="type", match=rest.MatchValue(value="my_page"))]),
+    }
+
+    print(f"\n--- PAYLOAD PROJECTION BENCHMARK: {settings.qdrant_collection_name} (limit={LIMIT}, rounds={ROUNDS}) ---")
+    for name, query_filter in scenarios.items():
+        full_ms, slim_ms, full_bytes, slim_bytes = [], [], [], []
+        for query in queries:
+            vector = genai.embed_content(
+                model='models/text-embedding-004', content=query,
+                task_type="retrieval_query", output_dimensionality=384
+            )['embedding']
+            for _ in range(ROUNDS):
+                ms, size = _run(client, vector, query_filter, True)
+                full_ms.append(ms); full_bytes.append(size)
+                ms, size = _run(client, vector, query_filter, RENDER_PAYLOAD_SELECTOR)
+                slim_ms.append(ms); slim_bytes.append(size)
+
+        if not any(full_bytes):
+            print(f"[{name}] Không có điểm dữ liệu phù hợp, bỏ qua.")
+            continue
+
+        avg_full_b = statistics.mean(full_bytes); avg_slim_b = statistics.mean(slim_bytes)
+        p50_full = statistics.median(full_ms); p50_slim = statistics.median(slim_ms)
+        print(f"[{name}] Bytes/query: full={avg_full_b:,.0f} | slim={avg_slim_b:,.0f} | saved={avg_full_b - avg_slim_b:,.0f} ({(1 - avg_slim_b / avg_full_b) * 100:.1f}%)")
+        print(f"[{name}] Latency p50 (ms): full={p50_full:.1f} | slim={p50_slim:.1f} | saved={p50_full - p50_slim:.1f}")
+
+if __name__ == "__main__":
+    benchmark_payload_projection(sys.argv[1:] or DEFAULT_QUERIES)
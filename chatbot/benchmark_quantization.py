@@ -0,0 +1,95 @@
+import logging
+import statistics
+import sys
+import time
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from config import settings
+from qdrant_config import QUANTIZATION_PROFILES, VECTOR_SIZE, build_collection_params, build_search_params
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 5000
+QUERY_COUNT = 100
+TOP_K = 10
+UPSERT_BATCH = 256
+
+# Byte/vector nằm trên RAM theo profile (vector gốc của scalar/binary nằm trên đĩa)
+RAM_BYTES_PER_VECTOR = {
+    "float32": 4 * VECTOR_SIZE,
+    "scalar": VECTOR_SIZE,
+    "binary": VECTOR_SIZE // 8,
+}
+
+def _sample_points(client: QdrantClient, limit: int):
+    points, offset = [], None
+    while len(points) < limit:
+        batch, offset = client.scroll(
+            collection_name=settings.qdrant_collection_name,
+            limit=min(256, limit - len(points)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True
+        )
+        points.extend(p for p in batch if p.vector)
+        if offset is None:
+            break
+    return points
+
+def _build_temp_collection(client: QdrantClient, name: str, profile: str, points):
+    client.recreate_collection(collection_name=name, **build_collection_params(profile))
+    for i in range(0, len(points), UPSERT_BATCH):
+        client.upsert(
+            collection_name=name,
+            points=[rest.PointStruct(id=p.id, vector=p.vector) for p in points[i:i + UPSERT_BATCH]],
+            wait=True
+        )
+
+def benchmark_quantization(sample_size: int):
+    """
+    Lấy mẫu vector thật từ collection chính, dựng collection tạm cho từng profile
+    (float32 / scalar / binary) và đo recall@k so với exact search, độ trễ p50 và RAM ước tính.
+    """
+    client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
+    points = _sample_points(client, sample_size)
+    if len(points) < TOP_K:
+        print("❌ Không đủ điểm dữ liệu để benchmark.")
+        return
+
+    queries = [p.vector for p in points[:QUERY_COUNT]]
+    print(f"\n--- QUANTIZATION BENCHMARK: {len(points)} vectors, {len(queries)} queries, k={TOP_K} ---")
+
+    for profile in QUANTIZATION_PROFILES:
+        name = f"{settings.qdrant_collection_name}_bench_{profile}"
+        try:
+            _build_temp_collection(client, name, profile, points)
+            search_params = build_search_params(profile)
+
+            recalls, latencies = [], []
+            for vector in queries:
+                exact = client.search(
+                    collection_name=name, query_vector=vector, limit=TOP_K,
+                    search_params=rest.SearchParams(exact=True), with_payload=False
+                )
+                t0 = time.perf_counter()
+                approx = client.search(
+                    collection_name=name, query_vector=vector, limit=TOP_K,
+                    search_params=search_params, with_payload=False
+                )
+                latencies.append((time.perf_counter() - t0) * 1000)
+                truth = {p.id for p in exact}
+                recalls.append(len(truth & {p.id for p in approx}) / len(truth))
+
+            ram_mb = RAM_BYTES_PER_VECTOR[profile] * len(points) / (1024 * 1024)
+            print(
+                f"[{profile:<7}] recall@{TOP_K}={statistics.mean(recalls):.3f} "
+                f"p50={statistics.median(latencies):.1f}ms vector_ram≈{ram_mb:.1f}MB"
+            )
+        finally:
+            client.delete_collection(collection_name=name)
+
+if __name__ == "__main__":
+    benchmark_quantization(int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE_SIZE)
@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from database import connect_to_mongo, close_mongo_connection
+from models import ChatContext, ChatRequest, ConversationMemory
+from services import ChatService
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_FIXTURES = os.path.join(BENCHMARK_DIR, "retrieval_fixtures.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "retrieval_baseline.json")
+
+# Cách chạy:
+#   1. Gắn nhãn fixture trên dữ liệu THẬT của môi trường (article_id/search_id phụ thuộc Mongo/Qdrant đang chạy):
+#      cp benchmarks/retrieval_fixtures.example.json benchmarks/retrieval_fixtures.json  # rồi điền id thật
+#   2. Ghi baseline một lần:      python benchmark_retrieval.py --update-baseline
+#   3. Mỗi lần đổi retrieval/CI:  python benchmark_retrieval.py             # exit 1 nếu hồi quy, 2 nếu thiếu fixture/baseline
+#      Chỉ so sánh file kết quả có sẵn (không cần Mongo/Qdrant):  python benchmark_retrieval.py --check benchmarks/retrieval_results.json
+
+# Ngưỡng hồi quy: recall/MRR giảm quá RECALL_TOLERANCE hoặc p50 chậm hơn LATENCY_TOLERANCE (tỉ lệ) -> FAIL
+RECALL_TOLERANCE = 0.02
+LATENCY_TOLERANCE = 0.25
+
+def _normalize_strategy(strategy: str) -> str:
+    """'My Page (UpdateID: abc)' -> 'My Page (UpdateID)' để gom nhóm theo chiến lược."""
+    return re.sub(r":[^)]*", "", strategy)
+
+def _ranked_article_ids(points) -> List[str]:
+    ranked = []
+    for pt in points:
+        payload = pt.payload or {}
+        aid = payload.get("article_id") or payload.get("metadata", {}).get("article_id")
+        if aid and str(aid) not in ranked:
+            ranked.append(str(aid))
+    return ranked
+
+def _recall_at_k(ranked: List[str], expected: List[str], k: int) -> float:
+    if not expected:
+        return 1.0
+    return len(set(ranked[:k]) & set(expected)) / len(set(expected))
+
+def _reciprocal_rank(ranked: List[str], expected: List[str]) -> float:
+    for rank, aid in enumerate(ranked, start=1):
+        if aid in expected:
+            return 1.0 / rank
+    return 0.0
+
+async def _run_case(service: ChatService, entry: Dict[str, Any], case: Dict[str, Any], k: int) -> Dict[str, Any]:
+    request = ChatRequest(
+        user_id=entry.get("user_id", "benchmark"),
+        query=entry["query"],
+        context=ChatContext(**case["context"])
+    )
+
+    # Bỏ qua LLM Router nếu fixture đã gán sẵn 'analysis' (kết quả ổn định, lặp lại được).
+    if "analysis" in entry:
+        analysis = json.loads(json.dumps(entry["analysis"]))
+        plan = await service._plan_retrieval(request, "benchmark", ConversationMemory(), analysis, {})
+    else:
+        plan = await service._plan_chat(request)
+
+    t0 = time.perf_counter()
+    results = await service._retrieve(request, plan)
+    latency_ms = (time.perf_counter() - t0) * 1000
+
+    ranked = _ranked_article_ids(results)
+    expected = [str(a) for a in case.get("expected_article_ids", [])]
+    return {
+        "id": entry.get("id", entry["query"]),
+        "page": request.context.current_page,
+        "strategy": _normalize_strategy(plan["strategy"]),
+        "tiers": plan["tiers"],
+        "latency_ms": latency_ms,
+        f"recall@{k}": _recall_at_k(ranked, expected, k),
+        "mrr": _reciprocal_rank(ranked, expected),
+    }
+
+def _aggregate(rows: List[Dict[str, Any]], k: int) -> Dict[str, Dict[str, Any]]:
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row["strategy"]].append(row)
+
+    summary = {}
+    for strategy, items in sorted(grouped.items()):
+        latencies = sorted(r["latency_ms"] for r in items)
+        summary[strategy] = {
+            "cases": len(items),
+            f"recall@{k}": round(statistics.mean(r[f"recall@{k}"] for r in items), 4),
+            "mrr": round(statistics.mean(r["mrr"] for r in items), 4),
+            "avg_tiers": round(statistics.mean(r["tiers"] for r in items), 2),
+            "latency_p50_ms": round(statistics.median(latencies), 1),
+            "latency_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        }
+    return summary
+
+def _check_regressions(summary: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], k: int) -> List[str]:
+    """Chiến lược/chỉ số có trong baseline mà lần chạy này thiếu (crash, đổi k...) cũng tính là FAIL."""
+    failures = []
+    for strategy, base in baseline.items():
+        current = summary.get(strategy)
+        if not current:
+            failures.append(f"{strategy}: không có trong kết quả (baseline có {base.get('cases', '?')} case)")
+            continue
+        for metric in (f"recall@{k}", "mrr", "latency_p50_ms"):
+            if metric not in base or metric not in current:
+                failures.append(f"{strategy}: thiếu chỉ số {metric} ({'baseline' if metric not in base else 'kết quả'})")
+        for metric in (f"recall@{k}", "mrr"):
+            if metric in base and metric in current and current[metric] < base[metric] - RECALL_TOLERANCE:
+                failures.append(f"{strategy}: {metric} {base[metric]} -> {current[metric]}")
+        if "latency_p50_ms" in base and "latency_p50_ms" in current \
+                and current["latency_p50_ms"] > base["latency_p50_ms"] * (1 + LATENCY_TOLERANCE):
+            failures.append(f"{strategy}: latency_p50_ms {base['latency_p50_ms']} -> {current['latency_p50_ms']}")
+    return failures
+
+def check_against_baseline(summary: Dict[str, Dict[str, Any]], baseline_path: str, k: int) -> int:
+    """0 = đạt, 1 = hồi quy, 2 = chưa có baseline (không coi là đạt để CI không xanh nhầm)."""
+    if not os.path.exists(baseline_path):
+        print(f"❌ Chưa có baseline: {baseline_path} (chạy với --update-baseline trên dữ liệu đã gắn nhãn)")
+        return 2
+    with open(baseline_path, encoding="utf-8") as f:
+        failures = _check_regressions(summary, json.load(f), k)
+    if failures:
+        print("❌ REGRESSION:")
+        for line in failures:
+            print(f"  - {line}")
+        return 1
+    print("✅ Không có hồi quy so với baseline.")
+    return 0
+
+def check_results_file(results_path: str, baseline_path: str) -> int:
+    """So sánh một file kết quả đã lưu (--output của lần chạy trước) với baseline, không cần kết nối dịch vụ."""
+    if not os.path.exists(results_path):
+        print(f"❌ Không tìm thấy file kết quả: {results_path}")
+        return 2
+    with open(results_path, encoding="utf-8") as f:
+        report = json.load(f)
+    return check_against_baseline(report["strategies"], baseline_path, report.get("k", 5))
+
+async def run_benchmark(fixtures_path: str, output_path: str, baseline_path: str, update_baseline: bool, repeat: int) -> int:
+    """
+    Chạy từng case của fixture qua _plan_retrieval/_retrieve (KHÔNG gọi LLM trả lời),
+    tổng hợp recall@k, MRR, số tầng fallback và độ trễ theo chiến lược, so sánh với baseline.
+    """
+    if not os.path.exists(fixtures_path):
+        print(f"❌ Không tìm thấy fixture: {fixtures_path} (xem benchmarks/retrieval_fixtures.example.json)")
+        return 2
+
+    with open(fixtures_path, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    k = fixtures.get("k", 5)
+
+    await connect_to_mongo()
+    service = ChatService()
+
+    rows = []
+    for entry in fixtures["entries"]:
+        for case in entry["cases"]:
+            for _ in range(repeat):
+                rows.append(await _run_case(service, entry, case, k))
+
+    await close_mongo_connection()
+
+    summary = _aggregate(rows, k)
+    report = {"k": k, "repeat": repeat, "strategies": summary, "cases": rows}
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n--- RETRIEVAL BENCHMARK (k={k}, {len(rows)} runs) ---")
+    for strategy, m in summary.items():
+        print(
+            f"{strategy:<45} n={m['cases']:<3} recall@{k}={m[f'recall@{k}']:.3f} mrr={m['mrr']:.3f} "
+            f"tiers={m['avg_tiers']:.2f} p50={m['latency_p50_ms']:.1f}ms p95={m['latency_p95_ms']:.1f}ms"
+        )
+    print(f"Kết quả đã lưu: {output_path}")
+
+    if update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Đã cập nhật baseline: {baseline_path}")
+        return 0
+
+    return check_against_baseline(summary, baseline_path, k)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chất lượng & độ trễ retrieval của ChatService.")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--output", default=os.path.join(BENCHMARK_DIR, "retrieval_results.json"))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi case (để đo độ trễ ổn định).")
+    parser.add_argument("--check", metavar="RESULTS", help="Chỉ so sánh file kết quả đã lưu với baseline rồi thoát.")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(check_results_file(args.check, args.baseline))
+    sys.exit(asyncio.run(run_benchmark(args.fixtures, args.output, args.baseline, args.update_baseline, args.repeat)))
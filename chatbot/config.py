@@ -15,6 +15,20 @@ class Settings(BaseSettings):
     qdrant_api_key: str = os.getenv("QDRANT_API_KEY")
     qdrant_collection_name: str = os.getenv("QDRANT_COLLECTION_NAME")
 
+    # [NEW] Lượng tử hóa & phân tầng bộ nhớ: "float32" | "scalar" (int8) | "binary"
+    qdrant_quantization: str = os.getenv("QDRANT_QUANTIZATION", "float32")
+    # "auto" = vector gốc nằm trên đĩa khi đã bật lượng tử hóa (bản lượng tử nằm trên RAM)
+    qdrant_on_disk_vectors: str = os.getenv("QDRANT_ON_DISK_VECTORS", "auto")
+    qdrant_on_disk_payload: bool = os.getenv("QDRANT_ON_DISK_PAYLOAD", "true") == "true"
+    qdrant_hnsw_m: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    qdrant_hnsw_ef_construct: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    # [NEW] HNSW riêng cho từng tenant (user_id) -> lọc my_page không phụ thuộc kích thước kho tin tức
+    qdrant_hnsw_payload_m: int = int(os.getenv("QDRANT_HNSW_PAYLOAD_M", "16"))
+    # Tham số lúc search (0 = để Qdrant tự chọn)
+    qdrant_hnsw_ef: int = int(os.getenv("QDRANT_HNSW_EF", "0"))
+    qdrant_rescore: bool = os.getenv("QDRANT_RESCORE", "true") == "true"
+    qdrant_oversampling: float = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 import logging
 from typing import Optional
 import uvicorn
-from models import ChatRequest, ChatResponse
+from models import ChatRequest, ChatResponse, ChatBatchRequest
 from services import ChatService
 from database import connect_to_mongo, close_mongo_connection
 
@@ -50,6 +51,21 @@ async def chat_endpoint(request: ChatRequest):
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/batch")
+async def chat_batch_endpoint(request: ChatBatchRequest):
+    """
+    Endpoint chat hàng loạt. Embed tất cả câu hỏi trong 1 lần, gom truy vấn Qdrant thành batch,
+    sinh câu trả lời song song có giới hạn và stream từng kết quả (NDJSON) ngay khi xong.
+    """
+    if not chat_service:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    async def stream_results():
+        async for item in chat_service.handle_chat_batch(request.requests, request.max_concurrency):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.get("/health")
 def health_check():
     return {"status": "ok", "mode": "read-only", "version": "2.1.0"}
@@ -60,4 +60,31 @@ class ChatResponse(BaseModel):
     sources: List[SourcedAnswer] = Field(default=[], description="Danh sách nguồn tham khảo.")
     intent_detected: Optional[str] = Field(None, description="Loại ý định hệ thống phát hiện.")
     dependency_label: Optional[str] = Field(None, description="Nhãn câu hỏi (main/sub).")
-    strategy_used: Optional[str] = Field(None, description="Chiến lược RAG đã dùng.")
\ No newline at end of file
+    strategy_used: Optional[str] = Field(None, description="Chiến lược RAG đã dùng.")
+
+class ConversationMemory(BaseModel):
+    """
+    Bộ nhớ hội thoại rút gọn (kích thước cố định) cho mỗi conversation_id.
+    Thay thế việc nhồi toàn bộ lịch sử Q&A vào prompt Router/Answer.
+    """
+    summary: str = Field("", description="Tóm tắt cuốn chiếu của toàn bộ hội thoại (sinh bất đồng bộ sau mỗi lượt).")
+    last_query: Optional[str] = Field(None, description="Câu hỏi gần nhất của người dùng (nguyên văn).")
+    last_main_query: Optional[str] = Field(None, description="Câu hỏi chính (main) gần nhất, dùng để ghép câu hỏi phụ.")
+    sources: List[SourcedAnswer] = Field(default=[], description="Danh sách nguồn của câu trả lời gần nhất.")
+    turns: int = Field(0, description="Số lượt hỏi-đáp đã ghi nhận.")
+
+class ChatBatchRequest(BaseModel):
+    """
+    Yêu cầu chat hàng loạt (đánh giá định kỳ / job phân tích).
+    """
+    requests: List[ChatRequest] = Field(..., min_length=1, max_length=500, description="Danh sách yêu cầu chat.")
+    max_concurrency: int = Field(4, ge=1, le=32, description="Số câu hỏi được sinh câu trả lời song song tối đa.")
+
+class ChatBatchItem(BaseModel):
+    """
+    Kết quả của một item trong batch (stream về dạng NDJSON ngay khi hoàn tất).
+    """
+    index: int = Field(..., description="Vị trí của yêu cầu trong danh sách đầu vào.")
+    response: Optional[ChatResponse] = Field(None, description="Phản hồi chat (nếu thành công).")
+    error: Optional[str] = Field(None, description="Thông báo lỗi (nếu thất bại).")
+    warning: Optional[str] = Field(None, description="Item thành công nhưng phải đi đường dự phòng (vd: batch embedding lỗi).")
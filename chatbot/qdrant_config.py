@@ -0,0 +1,64 @@
+from typing import Optional, Dict, Any
+
+from qdrant_client.http import models as rest
+
+from config import settings
+
+VECTOR_SIZE = 384
+
+# Mỗi profile: cách lưu vector gốc + bản lượng tử hóa giữ trên RAM
+QUANTIZATION_PROFILES = ("float32", "scalar", "binary")
+
+def build_quantization_config(profile: str) -> Optional[rest.QuantizationConfig]:
+    if profile == "scalar":
+        return rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile == "binary":
+        return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def resolve_on_disk_vectors(profile: str) -> bool:
+    if settings.qdrant_on_disk_vectors == "auto":
+        return profile != "float32"
+    return settings.qdrant_on_disk_vectors == "true"
+
+def build_hnsw_config() -> rest.HnswConfigDiff:
+    """HNSW toàn cục (m) + HNSW riêng cho từng tenant user_id (payload_m)."""
+    return rest.HnswConfigDiff(
+        m=settings.qdrant_hnsw_m,
+        ef_construct=settings.qdrant_hnsw_ef_construct,
+        payload_m=settings.qdrant_hnsw_payload_m
+    )
+
+def build_collection_params(profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Tham số create_collection cho một profile bộ nhớ:
+    - float32: vector gốc trên RAM (mặc định cũ).
+    - scalar: int8 trên RAM (~4x nhỏ hơn), vector gốc trên đĩa để rescoring.
+    - binary: 1 bit/chiều trên RAM (~32x nhỏ hơn), vector gốc trên đĩa để rescoring.
+    """
+    profile = profile or settings.qdrant_quantization
+    if profile not in QUANTIZATION_PROFILES:
+        raise ValueError(f"Profile lượng tử hóa không hợp lệ: {profile}")
+    return {
+        "vectors_config": rest.VectorParams(
+            size=VECTOR_SIZE, distance=rest.Distance.COSINE, on_disk=resolve_on_disk_vectors(profile)
+        ),
+        "hnsw_config": build_hnsw_config(),
+        "quantization_config": build_quantization_config(profile),
+        "on_disk_payload": settings.qdrant_on_disk_payload,
+    }
+
+def build_search_params(profile: Optional[str] = None) -> Optional[rest.SearchParams]:
+    """Tham số lúc search: hnsw_ef + rescoring/oversampling khi collection đã lượng tử hóa."""
+    profile = profile or settings.qdrant_quantization
+    quantization = None
+    if profile != "float32":
+        quantization = rest.QuantizationSearchParams(
+            rescore=settings.qdrant_rescore, oversampling=settings.qdrant_oversampling
+        )
+    hnsw_ef = settings.qdrant_hnsw_ef or None
+    if not hnsw_ef and not quantization:
+        return None
+    return rest.SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
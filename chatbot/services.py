@@ -2,10 +2,11 @@ import logging
 import uuid
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, AsyncIterator
 from collections import defaultdict
 import json
 import re
+import unicodedata
 
 import google.generativeai as genai
 from qdrant_client import QdrantClient
@@ -15,7 +16,8 @@ from pymongo import DESCENDING, ASCENDING
 
 from config import settings
 from database import get_mongo_db
-from models import ChatRequest, ChatResponse, ChatHistory, SourcedAnswer, ChatContext
+from qdrant_config import build_search_params
+from models import ChatRequest, ChatResponse, ChatHistory, SourcedAnswer, ChatContext, ConversationMemory, ChatBatchItem
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +28,7 @@ Bạn là AI Query Router. Nhiệm vụ: Phân tích ngữ cảnh và câu hỏi
 --- INPUT DATA ---
 1. Context Page: "home_page" | "list_page" | "detail_page" | "my_page"
 2. Query: Câu hỏi user.
-3. Chat History: Lịch sử.
+3. Conversation Memory: Tóm tắt hội thoại + câu hỏi gần nhất + danh sách nguồn gần nhất.
 
 --- PHÂN TÍCH ---
 1. XÁC ĐỊNH DEPENDENCY (Sự phụ thuộc):
@@ -77,10 +79,54 @@ OUTPUT JSON:
 SYSTEM_PROMPT_CHAT = (
     "Bạn là trợ lý AI thông minh. Trả lời dựa trên thông tin cung cấp.\n"
     "LƯU Ý QUAN TRỌNG:\n"
-    "- Nếu câu hỏi là câu phụ (Sub-question) hoặc tham chiếu số thứ tự (ví dụ: 'bài 1', 'tin đầu tiên', 'phần 1'), hãy CĂN CỨ VÀO LỊCH SỬ CHAT (câu trả lời trước của Bot) để xác định chính xác bài báo đang được nhắc đến.\n"
+    "- Nếu câu hỏi là câu phụ (Sub-question) hoặc tham chiếu số thứ tự (ví dụ: 'bài 1', 'tin đầu tiên', 'phần 1'), hãy CĂN CỨ VÀO BỘ NHỚ HỘI THOẠI (danh sách nguồn của câu trả lời trước) để xác định chính xác bài báo đang được nhắc đến.\n"
     "- Luôn trích dẫn nguồn (Source) cho mọi thông tin đưa ra, mỗi bài báo chỉ trích dẫn nguồn 1 lần duy nhất."
 )
 
+# [NEW] Prompt sinh tóm tắt cuốn chiếu cho bộ nhớ hội thoại
+MEMORY_SUMMARY_WORDS = 120
+MEMORY_ANSWER_CHARS = 1500
+# Số lần thử lại khi bản tóm tắt bị replica/task khác cập nhật trong lúc đang sinh
+MEMORY_SUMMARY_RETRIES = 3
+SYSTEM_PROMPT_MEMORY = (
+    "Bạn là bộ nhớ hội thoại. Cập nhật bản tóm tắt hội thoại dựa trên tóm tắt cũ và lượt hỏi-đáp mới.\n"
+    "- Giữ lại: chủ đề đang bàn, các thực thể/bài báo được nhắc tới, bộ lọc người dùng đã dùng (website, thời gian, chủ đề, cảm xúc), kết luận chính.\n"
+    "- Bỏ qua: câu chữ trùng lặp, trích dẫn nguồn chi tiết.\n"
+    f"- Tối đa {MEMORY_SUMMARY_WORDS} từ, viết tiếng Việt, chỉ trả về nội dung tóm tắt."
+)
+
+# [NEW] Chỉ lấy các trường payload thực sự được render vào prompt.
+# Điểm my_page chứa toàn bộ 'content' trong từng chunk, điểm thường chứa mảng search_id... -> bỏ qua.
+RENDER_PAYLOAD_FIELDS = [
+    "type", "text", "summary_text", "title", "article_id", "metadata.article_id",
+    "publish_date", "topic", "site_categories",
+    "ai_sentiment_label", "ai_sentiment_score", "sentiment",
+]
+RENDER_PAYLOAD_SELECTOR = rest.PayloadSelectorInclude(include=RENDER_PAYLOAD_FIELDS)
+
+# [NEW] Bộ lọc trên trường chuẩn hóa (topic_norm / sentiment_norm) do crawler ghi lúc ingest.
+# Phải khớp với crawler/utils.py: normalize_keyword & SENTIMENT_NORM_LABELS.
+SENTIMENT_NORM_LABELS = {
+    "tich cuc": "positive", "positive": "positive",
+    "tieu cuc": "negative", "negative": "negative",
+    "trung tinh": "neutral", "neutral": "neutral",
+}
+
+def normalize_keyword(value: str) -> str:
+    """Unicode NFKD, bỏ dấu (kể cả 'đ'), chữ thường, gộp khoảng trắng."""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace("đ", "d").replace("Đ", "D").lower()
+    return " ".join(text.split())
+
+# [NEW] Batch chat: số truy vấn tối đa trong 1 request search_batch & số item xử lý song song mặc định
+BATCH_SEARCH_GROUP_SIZE = 64
+# Gemini batch embed nhận tối đa 100 nội dung mỗi lần gọi
+BATCH_EMBED_GROUP_SIZE = 100
+BATCH_DEFAULT_CONCURRENCY = 4
+
 class ChatService:
     def __init__(self):
         try:
@@ -92,44 +138,152 @@ class ChatService:
             
             self.db = get_mongo_db()
             self.chat_histories_collection = self.db['chat_histories']
+            self.conversation_memories_collection = self.db['conversation_memories']
             self.articles_collection = self.db['articles'] 
+            self.memory_llm = genai.GenerativeModel('gemini-2.5-flash', system_instruction=SYSTEM_PROMPT_MEMORY)
+            self._memory_tasks = set()
+            # Task tóm tắt cuối cùng của mỗi hội thoại: task mới chờ task trước -> cập nhật tuần tự theo lượt
+            self._summary_tails: Dict[str, asyncio.Task] = {}
             
             self.qdrant_client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
             self.qdrant_collection_name = settings.qdrant_collection_name
+            # [NEW] hnsw_ef / rescoring / oversampling theo profile lượng tử hóa
+            self.search_params = build_search_params()
             logger.info(f"ChatService V18.1 Ready (Updated: Added Fallback Layer 4 - Filter Relaxation).")
         except Exception as e:
             logger.error(f"Init Error: {e}")
             raise
 
-    async def _get_chat_history(self, user_id: str, conversation_id: str) -> List[ChatHistory]:
+    async def _get_chat_history(self, user_id: str, conversation_id: str, limit: int = 5) -> List[ChatHistory]:
         cursor = self.chat_histories_collection.find({
             "user_id": user_id, "conversation_id": conversation_id
-        }).sort("created_at", -1).limit(5)
-        history = await cursor.to_list(length=5)
+        }).sort("created_at", -1).limit(limit)
+        history = await cursor.to_list(length=limit)
         return [ChatHistory(**h) for h in history]
 
-    async def _save_chat_history(self, user_id: str, conversation_id: str, query: str, answer: str, intent: str, dependency: str, sources: List[SourcedAnswer]):
+    async def _save_chat_history(self, user_id: str, conversation_id: str, query: str, answer: str, intent: str, dependency: str, sources: List[SourcedAnswer], prompt_tokens: Optional[Dict[str, int]] = None):
         await self.chat_histories_collection.insert_one({
             "user_id": user_id, "conversation_id": conversation_id,
             "query": query, "answer": answer, 
             "intent": intent, "dependency": dependency,
             "sources": [s.dict() for s in sources],
+            "prompt_tokens": prompt_tokens or {},
             "created_at": datetime.utcnow()
         })
 
-    async def _analyze_query(self, query: str, history: List[ChatHistory], context: ChatContext) -> Dict[str, Any]:
+    # --- [NEW] CONVERSATION MEMORY (Rolling Summary) ---
+    async def _get_conversation_memory(self, user_id: str, conversation_id: str) -> ConversationMemory:
+        doc = await self.conversation_memories_collection.find_one({
+            "user_id": user_id, "conversation_id": conversation_id
+        })
+        if doc:
+            return ConversationMemory(**doc)
+
+        # Hội thoại cũ (trước khi có bộ nhớ): khởi tạo từ lượt gần nhất, không nhồi toàn bộ lịch sử.
+        history = await self._get_chat_history(user_id, conversation_id, limit=5)
+        if not history:
+            return ConversationMemory()
+        last_main_query = next((h.query for h in history if getattr(h, 'dependency', 'main') == 'main'), None)
+        return ConversationMemory(
+            last_query=history[0].query,
+            last_main_query=last_main_query,
+            sources=history[0].sources,
+            turns=len(history)
+        )
+
+    async def _remember_turn(self, user_id: str, conversation_id: str, memory: ConversationMemory, query: str, answer: str, dependency: str, sources: List[SourcedAnswer]):
+        """
+        Ghi ngay phần verbatim (câu hỏi cuối + nguồn) để lượt sau dùng được luôn,
+        còn bản tóm tắt cuốn chiếu được sinh bất đồng bộ (không chặn response).
+        """
+        turn = memory.turns + 1
+        updates = {
+            "last_query": query,
+            "sources": [s.dict() for s in sources],
+            "turns": turn,
+            "updated_at": datetime.utcnow()
+        }
+        if dependency == "main":
+            updates["last_main_query"] = query
+        await self.conversation_memories_collection.update_one(
+            {"user_id": user_id, "conversation_id": conversation_id},
+            {"$set": updates, "$setOnInsert": {"summary": memory.summary, "summary_turn": 0}},
+            upsert=True
+        )
+
+        key = f"{user_id}:{conversation_id}"
+        task = asyncio.create_task(
+            self._update_memory_summary(user_id, conversation_id, query, answer, turn, self._summary_tails.get(key))
+        )
+        self._summary_tails[key] = task
+        self._memory_tasks.add(task)
+
+        def _done(t: asyncio.Task):
+            self._memory_tasks.discard(t)
+            if self._summary_tails.get(key) is t:
+                del self._summary_tails[key]
+        task.add_done_callback(_done)
+
+    async def _update_memory_summary(self, user_id: str, conversation_id: str, query: str, answer: str, turn: int, previous_task: Optional[asyncio.Task] = None):
+        """
+        Gộp lượt `turn` vào bản tóm tắt MỚI NHẤT (đọc lại ngay trước khi sinh, không dùng snapshot lúc nhận request).
+        Chỉ ghi nếu summary_turn vẫn là lượt mà bản tóm tắt được dựng từ đó; bị chen ngang (replica khác) -> đọc lại, thử lại.
+        """
+        if previous_task:
+            # Chờ lượt trước tóm tắt xong (thành công hay lỗi) để không mất lượt nào trong bản tóm tắt
+            await asyncio.wait([previous_task])
+        query_filter = {"user_id": user_id, "conversation_id": conversation_id}
+        try:
+            for _ in range(MEMORY_SUMMARY_RETRIES):
+                doc = await self.conversation_memories_collection.find_one(query_filter, {"summary": 1, "summary_turn": 1}) or {}
+                base_turn = doc.get("summary_turn")
+                prompt = (
+                    f"Tóm tắt cũ:\n{doc.get('summary') or '(chưa có)'}\n\n"
+                    f"Lượt mới:\nUser: {query}\nBot: {answer[:MEMORY_ANSWER_CHARS]}\n\n"
+                    f"Tóm tắt mới:"
+                )
+                resp = await self.memory_llm.generate_content_async(prompt)
+                new_summary = (resp.text or "").strip()
+                if not new_summary:
+                    return
+                result = await self.conversation_memories_collection.update_one(
+                    {**query_filter, "summary_turn": base_turn},
+                    {"$set": {"summary": new_summary, "summary_turn": max(base_turn or 0, turn)}}
+                )
+                if result.matched_count:
+                    return
+            logger.warning(f"Memory Summary: bỏ lượt {turn} của {conversation_id} sau {MEMORY_SUMMARY_RETRIES} lần bị chen ngang.")
+        except Exception as e:
+            logger.error(f"Memory Summary Error: {e}")
+
+    @staticmethod
+    def _format_memory(memory: ConversationMemory) -> str:
+        if not memory.turns:
+            return "(Hội thoại mới)"
+        sources_txt = "\n".join([f"  {i + 1}. {s.title}" for i, s in enumerate(memory.sources)]) or "  (không có)"
+        return (
+            f"Tóm tắt hội thoại: {memory.summary or '(đang cập nhật)'}\n"
+            f"Câu hỏi gần nhất: {memory.last_query or ''}\n"
+            f"Nguồn của câu trả lời gần nhất:\n{sources_txt}"
+        )
+
+    @staticmethod
+    def _prompt_token_count(response) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "prompt_token_count", None) if usage else None
+
+    async def _analyze_query(self, query: str, memory: ConversationMemory, context: ChatContext, token_usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
         try:
-            chronological_history = list(reversed(history))
-            history_txt = "\n".join([f"User: {h.query}\nBot: {h.answer}" for h in chronological_history])
-            
             prompt = (
                 f"{SYSTEM_PROMPT_ROUTER}\n\n"
                 f"--- RUNTIME DATA ---\n"
                 f"Context Page: {context.current_page}\n"
-                f"Chat History:\n{history_txt}\n"
+                f"Conversation Memory:\n{self._format_memory(memory)}\n"
                 f"Current Query: {query}\n"
             )
             response = await self.router_llm.generate_content_async(prompt)
+            if token_usage is not None:
+                token_usage["router"] = self._prompt_token_count(response)
             return json.loads(response.text)
         except Exception as e:
             logger.error(f"Router Error: {e}")
@@ -180,27 +334,14 @@ class ChatService:
             conditions.append(rest.FieldCondition(key="website", match=rest.MatchValue(value=ai_filters['website'])))
         
         if ai_filters.get("topic"):
-            raw_topic = ai_filters['topic'].strip()
-            topic_variations = list(set([
-                raw_topic, raw_topic.lower(), raw_topic.capitalize(), raw_topic.title(), raw_topic.upper()
-            ]))
-            conditions.append(rest.FieldCondition(key="topic", match=rest.MatchAny(any=topic_variations)))
+            topic_norm = normalize_keyword(ai_filters['topic'])
+            if topic_norm:
+                conditions.append(rest.FieldCondition(key="topic_norm", match=rest.MatchValue(value=topic_norm)))
         
         if ai_filters.get("sentiment"):
-            val = ai_filters['sentiment']
-            sentiment_map = {
-                "positive": "Tích cực",
-                "negative": "Tiêu cực",
-                "neutral": "Trung tính"
-            }
-            mapped_label = sentiment_map.get(val)
-            if mapped_label:
-                conditions.append(rest.FieldCondition(key="ai_sentiment_label", match=rest.MatchValue(value=mapped_label)))
-            else:
-                if val == "positive": 
-                    conditions.append(rest.FieldCondition(key="sentiment", range=rest.Range(gte=0.25)))
-                elif val == "negative": 
-                    conditions.append(rest.FieldCondition(key="sentiment", range=rest.Range(lte=-0.25)))
+            sentiment_norm = SENTIMENT_NORM_LABELS.get(normalize_keyword(ai_filters['sentiment']))
+            if sentiment_norm:
+                conditions.append(rest.FieldCondition(key="sentiment_norm", match=rest.MatchValue(value=sentiment_norm)))
         
         if ai_filters.get("days_ago") and isinstance(ai_filters["days_ago"], int):
             cutoff_date = datetime.utcnow() - timedelta(days=ai_filters["days_ago"])
@@ -208,24 +349,66 @@ class ChatService:
 
         return rest.Filter(must=conditions) if conditions else None
 
-    async def _search_qdrant(self, query: str, qdrant_filter: Optional[rest.Filter], limit: int = 5) -> List[rest.ScoredPoint]:
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """[NEW] Embed nhiều câu hỏi trong MỘT lần gọi API (dùng cho batch, tối đa BATCH_EMBED_GROUP_SIZE câu)."""
+        if not queries:
+            return []
+        embedding_result = genai.embed_content(
+            model=self.embedding_model, content=queries, task_type="retrieval_query", output_dimensionality=self.vector_size
+        )
+        return embedding_result['embedding']
+
+    def _embed_query(self, query: str) -> List[float]:
+        embedding_result = genai.embed_content(
+            model=self.embedding_model, content=query, task_type="retrieval_query", output_dimensionality=self.vector_size
+        )
+        return embedding_result['embedding']
+
+    async def _search_qdrant(self, query: str, qdrant_filter: Optional[rest.Filter], limit: int = 5, query_vector: Optional[List[float]] = None) -> List[rest.ScoredPoint]:
         try:
             logger.info(f"🔍 Qdrant Search | Limit: {limit} | Filter: {qdrant_filter}")
-            embedding_result = genai.embed_content(
-                model=self.embedding_model, content=query, task_type="retrieval_query", output_dimensionality=self.vector_size
-            )
+            if query_vector is None:
+                query_vector = self._embed_query(query)
             
             results = self.qdrant_client.search(
                 collection_name=self.qdrant_collection_name,
-                query_vector=embedding_result['embedding'],
+                query_vector=query_vector,
                 query_filter=qdrant_filter,
-                limit=limit
+                limit=limit,
+                search_params=self.search_params,
+                with_payload=RENDER_PAYLOAD_SELECTOR,
+                with_vectors=False
             )
             return results
         except Exception as e:
             logger.error(f"❌ Qdrant Search Error: {e}")
             return []
 
+    def _search_qdrant_batch(self, query_vectors: List[List[float]], qdrant_filters: List[Optional[rest.Filter]], limits: List[int]) -> List[Optional[List[rest.ScoredPoint]]]:
+        """[NEW] Gom nhiều truy vấn Tầng 1 vào các request search_batch (mỗi lô BATCH_SEARCH_GROUP_SIZE truy vấn). Lô lỗi -> None (item tự search lại)."""
+        all_results: List[Optional[List[rest.ScoredPoint]]] = []
+        for i in range(0, len(query_vectors), BATCH_SEARCH_GROUP_SIZE):
+            requests = [
+                rest.SearchRequest(
+                    vector=vector, filter=qdrant_filter, limit=limit, params=self.search_params,
+                    with_payload=RENDER_PAYLOAD_SELECTOR, with_vector=False
+                )
+                for vector, qdrant_filter, limit in zip(
+                    query_vectors[i:i + BATCH_SEARCH_GROUP_SIZE],
+                    qdrant_filters[i:i + BATCH_SEARCH_GROUP_SIZE],
+                    limits[i:i + BATCH_SEARCH_GROUP_SIZE]
+                )
+            ]
+            try:
+                logger.info(f"🔍 Qdrant Batch Search | Requests: {len(requests)}")
+                all_results.extend(self.qdrant_client.search_batch(
+                    collection_name=self.qdrant_collection_name, requests=requests
+                ))
+            except Exception as e:
+                logger.error(f"❌ Qdrant Batch Search Error ({len(requests)} truy vấn chuyển sang search riêng lẻ): {e}")
+                all_results.extend([None] * len(requests))
+        return all_results
+
     async def _resolve_article_id(self, input_id: str) -> str:
         if not input_id or len(input_id) != 24: return input_id
         try:
@@ -281,15 +464,23 @@ class ChatService:
 
         return None
 
-    async def handle_chat(self, request: ChatRequest) -> ChatResponse:
+    async def _plan_chat(self, request: ChatRequest) -> Dict[str, Any]:
+        """
+        Giai đoạn 1: Router + chọn chiến lược tìm kiếm (chưa gọi Qdrant).
+        Trả về 'plan' dùng chung cho handle_chat, batch và benchmark.
+        """
         conversation_id = request.conversation_id or str(uuid.uuid4())
         
         if request.context.current_page == "detail_page" and request.context.article_id:
             request.context.article_id = await self._resolve_article_id(request.context.article_id)
 
-        history = await self._get_chat_history(request.user_id, conversation_id)
+        memory = await self._get_conversation_memory(request.user_id, conversation_id)
+        token_usage: Dict[str, int] = {}
         
-        analysis = await self._analyze_query(request.query, history, request.context)
+        analysis = await self._analyze_query(request.query, memory, request.context, token_usage)
+        return await self._plan_retrieval(request, conversation_id, memory, analysis, token_usage)
+
+    async def _plan_retrieval(self, request: ChatRequest, conversation_id: str, memory: ConversationMemory, analysis: Dict[str, Any], token_usage: Dict[str, int]) -> Dict[str, Any]:
         intent = analysis.get("intent", "general_search")
         dependency = analysis.get("dependency", "main")
         extracted_filters = analysis.get("filters", {})
@@ -310,14 +501,13 @@ class ChatService:
         is_plural_request = requested_quantity and requested_quantity > 1
 
         if dependency == "sub" and not is_plural_request:
-            last_bot_sources = history[0].sources if history else []
-            resolved = self._smart_resolve_article(search_query, last_bot_sources)
+            resolved = self._smart_resolve_article(search_query, memory.sources)
             
             if resolved:
                 target_article_id, target_article_title = resolved
                 context_query_append = f"(Người dùng đang hỏi về bài: '{target_article_title}')"
             
-            last_main_query = next((h.query for h in history if getattr(h, 'dependency', 'main') == 'main'), None)
+            last_main_query = memory.last_main_query
             if last_main_query:
                 search_query = f"{last_main_query} {search_query}"
                 if not context_query_append:
@@ -388,7 +578,9 @@ class ChatService:
                 should_fallback_to_global = True 
         
         elif request.context.current_page == "my_page":
-            base_filters["type"] = "my-page"
+            # [FIX] Crawler ghi type="my_page"; user_id là khóa tenant -> Qdrant dùng HNSW riêng của user
+            base_filters["type"] = "my_page"
+            base_filters["user_id"] = request.user_id
             strategy = "My Page Search"
             if request.context.update_id:
                 base_filters["update_id"] = request.context.update_id
@@ -404,30 +596,74 @@ class ChatService:
             if request.context.current_page != "my_page":
                 base_filters["type"] = "chunk"
 
+        return {
+            "conversation_id": conversation_id,
+            "memory": memory,
+            "token_usage": token_usage,
+            "intent": intent,
+            "dependency": dependency,
+            "extracted_filters": extracted_filters,
+            "limit": limit,
+            "search_query": search_query,
+            "context_query_append": context_query_append,
+            "target_article_id": target_article_id,
+            "base_filters": base_filters,
+            "strategy": strategy,
+            "should_fallback_to_global": should_fallback_to_global,
+            "has_content_filters": has_content_filters,
+            "top_sorted_ids": top_sorted_ids,
+            "tiers": 0,
+        }
+
+    async def _retrieve(self, request: ChatRequest, plan: Dict[str, Any], query_vector: Optional[List[float]] = None, initial_results: Optional[List[rest.ScoredPoint]] = None) -> List[rest.ScoredPoint]:
+        """
+        Giai đoạn 2: Thang fallback 4 tầng. Nếu đã có kết quả Tầng 1 (batch) thì bỏ qua Tầng 1.
+        Vector truy vấn được tái sử dụng cho mọi tầng.
+        """
+        base_filters = plan["base_filters"]
+        extracted_filters = plan["extracted_filters"]
+        search_query = plan["search_query"]
+        limit = plan["limit"]
+        has_content_filters = plan["has_content_filters"]
+        target_article_id = plan["target_article_id"]
+
+        if query_vector is None:
+            try:
+                query_vector = self._embed_query(search_query)
+            except Exception as e:
+                logger.error(f"❌ Embedding Error: {e}")
+                return []
+
         # --- THỰC HIỆN TÌM KIẾM ---
         # Tầng 1: Initial Search
-        final_filter = self._build_qdrant_filters(base_filters, {"filters": extracted_filters})
-        results = await self._search_qdrant(search_query, final_filter, limit=limit)
+        if initial_results is None:
+            final_filter = self._build_qdrant_filters(base_filters, {"filters": extracted_filters})
+            results = await self._search_qdrant(search_query, final_filter, limit=limit, query_vector=query_vector)
+        else:
+            results = initial_results
+        plan["tiers"] = 1
 
         # Tầng 2: Fallback 0 (Global Search)
-        if not results and should_fallback_to_global:
+        if not results and plan["should_fallback_to_global"]:
             logger.info("⚠️ Scoped Search empty. Fallback to Global Search...")
             if "search_id" in base_filters: del base_filters["search_id"]
             if base_filters.get("type") == "chunk": pass 
             
             final_filter = self._build_qdrant_filters(base_filters, {"filters": extracted_filters})
-            results = await self._search_qdrant(search_query, final_filter, limit=limit)
-            if results: strategy = "Global Search (Fallback from Scoped)"
+            results = await self._search_qdrant(search_query, final_filter, limit=limit, query_vector=query_vector)
+            plan["tiers"] += 1
+            if results: plan["strategy"] = "Global Search (Fallback from Scoped)"
 
         # Tầng 3: Fallback A (Type Relaxation)
         if not results and base_filters.get("type") == "ai_summary":
             logger.info("⚠️ No pre-computed summaries found. Fallback to full text search...")
             if "type" in base_filters: 
                 del base_filters["type"]
-                if request.context.current_page == "my_page": base_filters["type"] = "my-page"
+                if request.context.current_page == "my_page": base_filters["type"] = "my_page"
             
             final_filter = self._build_qdrant_filters(base_filters, {"filters": extracted_filters})
-            results = await self._search_qdrant(search_query, final_filter, limit=limit)
+            results = await self._search_qdrant(search_query, final_filter, limit=limit, query_vector=query_vector)
+            plan["tiers"] += 1
 
         # [NEW LOGIC] Tầng 4: Fallback B (Filter Relaxation)
         if not results and has_content_filters and not target_article_id:
@@ -439,6 +675,8 @@ class ChatService:
                 relaxed_filters["search_id"] = base_filters["search_id"]
             if "update_id" in base_filters:
                 relaxed_filters["update_id"] = base_filters["update_id"]
+            if "user_id" in base_filters:
+                relaxed_filters["user_id"] = base_filters["user_id"]
             if "type" in base_filters:
                 relaxed_filters["type"] = base_filters["type"]
 
@@ -449,24 +687,37 @@ class ChatService:
 
             # 3. Thực hiện tìm kiếm lại
             final_filter_relaxed = self._build_qdrant_filters(relaxed_filters, {"filters": relaxed_ai_filters})
-            results = await self._search_qdrant(search_query, final_filter_relaxed, limit=limit)
+            results = await self._search_qdrant(search_query, final_filter_relaxed, limit=limit, query_vector=query_vector)
+            plan["tiers"] += 1
             
             if results:
-                strategy = "Semantic Fallback (Filters Relaxed)"
+                plan["strategy"] = "Semantic Fallback (Filters Relaxed)"
 
         # --- RE-SORT RESULTS ---
         if results:
             def get_id(point):
                 return point.payload.get("article_id") or point.payload.get("metadata", {}).get("article_id")
             
+            top_sorted_ids = plan["top_sorted_ids"]
             if top_sorted_ids:
                 id_map = {str(aid): i for i, aid in enumerate(top_sorted_ids)}
                 results.sort(key=lambda x: id_map.get(str(get_id(x)), 999))
                 logger.info("✅ Re-sorted results match Mongo ID list (Sync Sources).")
-            elif intent == "contextual_summary" and not target_article_id:
+            elif plan["intent"] == "contextual_summary" and not target_article_id:
                 results.sort(key=lambda x: x.payload.get("publish_date", ""), reverse=True)
                 logger.info("✅ Re-sorted results by Date Desc for Summary (Sync Sources).")
 
+        return results
+
+    async def _answer(self, request: ChatRequest, plan: Dict[str, Any], results: List[rest.ScoredPoint]) -> ChatResponse:
+        """Giai đoạn 3: Dựng context, gọi LLM trả lời, lưu lịch sử + bộ nhớ hội thoại."""
+        intent = plan["intent"]
+        dependency = plan["dependency"]
+        strategy = plan["strategy"]
+        memory = plan["memory"]
+        token_usage = plan["token_usage"]
+        conversation_id = plan["conversation_id"]
+
         context_parts = []
         sources = []
         seen = set()
@@ -508,10 +759,7 @@ class ChatService:
                     sources.append(SourcedAnswer(article_id=str(aid), title=title))
                     seen.add(title)
 
-            chat_history_str = chr(10).join([
-                f"- User: {h.query}\n  Bot: {h.answer}" 
-                for h in reversed(history[:2])
-            ])
+            chat_history_str = self._format_memory(memory)
 
             # [FIX 2] Prompt Engineering: Inject Dependency & Force Data Priority
             prompt_instruction = ""
@@ -525,24 +773,86 @@ class ChatService:
                 prompt_instruction = "Lưu ý: Đây là câu hỏi phụ (Sub-question), hãy kết hợp ngữ cảnh lịch sử chat để trả lời mạch lạc."
 
             prompt = (
-                f"Câu hỏi người dùng: {request.query} {context_query_append}\n"
+                f"Câu hỏi người dùng: {request.query} {plan['context_query_append']}\n"
                 f"Loại câu hỏi: {dependency.upper()}\n"
                 f"{prompt_instruction}\n\n"
-                f"Lịch sử hội thoại (để tham khảo ngữ cảnh):\n"
+                f"Bộ nhớ hội thoại (để tham khảo ngữ cảnh):\n"
                 f"{chat_history_str}\n\n"
                 f"Dữ liệu tìm được ({strategy}):\n{chr(10).join(context_parts)}\n\n"
                 f"YÊU CẦU: Trả lời câu hỏi trên dựa trên dữ liệu cung cấp. Trích dẫn nguồn rõ ràng."
             )
             resp = await self.llm.generate_content_async(prompt)
+            token_usage["answer"] = self._prompt_token_count(resp)
             final_answer = resp.text
 
-        await self._save_chat_history(request.user_id, conversation_id, request.query, final_answer, intent, dependency, sources)
+        logger.info(f"📏 Prompt tokens -> Router: {token_usage.get('router')} | Answer: {token_usage.get('answer')} | Turn: {memory.turns + 1}")
+        await self._save_chat_history(request.user_id, conversation_id, request.query, final_answer, intent, dependency, sources, token_usage)
+        await self._remember_turn(request.user_id, conversation_id, memory, request.query, final_answer, dependency, sources)
         
         return ChatResponse(
             answer=final_answer, conversation_id=conversation_id, sources=sources,
             intent_detected=intent, dependency_label=dependency, strategy_used=strategy
         )
 
+    async def handle_chat(self, request: ChatRequest) -> ChatResponse:
+        plan = await self._plan_chat(request)
+        results = await self._retrieve(request, plan)
+        return await self._answer(request, plan, results)
+
+    # --- [NEW] BATCH CHAT ---
+    async def handle_chat_batch(self, requests: List[ChatRequest], max_concurrency: int = BATCH_DEFAULT_CONCURRENCY) -> AsyncIterator[ChatBatchItem]:
+        """
+        Xử lý nhiều ChatRequest:
+        1. Router chạy song song (giới hạn max_concurrency).
+        2. Embed câu hỏi theo lô BATCH_EMBED_GROUP_SIZE (giới hạn của Gemini); lô lỗi -> item đó tự embed riêng (có 'warning').
+        3. Tầng 1 của mọi câu hỏi gom thành các request search_batch.
+        4. Fallback + sinh câu trả lời chạy song song có giới hạn, trả về từng item ngay khi xong.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def plan_one(req: ChatRequest):
+            async with semaphore:
+                return await self._plan_chat(req)
+
+        plans = await asyncio.gather(*[plan_one(req) for req in requests], return_exceptions=True)
+        planned = [i for i, p in enumerate(plans) if not isinstance(p, Exception)]
+
+        vectors: Dict[int, List[float]] = {}
+        initial_results: Dict[int, List[rest.ScoredPoint]] = {}
+        warnings: Dict[int, str] = {}
+        for start in range(0, len(planned), BATCH_EMBED_GROUP_SIZE):
+            group = planned[start:start + BATCH_EMBED_GROUP_SIZE]
+            try:
+                vectors.update(zip(group, self._embed_queries([plans[i]["search_query"] for i in group])))
+            except Exception as e:
+                logger.error(f"❌ Batch Embedding Error ({len(group)} câu hỏi chuyển sang embed riêng lẻ): {e}")
+                warnings.update({i: f"batch embedding failed, fell back to per-item retrieval: {e}" for i in group})
+        embedded = [i for i in planned if i in vectors]
+        if embedded:
+            batch_results = self._search_qdrant_batch(
+                [vectors[i] for i in embedded],
+                [self._build_qdrant_filters(plans[i]["base_filters"], {"filters": plans[i]["extracted_filters"]}) for i in embedded],
+                [plans[i]["limit"] for i in embedded]
+            )
+            initial_results = {i: res for i, res in zip(embedded, batch_results) if res is not None}
+            warnings.update({i: "batch search failed, fell back to per-item retrieval" for i, res in zip(embedded, batch_results) if res is None})
+
+        async def finish_one(index: int) -> ChatBatchItem:
+            plan = plans[index]
+            if isinstance(plan, Exception):
+                return ChatBatchItem(index=index, error=str(plan))
+            async with semaphore:
+                try:
+                    results = await self._retrieve(requests[index], plan, vectors.get(index), initial_results.get(index))
+                    response = await self._answer(requests[index], plan, results)
+                    return ChatBatchItem(index=index, response=response, warning=warnings.get(index))
+                except Exception as e:
+                    logger.error(f"Batch item {index} error: {e}")
+                    return ChatBatchItem(index=index, error=str(e))
+
+        for next_done in asyncio.as_completed([finish_one(i) for i in range(len(requests))]):
+            yield await next_done
+
 
 
 
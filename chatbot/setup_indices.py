@@ -1,18 +1,33 @@
 from qdrant_client import QdrantClient, models
-from qdrant_client.http.models import Distance, VectorParams
 from config import settings
+from qdrant_config import VECTOR_SIZE, QUANTIZATION_PROFILES, build_collection_params, build_hnsw_config, resolve_on_disk_vectors, build_quantization_config
 import logging
 import sys
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def setup_qdrant_indices():
+def apply_storage_profile(client: QdrantClient, collection_name: str, profile: str):
+    """[NEW] Áp dụng profile lượng tử hóa/HNSW/on-disk cho collection ĐÃ CÓ mà không cần tạo lại."""
+    try:
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=resolve_on_disk_vectors(profile))},
+            hnsw_config=build_hnsw_config(),
+            quantization_config=build_quantization_config(profile) or models.Disabled.DISABLED,
+            collection_params=models.CollectionParamsDiff(on_disk_payload=settings.qdrant_on_disk_payload),
+        )
+        logger.info(f" Đã áp dụng profile '{profile}' (m={settings.qdrant_hnsw_m}, ef_construct={settings.qdrant_hnsw_ef_construct}).")
+    except Exception as e:
+        logger.warning(f"⚠️ Không thể áp dụng profile '{profile}': {e}")
+
+def setup_qdrant_indices(profile: str = None):
     logger.info("Đang kết nối tới Qdrant...")
     client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
     collection_name = settings.qdrant_collection_name
+    profile = profile or settings.qdrant_quantization
     
-    REQUIRED_VECTOR_SIZE = 384
+    REQUIRED_VECTOR_SIZE = VECTOR_SIZE
     
     try:
         collection_info = client.get_collection(collection_name)
@@ -25,19 +40,20 @@ def setup_qdrant_indices():
             
             client.recreate_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(size=REQUIRED_VECTOR_SIZE, distance=Distance.COSINE),
+                **build_collection_params(profile)
             )
-            logger.info(f" Đã tạo lại collection với size {REQUIRED_VECTOR_SIZE}.")
+            logger.info(f" Đã tạo lại collection với size {REQUIRED_VECTOR_SIZE} (profile: {profile}).")
         else:
             logger.info(f" Collection đã chuẩn size {REQUIRED_VECTOR_SIZE}.")
+            apply_storage_profile(client, collection_name, profile)
             
     except Exception as e:
         logger.info(f"Collection chưa tồn tại ({e}). Đang tạo mới...")
         client.recreate_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=REQUIRED_VECTOR_SIZE, distance=Distance.COSINE),
+            **build_collection_params(profile)
         )
-        logger.info(f" Đã tạo mới collection với size {REQUIRED_VECTOR_SIZE}.")
+        logger.info(f" Đã tạo mới collection với size {REQUIRED_VECTOR_SIZE} (profile: {profile}).")
 
     # [UPDATE] Các trường cần Index (Bao gồm trường mới)
     indices_config = [
@@ -46,7 +62,9 @@ def setup_qdrant_indices():
         {"field": "article_id", "schema": models.PayloadSchemaType.KEYWORD},
         {"field": "search_id", "schema": models.PayloadSchemaType.KEYWORD},
         
-        # [NEW] Trường cho My-Page
+        # [NEW] Trường cho My-Page: user_id là khóa tenant (Qdrant gom dữ liệu theo tenant trên đĩa,
+        # kết hợp payload_m để dựng HNSW riêng cho từng user), update_id là index phụ trong tenant.
+        {"field": "user_id", "schema": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True)},
         {"field": "update_id", "schema": models.PayloadSchemaType.KEYWORD},
         
         # Content Filters
@@ -58,6 +76,10 @@ def setup_qdrant_indices():
         {"field": "ai_sentiment_label", "schema": models.PayloadSchemaType.KEYWORD},
         {"field": "ai_sentiment_score", "schema": models.PayloadSchemaType.FLOAT}, # Score giờ là confidence (0-1) hoặc score cũ
         {"field": "sentiment", "schema": models.PayloadSchemaType.FLOAT}, # Giữ lại field cũ cho backward compat
+
+        # [NEW] Trường chuẩn hóa (chữ thường, bỏ dấu) -> lọc bằng một MatchValue
+        {"field": "topic_norm", "schema": models.PayloadSchemaType.KEYWORD},
+        {"field": "sentiment_norm", "schema": models.PayloadSchemaType.KEYWORD},
     ]
 
     logger.info("Bắt đầu cập nhật Index...")
@@ -76,7 +98,12 @@ def setup_qdrant_indices():
     logger.info(" Hoàn tất cấu hình Qdrant.")
 
 if __name__ == "__main__":
-    setup_qdrant_indices()
+    # python setup_indices.py [float32|scalar|binary]
+    selected_profile = sys.argv[1] if len(sys.argv) > 1 else None
+    if selected_profile and selected_profile not in QUANTIZATION_PROFILES:
+        logger.error(f"Profile không hợp lệ: {selected_profile}. Chọn một trong {QUANTIZATION_PROFILES}")
+        sys.exit(1)
+    setup_qdrant_indices(selected_profile)
 
 
 
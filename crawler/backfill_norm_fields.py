@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import sys
+
+from database import connect_external_services, close_connections, get_qdrant_client
+from config import QDRANT_COLLECTION
+from utils import normalize_topics, normalize_sentiment
+from qdrant_client.models import (
+    Filter, IsEmptyCondition, PayloadField, PayloadSelectorInclude,
+    SetPayload, SetPayloadOperation
+)
+
+# Kích thước mỗi trang scroll (= số điểm cập nhật trong 1 request batch_update_points)
+BATCH_SIZE = 256
+
+SOURCE_FIELDS = ["topic", "site_categories", "ai_sentiment_label", "sentiment_label"]
+
+def build_norm_payload(payload: dict) -> dict:
+    topics = payload.get("topic") or payload.get("site_categories")
+    label = payload.get("ai_sentiment_label") or payload.get("sentiment_label")
+    return {
+        "topic_norm": normalize_topics(topics),
+        "sentiment_norm": normalize_sentiment(label),
+    }
+
+async def backfill_norm_fields(recompute_all: bool = False):
+    """
+    Duyệt (scroll) toàn bộ điểm CHƯA có 'sentiment_norm' theo từng trang, chỉ lấy các trường nguồn,
+    tính topic_norm / sentiment_norm và ghi lại bằng một batch_update_points mỗi trang.
+    Chạy lại an toàn: điểm đã backfill sẽ không được quét lại (điểm không có nhãn cảm xúc -> null, được quét lại).
+    recompute_all=True: tính lại cho MỌI điểm (sửa sentiment_norm cũ từng suy sai từ sentiment_score).
+    """
+    print("--- [START] BACKFILL topic_norm / sentiment_norm ---")
+    await connect_external_services()
+    qdrant = get_qdrant_client()
+
+    pending_filter = None if recompute_all else Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="sentiment_norm"))])
+    offset = None
+    total = 0
+
+    while True:
+        points, offset = await qdrant.scroll(
+            collection_name=QDRANT_COLLECTION,
+            scroll_filter=pending_filter,
+            limit=BATCH_SIZE,
+            offset=offset,
+            with_payload=PayloadSelectorInclude(include=SOURCE_FIELDS),
+            with_vectors=False
+        )
+        if not points:
+            break
+
+        operations = [
+            SetPayloadOperation(set_payload=SetPayload(payload=build_norm_payload(p.payload or {}), points=[p.id]))
+            for p in points
+        ]
+        try:
+            await qdrant.batch_update_points(collection_name=QDRANT_COLLECTION, update_operations=operations)
+            total += len(points)
+            print(f"   >> [Qdrant] Đã cập nhật {total} điểm...")
+        except Exception as e:
+            print(f"   >> [Qdrant Error] {e}")
+
+        if offset is None:
+            break
+
+    print(f"--- [END] Đã backfill {total} điểm ---")
+    await close_connections()
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    parser = argparse.ArgumentParser(description="Backfill topic_norm / sentiment_norm trong Qdrant")
+    parser.add_argument("--all", action="store_true", help="Tính lại cho mọi điểm, kể cả điểm đã có sentiment_norm")
+    args = parser.parse_args()
+    asyncio.run(backfill_norm_fields(args.all))
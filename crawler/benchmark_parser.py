@@ -0,0 +1,74 @@
+import asyncio
+import sys
+import time
+from typing import Dict, List, Optional
+
+from bs4 import SoupStrainer
+
+from crawlers.vnexpress_crawler import VnExpressCrawler
+from crawlers.vneconomy_crawler import VneconomyCrawler
+from crawlers.cafef_crawler import CafeFCrawler
+from crawlers.html_parser import parse_html, LXML_AVAILABLE
+from crawlers.http_pool import borrow_http_pool
+
+# Trang chuyên mục mẫu cho từng site (trang danh sách + vài bài chi tiết lấy từ đó)
+SAMPLE_CATEGORIES = {
+    "vnexpress.net": (VnExpressCrawler, "https://vnexpress.net/kinh-doanh"),
+    "vneconomy.vn": (VneconomyCrawler, "https://vneconomy.vn/chung-khoan.htm"),
+    "cafef.vn": (CafeFCrawler, "https://cafef.vn/thi-truong-chung-khoan.chn"),
+}
+DETAIL_SAMPLES = 5
+ROUNDS = 20
+
+def _pages_per_second(pages: List[str], backend: str, parse_only: Optional[SoupStrainer] = None) -> float:
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        for html in pages:
+            parse_html(html, parse_only=parse_only, backend=backend)
+    return (ROUNDS * len(pages)) / (time.perf_counter() - t0)
+
+async def _collect_pages(crawler, category_url: str) -> Dict[str, List[str]]:
+    listing = await crawler._get(category_url)
+    soup = parse_html(listing.text)
+    links = crawler.extract_article_links(soup, is_search_page=False)[:DETAIL_SAMPLES]
+    details = []
+    for link in links:
+        resp = await crawler._get(link['url'])
+        if resp.status_code == 200:
+            details.append(resp.text)
+    return {"listing": [listing.text], "detail": details}
+
+async def benchmark_parsers():
+    """
+    Tải 1 trang chuyên mục + DETAIL_SAMPLES bài chi tiết mỗi site, rồi đo số trang parse được mỗi giây
+    với từng backend (html.parser, lxml) và với parse một phần (SoupStrainer) cho trang danh sách.
+    """
+    backends = ["html.parser"] + (["lxml"] if LXML_AVAILABLE else [])
+    if not LXML_AVAILABLE:
+        print("[WARN] Chưa cài lxml -> chỉ đo html.parser (pip install lxml).")
+
+    print(f"\n--- PARSER BENCHMARK (rounds={ROUNDS}) ---")
+    print(f"{'Site':<15} | {'Page':<8} | {'Backend':<20} | {'Pages/s':>9}")
+    async with borrow_http_pool() as pool:
+        for site, (crawler_cls, category_url) in SAMPLE_CATEGORIES.items():
+            crawler = crawler_cls(pool)
+            try:
+                pages = await _collect_pages(crawler, category_url)
+            except Exception as e:
+                print(f"{site:<15} | Lỗi tải trang mẫu: {e}")
+                continue
+
+            for kind, htmls in pages.items():
+                if not htmls: continue
+                for backend in backends:
+                    print(f"{site:<15} | {kind:<8} | {backend:<20} | {_pages_per_second(htmls, backend):>9.1f}")
+                strainer = crawler.category_page_strainer if kind == "listing" else None
+                if strainer is not None:
+                    for backend in backends:
+                        label = f"{backend}+strainer"
+                        print(f"{site:<15} | {kind:<8} | {label:<20} | {_pages_per_second(htmls, backend, strainer):>9.1f}")
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(benchmark_parsers())
@@ -9,12 +9,29 @@ HISTORY_COLLECTION_NAME = os.getenv("HISTORY_COLLECTION_NAME")
 SCHEDULED_JOBS_COLLECTION = os.getenv("SCHEDULED_JOBS_COLLECTION")
 TOPICS_COLLECTION_NAME = os.getenv("TOPICS_COLLECTION_NAME")
 MY_COLLECTION_NAME = os.getenv("MY_COLLECTION_NAME")
+# [NEW] Bảng alias: URL biến thể (tracking/AMP/mobile...) -> URL chuẩn của bài
+URL_ALIASES_COLLECTION = os.getenv("URL_ALIASES_COLLECTION", "url_aliases")
+JOBS_COLLECTION = os.getenv("JOBS_COLLECTION", "crawl_jobs")
+LEASES_COLLECTION = os.getenv("LEASES_COLLECTION", "scheduler_leases")
 
 # Vector DBs
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
 
+# [NEW] Lượng tử hóa & phân tầng bộ nhớ Qdrant: "float32" | "scalar" (int8) | "binary"
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "float32")
+# "auto" = vector gốc nằm trên đĩa khi đã bật lượng tử hóa
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "auto")
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "true") == "true"
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# [NEW] HNSW riêng theo tenant (user_id) cho dữ liệu người dùng tự upload
+QDRANT_HNSW_PAYLOAD_M = int(os.getenv("QDRANT_HNSW_PAYLOAD_M", "16"))
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0"))
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true") == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
 MEILISEARCH_URL = os.getenv("MEILISEARCH_URL")
 MEILISEARCH_KEY = os.getenv("MEILISEARCH_KEY")
 
@@ -28,12 +45,91 @@ SENTIMENT_MODEL_NAME = "wonrax/phobert-base-vietnamese-sentiment"
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
+# [NEW] Header giả lập trình duyệt cho pool HTTP dùng chung
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7'
+}
 CHUNK_SIZE_CHARS = 1000
 PREVIEW_CHARS = 200
 HISTORY_LIMIT = 10
 
 MAX_CONCURRENT_REQUESTS = 20
 MAX_CONNECTIONS_PER_SITE = 5
+# [NEW] Giới hạn lịch sự theo từng site: số kết nối đồng thời + số request/giây (token bucket)
+DEFAULT_SITE_RPS = float(os.getenv("DEFAULT_SITE_RPS", "4"))
+SITE_RATE_LIMITS = {
+    "vnexpress.net": {"max_connections": MAX_CONNECTIONS_PER_SITE, "rps": 5.0},
+    "vneconomy.vn": {"max_connections": MAX_CONNECTIONS_PER_SITE, "rps": 4.0},
+    "cafef.vn": {"max_connections": 3, "rps": 2.0},
+}
 REQUEST_TIMEOUT = 15.0
 RETRY_COUNT = 3
-AUTO_CRAWL_MONTHS = 6
\ No newline at end of file
+# [NEW] Pool HTTP dùng chung suốt vòng đời app
+HTTP_POOL_TIMEOUT = 30.0
+HTTP_KEEPALIVE_EXPIRY = 60.0
+# [NEW] Cache trang danh sách (tìm kiếm/chuyên mục): TTL không cần hỏi lại server, sau đó GET có điều kiện
+LISTING_CACHE_DIR = os.getenv("LISTING_CACHE_DIR", ".cache/listing")
+LISTING_CACHE_TTL = int(os.getenv("LISTING_CACHE_TTL", "300"))
+LISTING_CACHE_MAX_AGE = int(os.getenv("LISTING_CACHE_MAX_AGE", "86400"))
+CACHE_ARTICLE_DETAILS = os.getenv("CACHE_ARTICLE_DETAILS", "false") == "true"
+# [NEW] Kho HTML thô trang chi tiết (nén zstd, định địa chỉ theo nội dung) để extract lại không cần crawl lại
+HTML_ARCHIVE_ENABLED = os.getenv("HTML_ARCHIVE_ENABLED", "false") == "true"
+HTML_ARCHIVE_DIR = os.getenv("HTML_ARCHIVE_DIR", ".cache/html_archive")
+HTML_ARCHIVE_RETENTION_DAYS = float(os.getenv("HTML_ARCHIVE_RETENTION_DAYS", "90"))
+HTML_ARCHIVE_ZSTD_LEVEL = 6
+HTML_ARCHIVE_PRUNE_HOURS = 24
+# [NEW] Parser HTML: "lxml" | "html.parser", chạy trên thread pool riêng
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", "4"))
+# [NEW] Process pool cho giai đoạn extract bài chi tiết (0 = tắt, chạy trên thread)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", str(EXTRACTION_WORKERS * 4 or 8)))
+# [NEW] Retry/backoff & circuit breaker theo site
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+CIRCUIT_WINDOW = 20           # Số request gần nhất dùng để tính tỉ lệ lỗi
+CIRCUIT_MIN_REQUESTS = 10
+CIRCUIT_ERROR_RATE = 0.5
+CIRCUIT_COOLDOWN = 60.0       # Số giây tạm dừng site khi breaker mở
+AUTO_CRAWL_MONTHS = 6
+# [NEW] Pipeline crawl theo trang danh sách (producer/consumer)
+MAX_LISTING_PAGES = 50
+LISTING_FANOUT = int(os.getenv("LISTING_FANOUT", "3"))       # Số trang danh sách tải song song khi đã biết mẫu URL trang
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))   # Số worker fetch bài chi tiết / site (hoặc / topic)
+LINK_QUEUE_SIZE = int(os.getenv("LINK_QUEUE_SIZE", "60"))     # ~ 2-3 trang danh sách tải trước
+SAVE_BATCH_SIZE = int(os.getenv("SAVE_BATCH_SIZE", "10"))
+FRONTIER_WARM_BATCH = 5000
+# [NEW] Lịch crawl thích ứng theo từng topic: "adaptive" | "interval" (IntervalTrigger chung như cũ)
+AUTO_CRAWL_MODE = os.getenv("AUTO_CRAWL_MODE", "adaptive")
+TOPIC_MIN_INTERVAL_MINUTES = float(os.getenv("TOPIC_MIN_INTERVAL_MINUTES", "10"))
+TOPIC_MAX_INTERVAL_MINUTES = float(os.getenv("TOPIC_MAX_INTERVAL_MINUTES", "720"))
+TOPIC_DEFAULT_INTERVAL_MINUTES = 120         # Chưa đủ dữ liệu ngày đăng -> như lịch cũ (2 giờ)
+TOPIC_TARGET_NEW_PER_VISIT = 5               # Số bài mới kỳ vọng mỗi lần ghé
+TOPIC_RATE_SAMPLES = 30                      # Số ngày đăng gần nhất dùng để ước lượng tốc độ
+SITE_TOPIC_CONCURRENCY = 2                   # Số topic của cùng một site chạy đồng thời
+TOPIC_RELOAD_MINUTES = 10                    # Chu kỳ nạp lại danh sách topic (thêm/tắt topic)
+# [NEW] Cửa sổ an toàn dưới mốc high-water của topic (bài sửa/đăng muộn vẫn được quét lại)
+HIGH_WATER_WINDOW_HOURS = float(os.getenv("HIGH_WATER_WINDOW_HOURS", "6"))
+# [NEW] Phát hiện bản sao gần trùng (MinHash-LSH) lúc lưu -> bản sao dùng lại kết quả AI + vector của bài gốc
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true") == "true"
+NEAR_DUP_MIN_CHARS = 300     # Bài quá ngắn: chữ ký không đủ tin cậy
+NEAR_DUP_SHINGLE = 4         # Số từ mỗi shingle
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))   # Jaccard tối thiểu để coi là cùng một bài
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+
+# [NEW] Hàng đợi việc trên Mongo: API chỉ enqueue, các tiến trình worker.py (bao nhiêu cũng được) lấy việc theo lease
+WORK_QUEUE_ENABLED = os.getenv("WORK_QUEUE_ENABLED", "false") == "true"
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))        # Worker im lặng quá lâu -> job được worker khác lấy lại
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_DELAY = 30      # Giây; lần thử thứ n chờ base * 2^(n-1)
+WORKER_POLL_SECONDS = 2.0
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))        # Số job chạy đồng thời trong một worker
+ENRICH_CLAIM_TIMEOUT_MINUTES = 15   # Bài kẹt 'processing' quá lâu (worker chết giữa chừng) -> được nhận lại
+# [NEW] Bầu leader cho job định kỳ giữa các replica API (lease trên Mongo)
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "30"))       # Replica leader chết -> replica khác nhận sau tối đa TTL
+LEASE_RENEW_SECONDS = int(os.getenv("LEASE_RENEW_SECONDS", "10"))
@@ -1,14 +1,62 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Tuple
-from bs4 import BeautifulSoup
+import contextvars
+from typing import List, Dict, Optional, Tuple, Union, TYPE_CHECKING
+from bs4 import BeautifulSoup, SoupStrainer
 import datetime
 import httpx
+from urllib.parse import urlparse
+from .http_layer import fetch
+from .http_cache import get_listing_cache
+from .html_parser import parse_html_async
+from .extraction_pool import run_extraction
+from .url_canon import canonicalize_url
+from .html_archive import get_html_archive
+from config import CACHE_ARTICLE_DETAILS
+
+if TYPE_CHECKING:
+    from .http_pool import HttpClientPool
+
+# [NEW] Mã HTTP của request trang danh sách gần nhất TRONG TASK hiện tại (mỗi trang tải trước chạy trong task riêng)
+_listing_status: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("listing_status", default=None)
 
 class BaseCrawler(ABC):
+
+    # [NEW] Parse một phần: chỉ dựng cây cho các phần tử mà extract_article_links cần (None = cả trang)
+    search_page_strainer: Optional[SoupStrainer] = None
+    category_page_strainer: Optional[SoupStrainer] = None
     
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(self, client: Union[httpx.AsyncClient, "HttpClientPool", None]):
+        # client: AsyncClient hoặc HttpClientPool (cùng giao diện .get) mượn từ pool của ứng dụng
         self.client = client
 
+    async def _get(self, url: str, cacheable: bool = False, **kwargs) -> httpx.Response:
+        """
+        [NEW] Mọi request của crawler đi qua đây: giới hạn theo site, retry/backoff, circuit breaker.
+        cacheable=True (trang danh sách): đi qua cache đĩa + GET có điều kiện.
+        """
+        if cacheable:
+            _listing_status.set(None)
+            resp = await get_listing_cache().get(lambda u, **kw: fetch(self.client, u, **kw), url, **kwargs)
+            _listing_status.set(resp.status_code)
+            return resp
+        return await fetch(self.client, url, **kwargs)
+
+    def canonicalize(self, url: str) -> str:
+        """[NEW] URL chuẩn của bài (áp dụng trong extract_article_links, trước mọi bước dedupe/tra cứu)."""
+        return canonicalize_url(url, getattr(self, 'base_url', None))
+
+    @staticmethod
+    def _link(url: str, raw_url: str, title: str, publish_date) -> Dict:
+        """Link bài (url đã chuẩn hóa); giữ 'raw_url' khi khác url để ghi vào bảng alias."""
+        link = {'url': url, 'title': title, 'publish_date': publish_date}
+        if raw_url and raw_url != url:
+            link['raw_url'] = raw_url
+        return link
+
+    async def _parse(self, html: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """[NEW] Parse HTML ngoài event loop bằng backend cấu hình (PARSER_BACKEND)."""
+        return await parse_html_async(html, parse_only)
+
     @abstractmethod
     async def fetch_search_page(self, keyword: str, page: int, start_date_iso: str, end_date_iso: str) -> Optional[BeautifulSoup]:
         """Crawl trang kết quả tìm kiếm (On-demand)."""
@@ -19,6 +67,30 @@ class BaseCrawler(ABC):
         """(MỚI) Crawl trang chuyên mục (Auto-crawl)."""
         pass
 
+    async def fetch_category_page_with_status(self, category_url: str, page: int) -> Tuple[Optional[BeautifulSoup], Optional[int]]:
+        """
+        fetch_category_page kèm mã HTTP cuối cùng của trang (None = lỗi mạng / circuit mở):
+        phân biệt 404 do đã qua trang cuối với lỗi tải tạm thời.
+        """
+        _listing_status.set(None)
+        soup = await self.fetch_category_page(category_url, page)
+        return soup, _listing_status.get()
+
+    def category_page_url(self, category_url: str, page: int) -> Optional[str]:
+        """
+        [NEW] URL trang `page` của chuyên mục nếu dựng được mà KHÔNG cần tải các trang trước
+        (cho phép tải song song nhiều trang danh sách). None = chưa biết (phải tải tuần tự).
+        """
+        return category_url if page == 1 else None
+
+    def load_topic_state(self, category_url: str, state: Dict):
+        """[NEW] Nạp trạng thái phân trang đã lưu trên topic (vd: Zone ID của CafeF)."""
+        pass
+
+    def topic_state(self, category_url: str) -> Dict:
+        """Trạng thái phân trang cần lưu lại lên topic sau mỗi lượt crawl."""
+        return {}
+
     @abstractmethod
     def extract_article_links(self, soup: BeautifulSoup, is_search_page: bool = True) -> List[Dict]:
         """
@@ -28,7 +100,27 @@ class BaseCrawler(ABC):
         """
         pass
 
-    @abstractmethod
     async def crawl_article_detail(self, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
-        """Crawl chi tiết bài báo."""
+        """
+        Crawl chi tiết bài báo: fetch async trên event loop, rồi đẩy HTML thô sang
+        extract_article_detail chạy trong process pool (hàng đợi có giới hạn).
+        """
+        url = article_data['url']
+        try:
+            resp = await self._get(url, cacheable=CACHE_ARTICLE_DETAILS)
+        except Exception as e:
+            print(f"[CRAWLER ERR] Fetch detail {url}: {e}")
+            return None
+        if resp.status_code != 200: return None
+        archive = get_html_archive()
+        if archive:
+            # [NEW] Lưu HTML thô (zstd) theo URL chuẩn -> extract lại sau này không cần crawl lại (reextract_archive.py)
+            link = {k: article_data.get(k) for k in ('title', 'publish_date')}
+            await archive.store(url, resp.content, resp.encoding, urlparse(url).hostname, link)
+        return await run_extraction(self.extract_article_detail, resp.text, article_data, content_keyword)
+
+    @staticmethod
+    @abstractmethod
+    def extract_article_detail(html: str, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+        """(MỚI) Hàm thuần: HTML thô -> dict bài viết (None nếu không hợp lệ). Phải picklable."""
         pass
\ No newline at end of file
@@ -1,5 +1,5 @@
 import urllib.parse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import List, Dict, Optional
 from urllib.parse import urljoin
 import datetime
@@ -7,8 +7,12 @@ import uuid
 import re 
 from .base_crawler import BaseCrawler
 from utils import parse_vietnamese_date
+from .html_parser import parse_html
 
 class CafeFCrawler(BaseCrawler):
+
+    # Trang tìm kiếm: chỉ cần khối '.timeline.list-bytags'. Trang chuyên mục cần cả trang (Zone ID nằm trong script).
+    search_page_strainer = SoupStrainer(class_="list-bytags")
     
     def __init__(self, client):
         super().__init__(client)
@@ -22,11 +26,11 @@ class CafeFCrawler(BaseCrawler):
         url = f"{self.base_url}/tim-kiem/trang-{page}.chn?keywords={encoded_keyword}"
         
         try:
-            resp = await self.client.get(url)
+            resp = await self._get(url, cacheable=True)
             if resp.status_code != 200:
                 print(f"[CAFEF ERR] Search failed: {resp.status_code}")
                 return None
-            return BeautifulSoup(resp.text, 'html.parser')
+            return await self._parse(resp.text, self.search_page_strainer)
         except Exception as e:
             print(f"[CAFEF ERR] Fetch search: {e}")
             return None
@@ -56,39 +60,68 @@ class CafeFCrawler(BaseCrawler):
 
         return None
 
+    def load_topic_state(self, category_url: str, state: Dict):
+        """[NEW] Nạp Zone ID đã lưu trên topic -> trang 2..N dựng URL ngay, không phải quét trang 1 trước."""
+        if state.get('zone_id'):
+            self.category_zone_map[category_url] = str(state['zone_id'])
+
+    def topic_state(self, category_url: str) -> Dict:
+        zone_id = self.category_zone_map.get(category_url)
+        return {'zone_id': zone_id} if zone_id else {}
+
+    def category_page_url(self, category_url: str, page: int) -> Optional[str]:
+        if page == 1: return category_url
+        zone_id = self.category_zone_map.get(category_url)
+        if not zone_id: return None
+        # [FIX] URL chuẩn cho load more của CafeF
+        # Format: https://cafef.vn/timelinelist/18835/2.chn
+        return f"{self.base_url}/timelinelist/{zone_id}/{page}.chn"
+
+    async def _refresh_zone_id(self, category_url: str) -> Optional[str]:
+        """Zone ID đã lưu không còn đúng (trang timeline lỗi) -> quét lại trang 1 để lấy Zone ID mới."""
+        try:
+            resp = await self._get(category_url)
+            if resp.status_code != 200: return None
+            found_zone = self._extract_zone_id(await self._parse(resp.text, self.category_page_strainer))
+        except Exception as e:
+            print(f"[CAFEF ERR] Refresh zone {category_url}: {e}")
+            return None
+        old_zone = self.category_zone_map.get(category_url)
+        if found_zone and found_zone != old_zone:
+            print(f"[CAFEF] Zone ID {old_zone} -> {found_zone} for {category_url}")
+            self.category_zone_map[category_url] = found_zone
+            return found_zone
+        return None
+
     async def fetch_category_page(self, category_url: str, page: int) -> Optional[BeautifulSoup]:
-        target_url = ""
-        
-        if page == 1:
-            target_url = category_url
-        else:
-            zone_id = self.category_zone_map.get(category_url)
-            
-            if zone_id:
-                # [FIX] URL chuẩn cho load more của CafeF
-                # Format: https://cafef.vn/timelinelist/18835/2.chn
-                target_url = f"{self.base_url}/timelinelist/{zone_id}/{page}.chn"
+        target_url = self.category_page_url(category_url, page)
+        if not target_url:
+            # Fallback: Nếu không có ZoneID, thử đoán URL cũ (thường sẽ fail)
+            if ".chn" in category_url:
+                target_url = category_url.replace(".chn", f"/trang-{page}.chn")
             else:
-                # Fallback: Nếu không có ZoneID, thử đoán URL cũ (thường sẽ fail)
-                if ".chn" in category_url:
-                    target_url = category_url.replace(".chn", f"/trang-{page}.chn")
-                else:
-                    target_url = f"{category_url}/trang-{page}.chn"
+                target_url = f"{category_url}/trang-{page}.chn"
 
         try:
             # print(f"[CAFEF DEBUG] Fetching Page {page}: {target_url}") 
-            resp = await self.client.get(target_url)
+            resp = await self._get(target_url, cacheable=True)
             
+            if resp.status_code != 200 and page > 1 and self.category_zone_map.get(category_url):
+                # [NEW] Refresh-on-failure: Zone ID cũ hỏng -> lấy lại từ trang 1 rồi thử lại một lần
+                if await self._refresh_zone_id(category_url):
+                    target_url = self.category_page_url(category_url, page)
+                    resp = await self._get(target_url, cacheable=True)
+
             if resp.status_code != 200: 
                 print(f"[CAFEF ERR] Category Page {page} failed: {resp.status_code} | URL: {target_url}")
                 return None
             
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            soup = await self._parse(resp.text, self.category_page_strainer)
             
             # Nếu là trang 1, tìm và lưu Zone ID cho các trang sau
             if page == 1:
                 found_zone = self._extract_zone_id(soup)
-                if found_zone:
+                if found_zone and found_zone != self.category_zone_map.get(category_url):
                     print(f"[CAFEF] Detected Zone ID {found_zone} for {category_url}")
                     self.category_zone_map[category_url] = found_zone
             
@@ -110,7 +143,8 @@ class CafeFCrawler(BaseCrawler):
                     if not title_tag: continue
                     href = title_tag.get('href')
                     if not href or 'javascript' in href: continue
-                    full_url = urljoin(self.base_url, href)
+                    raw_url = urljoin(self.base_url, href)
+                    full_url = self.canonicalize(raw_url)
                     if full_url in seen_links: continue
                     title = title_tag.get('title') or title_tag.text.strip()
                     
@@ -123,7 +157,7 @@ class CafeFCrawler(BaseCrawler):
                             except: pass
                         if not pub_date:
                             pub_date = parse_vietnamese_date(time_tag.text.strip())
-                    articles.append({'url': full_url, 'title': title, 'publish_date': pub_date})
+                    articles.append(self._link(full_url, raw_url, title, pub_date))
                     seen_links.add(full_url)
                 except: continue
         else:
@@ -154,7 +188,8 @@ class CafeFCrawler(BaseCrawler):
                     href = title_tag.get('href')
                     if not href or len(href) < 5 or 'javascript' in href: continue
                     
-                    full_url = urljoin(self.base_url, href)
+                    raw_url = urljoin(self.base_url, href)
+                    full_url = self.canonicalize(raw_url)
                     if full_url in seen_links: continue
 
                     title = title_tag.get('title') or title_tag.text.strip()
@@ -172,18 +207,18 @@ class CafeFCrawler(BaseCrawler):
                         if not pub_date:
                             pub_date = parse_vietnamese_date(time_tag.text.strip())
 
-                    articles.append({'url': full_url, 'title': title, 'publish_date': pub_date})
+                    articles.append(self._link(full_url, raw_url, title, pub_date))
                     seen_links.add(full_url)
                 except: continue
 
         return articles
 
-    async def crawl_article_detail(self, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+    @staticmethod
+    def extract_article_detail(html: str, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+        """Hàm thuần, chạy trong process pool: HTML thô của trang chi tiết -> dict bài viết."""
         url = article_data['url']
         try:
-            resp = await self.client.get(url)
-            if resp.status_code != 200: return None
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            soup = parse_html(html)
             
             # Title
             title_tag = soup.select_one('h1.title')
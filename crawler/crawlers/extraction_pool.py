@@ -0,0 +1,41 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from config import EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING
+
+# Giai đoạn extract (parse + duyệt cây + regex) là CPU thuần -> chạy trên ProcessPoolExecutor
+# để tận dụng nhiều core; giai đoạn fetch vẫn là async trên event loop.
+_executor: Optional[ProcessPoolExecutor] = None
+# Hàng đợi có giới hạn: tối đa EXTRACTION_MAX_PENDING trang HTML đang chờ/đang extract.
+# Coroutine fetch phải chờ slot trống -> tự động backpressure về phía fetch.
+_slots: Optional[asyncio.Semaphore] = None
+
+def start_extraction_pool():
+    global _executor
+    if EXTRACTION_WORKERS <= 0 or _executor is not None:
+        return
+    # 'spawn': process con không kế thừa model AI/torch đã nạp trong process chính
+    _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    print(f"[EXTRACTION] Process pool ready ({EXTRACTION_WORKERS} workers).")
+
+def shutdown_extraction_pool():
+    global _executor
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def run_extraction(func: Callable, *args):
+    """
+    Chạy hàm extract thuần (picklable: hàm module-level hoặc staticmethod) trên process pool.
+    Chưa mở pool (script, EXTRACTION_WORKERS=0): chạy trên thread để không chặn event loop.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXTRACTION_MAX_PENDING)
+    async with _slots:
+        if _executor is None:
+            return await asyncio.to_thread(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from config import (
+    HTML_ARCHIVE_ENABLED, HTML_ARCHIVE_DIR, HTML_ARCHIVE_RETENTION_DAYS, HTML_ARCHIVE_ZSTD_LEVEL, HTML_ARCHIVE_PRUNE_HOURS
+)
+
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+# Blob vừa được ghi/chạm trong khoảng này không bị prune (tránh xóa blob mà tiến trình khác đang ghi index)
+_PRUNE_GRACE_SECONDS = 3600
+
+class HtmlArchive:
+    """
+    [NEW] Kho HTML thô trang chi tiết trên đĩa, để extract lại khi sửa selector / thêm trường mà không crawl lại:
+    - Blob định địa chỉ theo nội dung: objects/ab/<sha256>.zst (nén zstd); HTML giống hệt nhau chỉ lưu một lần.
+    - index.sqlite: URL chuẩn -> sha256 bản mới nhất + encoding + link gốc (title/publish_date từ trang danh sách).
+    - Lưu giữ HTML_ARCHIVE_RETENTION_DAYS ngày; prune định kỳ xóa dòng index quá hạn rồi blob không còn ai trỏ tới.
+    Nhiều tiến trình (API, worker.py, CLI re-extract) dùng chung một thư mục: SQLite WAL + ghi blob qua file tạm.
+    """
+
+    def __init__(self, directory: str = HTML_ARCHIVE_DIR):
+        import zstandard
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.sqlite")
+        self._zstd = zstandard
+        self.stats = Counter()
+        self._last_prune = 0.0
+        os.makedirs(self.objects_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, site TEXT, encoding TEXT,"
+                " link TEXT, size INTEGER, fetched_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Kết nối ngắn cho mỗi thao tác (commit khi thoát): gọi từ nhiều thread (asyncio.to_thread) và nhiều tiến trình
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.zst")
+
+    def _write_blob(self, sha256: str, body: bytes) -> bool:
+        path = self.blob_path(sha256)
+        try:
+            # Đã có (HTML không đổi giữa hai lần fetch) -> chỉ cập nhật mtime để prune không xóa nhầm
+            os.utime(path)
+            return False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = self._zstd.ZstdCompressor(level=HTML_ARCHIVE_ZSTD_LEVEL).compress(body)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.stats["bytes_compressed"] += len(data)
+        return True
+
+    def _store(self, url: str, body: bytes, encoding: Optional[str], site: Optional[str], link: Dict):
+        sha256 = hashlib.sha256(body).hexdigest()
+        if self._write_blob(sha256, body): self.stats["stored"] += 1
+        else: self.stats["deduplicated"] += 1
+        self.stats["bytes_raw"] += len(body)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, sha256, site, encoding, link, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, site, encoding, json.dumps(link, default=str, ensure_ascii=False), len(body), time.time())
+            )
+        if time.time() - self._last_prune > HTML_ARCHIVE_PRUNE_HOURS * 3600:
+            self._last_prune = time.time()
+            self.prune()
+
+    async def store(self, url: str, body: bytes, encoding: Optional[str], site: Optional[str], link: Dict):
+        """Lưu HTML thô của URL chuẩn `url` (không bao giờ làm hỏng lượt crawl: lỗi chỉ được log)."""
+        try:
+            await asyncio.to_thread(self._store, url, body, encoding, site, link)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[ARCHIVE ERR] {url}: {e}")
+
+    @staticmethod
+    def load_blob(path: str) -> bytes:
+        import zstandard
+        with open(path, "rb") as f:
+            return zstandard.ZstdDecompressor().decompress(f.read())
+
+    def iter_pages(self, site: Optional[str] = None, since: Optional[float] = None) -> Iterator[Dict]:
+        query, params = "SELECT url, sha256, site, encoding, link, fetched_at FROM pages WHERE 1=1", []
+        if site:
+            query += " AND site = ?"; params.append(site)
+        if since:
+            query += " AND fetched_at >= ?"; params.append(since)
+        with self._connect() as conn:
+            for url, sha256, row_site, encoding, link, fetched_at in conn.execute(query + " ORDER BY fetched_at", params):
+                yield {
+                    'url': url, 'sha256': sha256, 'site': row_site, 'encoding': encoding,
+                    'link': json.loads(link) if link else {}, 'fetched_at': fetched_at
+                }
+
+    def prune(self, retention_days: float = HTML_ARCHIVE_RETENTION_DAYS) -> Dict:
+        """Xóa dòng index cũ hơn retention_days, rồi xóa blob không còn dòng index nào trỏ tới."""
+        cutoff = time.time() - retention_days * 86400
+        with self._connect() as conn:
+            removed_rows = conn.execute("DELETE FROM pages WHERE fetched_at < ?", (cutoff,)).rowcount
+            referenced = {row[0] for row in conn.execute("SELECT DISTINCT sha256 FROM pages")}
+        removed_blobs = 0
+        grace = time.time() - _PRUNE_GRACE_SECONDS
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if not name.endswith(".zst") or name[:-4] in referenced: continue
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) > grace: continue
+                    os.remove(path)
+                    removed_blobs += 1
+                except FileNotFoundError:
+                    continue
+        if removed_rows or removed_blobs:
+            print(f"[ARCHIVE] Prune: {removed_rows} trang quá {retention_days} ngày, {removed_blobs} blob.")
+        return {'rows': removed_rows, 'blobs': removed_blobs}
+
+    def snapshot(self) -> Dict:
+        raw, compressed = self.stats["bytes_raw"], self.stats["bytes_compressed"]
+        return {**self.stats, 'compression_ratio': round(raw / compressed, 2) if compressed else None}
+
+def reextract_page(site: str, blob_path: str, encoding: Optional[str], article_data: Dict) -> Optional[Dict]:
+    """Hàm thuần cho process pool của reextract_archive.py: blob zstd -> HTML -> extractor HIỆN TẠI của site."""
+    from crawlers import CRAWLER_REGISTRY
+    html = HtmlArchive.load_blob(blob_path).decode(encoding or "utf-8", errors="replace")
+    return CRAWLER_REGISTRY[site].extract_article_detail(html, article_data, None)
+
+_html_archive: Optional[HtmlArchive] = None
+_warned = False
+
+def get_html_archive() -> Optional[HtmlArchive]:
+    """None khi tắt (HTML_ARCHIVE_ENABLED=false) hoặc chưa cài zstandard."""
+    global _html_archive, _warned
+    if not HTML_ARCHIVE_ENABLED: return None
+    if not ZSTD_AVAILABLE:
+        if not _warned:
+            print("[WARN] HTML_ARCHIVE_ENABLED=true nhưng chưa cài zstandard (pip install zstandard) -> không lưu HTML.")
+            _warned = True
+        return None
+    if _html_archive is None:
+        _html_archive = HtmlArchive()
+    return _html_archive
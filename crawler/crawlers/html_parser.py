@@ -0,0 +1,30 @@
+import asyncio
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from config import PARSER_BACKEND, PARSER_WORKERS
+
+# Backend của BeautifulSoup: "lxml" (C, nhanh ~5-10x) hoặc "html.parser" (thuần Python).
+# Giữ API BeautifulSoup để các hàm extract_* của crawler không phải viết lại.
+PARSER_BACKENDS = ("lxml", "html.parser")
+LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml" and not LXML_AVAILABLE:
+        return "html.parser"
+    return backend
+
+_executor = ThreadPoolExecutor(max_workers=PARSER_WORKERS, thread_name_prefix="html-parser")
+
+def parse_html(html: str, parse_only: Optional[SoupStrainer] = None, backend: Optional[str] = None) -> BeautifulSoup:
+    """parse_only: chỉ dựng cây cho các phần tử khớp SoupStrainer (parse một phần trang)."""
+    return BeautifulSoup(html, resolve_backend(backend), parse_only=parse_only)
+
+async def parse_html_async(html: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Parse trên thread pool riêng để không chặn event loop (FastAPI & các coroutine crawl khác)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, parse_html, html, parse_only)
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from config import LISTING_CACHE_DIR, LISTING_CACHE_TTL, LISTING_CACHE_MAX_AGE
+
+# Dọn entry quá LISTING_CACHE_MAX_AGE mỗi giờ (URL tìm kiếm khác nhau theo từ khóa/khoảng ngày -> cache phình mãi nếu không dọn)
+_PRUNE_INTERVAL_SECONDS = 3600
+# File tạm sót lại (tiến trình chết giữa lúc ghi) cũ hơn khoảng này thì xóa
+_TMP_GRACE_SECONDS = 3600
+
+class ListingCache:
+    """
+    Cache HTTP trên đĩa cho trang danh sách (tìm kiếm / chuyên mục):
+    - Còn trong LISTING_CACHE_TTL: trả body đã lưu, không gọi mạng.
+    - Quá TTL: GET có điều kiện (If-None-Match / If-Modified-Since); 304 -> dùng lại body đã lưu.
+    - Quá LISTING_CACHE_MAX_AGE: xóa entry, tải lại từ đầu; prune định kỳ xóa entry quá hạn không còn ai đọc.
+    Meta lưu sha256 của body: body/meta lệch nhau (hai lượt ghi cùng URL xen kẽ) -> coi như miss.
+    """
+
+    def __init__(self, directory: str = LISTING_CACHE_DIR):
+        self.directory = directory
+        self.stats = Counter()
+        self._last_prune = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def _load(self, url: str) -> Tuple[Optional[Dict], Optional[bytes]]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if time.time() - meta.get("stored_at", 0) > LISTING_CACHE_MAX_AGE:
+            self._remove(meta_path, body_path)
+            self.stats["expired"] += 1
+            return None, None
+        if meta.get("body_sha256") != hashlib.sha256(body).hexdigest():
+            return None, None
+        return meta, body
+
+    @staticmethod
+    def _remove(*paths: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        # Tên tạm riêng cho từng lượt ghi: nhiều thread/tiến trình ghi cùng key không giẫm lên file tạm của nhau
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            ListingCache._remove(tmp_path)
+            raise
+
+    def _store(self, url: str, meta: Dict, body: Optional[bytes]):
+        meta_path, body_path = self._paths(url)
+        if body is not None:
+            meta["body_sha256"] = hashlib.sha256(body).hexdigest()
+            self._write_atomic(body_path, body)
+        # Meta ghi SAU khi body đã thay xong
+        self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        if time.time() - self._last_prune > _PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.time()
+            self.prune()
+
+    async def _save(self, url: str, meta: Dict, body: Optional[bytes]):
+        # Lỗi ghi cache không bao giờ làm hỏng lượt fetch: chỉ log
+        try:
+            await asyncio.to_thread(self._store, url, meta, body)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[CACHE ERR] {url}: {e}")
+
+    def prune(self) -> int:
+        """Xóa entry quá LISTING_CACHE_MAX_AGE, body mồ côi và file tạm sót lại. Trả về số file đã xóa."""
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            paths = [path]
+            try:
+                if name.endswith(".tmp"):
+                    expired = now - os.path.getmtime(path) > _TMP_GRACE_SECONDS
+                elif name.endswith(".json"):
+                    paths.append(path[:-len(".json")] + ".body")
+                    with open(path, encoding="utf-8") as f:
+                        expired = now - json.load(f).get("stored_at", 0) > LISTING_CACHE_MAX_AGE
+                elif name.endswith(".body"):
+                    expired = not os.path.exists(path[:-len(".body")] + ".json") and now - os.path.getmtime(path) > LISTING_CACHE_MAX_AGE
+                else:
+                    continue
+            except ValueError:
+                expired = True
+            except OSError:
+                continue
+            if expired:
+                self._remove(*paths)
+                removed += 1
+        if removed:
+            print(f"[CACHE] Prune: {removed} entry/file quá {LISTING_CACHE_MAX_AGE}s.")
+        return removed
+
+    @staticmethod
+    def _cached_response(url: str, meta: Dict, body: bytes) -> httpx.Response:
+        return httpx.Response(
+            200, content=body,
+            headers={"content-type": meta.get("content_type") or "text/html; charset=utf-8"},
+            request=httpx.Request("GET", url)
+        )
+
+    async def get(self, fetch, url: str, **kwargs) -> httpx.Response:
+        """fetch(url, **kwargs): hàm GET thật (đã qua rate limit/retry). Cache key = URL đầy đủ kèm query."""
+        full_url = str(httpx.Request("GET", url, params=kwargs.pop("params", None)).url)
+        meta, body = await asyncio.to_thread(self._load, full_url)
+
+        if meta and time.time() - meta["fetched_at"] < LISTING_CACHE_TTL:
+            self.stats["fresh_hits"] += 1
+            self.stats["bytes_saved"] += len(body)
+            return self._cached_response(full_url, meta, body)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta:
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = await fetch(full_url, headers=headers, **kwargs)
+
+        if resp.status_code == 304 and meta:
+            self.stats["revalidated"] += 1
+            self.stats["bytes_saved"] += len(body)
+            meta["fetched_at"] = time.time()
+            await self._save(full_url, meta, None)
+            return self._cached_response(full_url, meta, body)
+
+        self.stats["misses"] += 1
+        self.stats["bytes_downloaded"] += len(resp.content)
+        if resp.status_code == 200:
+            now = time.time()
+            new_meta = {
+                "url": full_url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "content_type": resp.headers.get("Content-Type"),
+                "fetched_at": now,
+                "stored_at": now,
+            }
+            await self._save(full_url, new_meta, resp.content)
+        return resp
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats)
+
+_listing_cache: Optional[ListingCache] = None
+
+def get_listing_cache() -> ListingCache:
+    global _listing_cache
+    if _listing_cache is None:
+        _listing_cache = ListingCache()
+    return _listing_cache
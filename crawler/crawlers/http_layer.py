@@ -0,0 +1,249 @@
+import asyncio
+import random
+import time
+from collections import deque, Counter
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from config import (
+    MAX_CONNECTIONS_PER_SITE, DEFAULT_SITE_RPS, SITE_RATE_LIMITS,
+    RETRY_COUNT, RETRYABLE_STATUSES, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    CIRCUIT_WINDOW, CIRCUIT_MIN_REQUESTS, CIRCUIT_ERROR_RATE, CIRCUIT_COOLDOWN
+)
+
+class TokenBucket:
+    """Giới hạn số request/giây: nạp `rate` token mỗi giây, tối đa `burst` token."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostLimiter:
+    """
+    Lịch sự với từng site: tối đa `max_connections` request đồng thời
+    và không quá `rps` request/giây (token bucket).
+    """
+
+    def __init__(self, site: str, max_connections: int, rps: float, burst: Optional[int] = None):
+        self.site = site
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.bucket = TokenBucket(rps, burst or max_connections)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+_limiters: Dict[str, HostLimiter] = {}
+
+def resolve_site(url: str) -> str:
+    """'https://timkiem.vnexpress.net/...' -> 'vnexpress.net' (khóa cấu hình trong SITE_RATE_LIMITS)."""
+    host = (urlparse(url).hostname or "").lower()
+    for site in SITE_RATE_LIMITS:
+        if host == site or host.endswith("." + site):
+            return site
+    return host[4:] if host.startswith("www.") else host
+
+def get_host_limiter(url: str) -> HostLimiter:
+    """Limiter dùng chung toàn tiến trình cho mỗi site (crawl theo yêu cầu & auto-crawl)."""
+    site = resolve_site(url)
+    limiter = _limiters.get(site)
+    if limiter is None:
+        conf = SITE_RATE_LIMITS.get(site, {})
+        limiter = HostLimiter(
+            site,
+            max_connections=conf.get("max_connections", MAX_CONNECTIONS_PER_SITE),
+            rps=conf.get("rps", DEFAULT_SITE_RPS),
+            burst=conf.get("burst")
+        )
+        _limiters[site] = limiter
+    return limiter
+
+class CircuitTicket:
+    """Vé cho một lần gửi request: epoch của breaker lúc được cho qua + có phải request thăm dò không."""
+    __slots__ = ("epoch", "probe", "settled")
+
+    def __init__(self, epoch: int, probe: bool = False):
+        self.epoch = epoch
+        self.probe = probe
+        self.settled = False
+
+class CircuitBreaker:
+    """
+    Theo dõi CIRCUIT_WINDOW kết quả gần nhất của một site. Khi tỉ lệ lỗi vượt CIRCUIT_ERROR_RATE,
+    breaker mở và mọi request tới site tạm dừng CIRCUIT_COOLDOWN giây; HẾT cooldown mới sang half-open:
+    đúng 1 request thăm dò được gửi, các request khác chờ kết quả: thành công -> đóng lại, thất bại -> mở tiếp.
+    Mỗi lần mở tăng `epoch`: kết quả của request đã gửi TRƯỚC khi mở (vé epoch cũ) bị bỏ qua.
+    """
+
+    def __init__(self, site: str):
+        self.site = site
+        self.outcomes = deque(maxlen=CIRCUIT_WINDOW)
+        self.epoch = 0
+        self.tripped = False              # đang mở hoặc half-open
+        self.open_until = 0.0
+        self.probing = False
+        self._probe_done: Optional[asyncio.Event] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.tripped
+
+    async def admit(self) -> CircuitTicket:
+        """Chờ tới lượt gửi request; mọi vé phải được record() hoặc release()."""
+        while self.tripped:
+            now = time.monotonic()
+            if now < self.open_until:
+                await asyncio.sleep(self.open_until - now)
+                continue
+            if not self.probing:
+                self.probing = True
+                self._probe_done = asyncio.Event()
+                return CircuitTicket(self.epoch, probe=True)
+            await self._probe_done.wait()
+        return CircuitTicket(self.epoch)
+
+    def record(self, ticket: CircuitTicket, success: bool):
+        if ticket.settled: return
+        ticket.settled = True
+        if ticket.epoch != self.epoch:
+            return
+        if ticket.probe:
+            self._end_probe()
+            if success:
+                self.tripped = False
+                self.outcomes.clear()
+                print(f"[CIRCUIT] {self.site}: thăm dò thành công -> mở lại")
+            else:
+                self._trip()
+            return
+        if self.tripped: return
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= CIRCUIT_MIN_REQUESTS and failures / len(self.outcomes) >= CIRCUIT_ERROR_RATE:
+            self._trip()
+
+    def release(self, ticket: CircuitTicket):
+        """Request kết thúc mà không có kết quả (bị hủy, lỗi không phải mạng): nhả quyền thăm dò cho request khác."""
+        if ticket.settled: return
+        ticket.settled = True
+        if ticket.probe and ticket.epoch == self.epoch:
+            self._end_probe()
+
+    def _end_probe(self):
+        self.probing = False
+        if self._probe_done:
+            self._probe_done.set()
+
+    def _trip(self):
+        self.epoch += 1
+        self.tripped = True
+        self.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+        self.outcomes.clear()
+        get_site_stats(self.site)["circuit_opens"] += 1
+        print(f"[CIRCUIT] {self.site}: tỉ lệ lỗi cao -> tạm dừng {CIRCUIT_COOLDOWN:.0f}s")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_stats: Dict[str, Counter] = {}
+
+def get_circuit_breaker(site: str) -> CircuitBreaker:
+    if site not in _breakers:
+        _breakers[site] = CircuitBreaker(site)
+    return _breakers[site]
+
+def get_site_stats(site: str) -> Counter:
+    if site not in _stats:
+        _stats[site] = Counter()
+    return _stats[site]
+
+def snapshot_site_stats() -> Dict[str, Dict]:
+    """Số liệu theo site cho API giám sát."""
+    return {
+        site: {**stats, "circuit_open": get_circuit_breaker(site).is_open}
+        for site, stats in _stats.items()
+    }
+
+def _retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter: ngẫu nhiên trong [0, base * 2^attempt]
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+async def fetch(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """
+    GET có giới hạn theo site, retry với backoff lũy thừa + jitter cho lỗi mạng và status
+    RETRYABLE_STATUSES (tôn trọng Retry-After), và circuit breaker theo site.
+    Hết lượt retry: trả về response lỗi cuối cùng hoặc ném lại exception cuối cùng.
+    """
+    site = resolve_site(url)
+    limiter = get_host_limiter(url)
+    breaker = get_circuit_breaker(site)
+    stats = get_site_stats(site)
+
+    for attempt in range(RETRY_COUNT + 1):
+        ticket = await breaker.admit()
+        stats["requests"] += 1
+        try:
+            async with limiter:
+                resp = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            stats["errors_network"] += 1
+            breaker.record(ticket, False)
+            if attempt >= RETRY_COUNT:
+                stats["failures"] += 1
+                raise
+            stats["retries"] += 1
+            await asyncio.sleep(_backoff_delay(attempt))
+            continue
+        except BaseException:
+            # Bị hủy / lỗi không phải mạng: không có kết quả để ghi, nhưng phải nhả quyền thăm dò
+            breaker.release(ticket)
+            raise
+
+        if resp.status_code not in RETRYABLE_STATUSES:
+            breaker.record(ticket, True)
+            return resp
+
+        stats[f"status_{resp.status_code}"] += 1
+        breaker.record(ticket, False)
+        if attempt >= RETRY_COUNT:
+            stats["failures"] += 1
+            return resp
+        stats["retries"] += 1
+        delay = _retry_after_seconds(resp)
+        await asyncio.sleep(min(RETRY_MAX_DELAY, delay) if delay is not None else _backoff_delay(attempt))
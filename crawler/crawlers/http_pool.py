@@ -0,0 +1,105 @@
+import importlib.util
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import httpx
+
+from config import (
+    BROWSER_HEADERS, HTTP_POOL_TIMEOUT, HTTP_KEEPALIVE_EXPIRY,
+    MAX_CONNECTIONS_PER_SITE, SITE_RATE_LIMITS
+)
+from .http_layer import resolve_site
+
+# HTTP/2 cần gói 'h2' (httpx[http2]); site không hỗ trợ sẽ tự thương lượng về HTTP/1.1 qua ALPN.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+class HttpClientPool:
+    """
+    Pool AsyncClient sống suốt vòng đời ứng dụng, mỗi site một client riêng
+    (giới hạn kết nối/keep-alive theo SITE_RATE_LIMITS). Crawler mượn pool thay cho một AsyncClient:
+    pool.get(url) định tuyến tới client của site tương ứng và ghi nhận số kết nối mới/tái sử dụng.
+    """
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.stats: Dict[str, Counter] = {}
+
+    def _client_for(self, site: str) -> httpx.AsyncClient:
+        client = self.clients.get(site)
+        if client is None:
+            max_connections = SITE_RATE_LIMITS.get(site, {}).get("max_connections", MAX_CONNECTIONS_PER_SITE)
+            client = httpx.AsyncClient(
+                headers=BROWSER_HEADERS,
+                timeout=HTTP_POOL_TIMEOUT,
+                follow_redirects=True,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            self.clients[site] = client
+        return client
+
+    def _trace(self, stats: Counter):
+        async def trace(event_name: str, info: dict):
+            # connect_tcp chỉ xuất hiện khi pool phải mở kết nối mới
+            if event_name == "connection.connect_tcp.complete":
+                stats["new_connections"] += 1
+            elif event_name == "connection.start_tls.complete":
+                stats["tls_handshakes"] += 1
+        return trace
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        site = resolve_site(url)
+        stats = self.stats.setdefault(site, Counter())
+        extensions = {**kwargs.pop("extensions", {}), "trace": self._trace(stats)}
+        resp = await self._client_for(site).get(url, extensions=extensions, **kwargs)
+        stats["requests"] += 1
+        stats[resp.http_version] += 1
+        return resp
+
+    def snapshot(self) -> Dict[str, Dict]:
+        result = {}
+        for site, stats in self.stats.items():
+            requests = stats["requests"]
+            result[site] = {
+                **stats,
+                "reuse_ratio": round(1 - stats["new_connections"] / requests, 3) if requests else None,
+            }
+        return result
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+http_pool: Optional[HttpClientPool] = None
+
+async def open_http_pool():
+    global http_pool
+    http_pool = HttpClientPool()
+    print(f"[HTTP POOL] Ready (http2={HTTP2_AVAILABLE}).")
+
+async def close_http_pool():
+    global http_pool
+    if http_pool:
+        await http_pool.close()
+        http_pool = None
+
+def get_http_pool() -> Optional[HttpClientPool]:
+    return http_pool
+
+@asynccontextmanager
+async def borrow_http_pool():
+    """Dùng pool của ứng dụng nếu đã mở (lifespan); ngoài app (script) thì mở pool tạm và đóng sau khi dùng."""
+    if http_pool:
+        yield http_pool
+        return
+    pool = HttpClientPool()
+    try:
+        yield pool
+    finally:
+        await pool.close()
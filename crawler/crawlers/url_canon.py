@@ -0,0 +1,70 @@
+import re
+from typing import Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .http_layer import resolve_site
+
+# Tham số theo dõi/chiến dịch: không đổi nội dung bài -> luôn bỏ
+TRACKING_PARAM_PREFIXES = ("utm_", "vn_", "fb_", "ga_")
+TRACKING_PARAMS = {"fbclid", "gclid", "zarsrc", "zalo_source", "ref", "referer", "source", "amp", "outputtype", "mobile"}
+
+# Quy tắc theo site: host chuẩn + có giữ query string hay không.
+# Bài của 3 site được định danh hoàn toàn bằng path (".../slug-<id>.html|.htm|.chn") -> bỏ cả query.
+SITE_CANON_RULES = {
+    "vnexpress.net": {"host": "vnexpress.net", "keep_query": False},
+    "vneconomy.vn": {"host": "vneconomy.vn", "keep_query": False},
+    "cafef.vn": {"host": "cafef.vn", "keep_query": False},
+}
+# Tiền tố host của bản mobile/AMP (m.cafef.vn, amp.vnexpress.net, www.vneconomy.vn ...)
+_ALIAS_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+_AMP_SUFFIX = re.compile(r"(\.amp|/amp)$", re.IGNORECASE)
+
+def _canonical_host(host: str) -> str:
+    host = host.lower().rstrip(".")
+    site = resolve_site(f"https://{host}/")
+    rule = SITE_CANON_RULES.get(site)
+    stripped = host
+    for prefix in _ALIAS_HOST_PREFIXES:
+        if stripped.startswith(prefix):
+            stripped = stripped[len(prefix):]
+            break
+    if rule and stripped == site:
+        return rule["host"]
+    return stripped if stripped.count(".") >= 1 else host
+
+def _canonical_path(path: str) -> str:
+    path = re.sub(r"/{2,}", "/", path or "/")
+    # Bản AMP: /amp/slug.html, slug.html/amp, slug.chn.amp
+    if path.lower().startswith("/amp/"):
+        path = path[4:]
+    path = _AMP_SUFFIX.sub("", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return path or "/"
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PARAM_PREFIXES)
+
+def canonicalize_url(url: str, base_url: Optional[str] = None) -> str:
+    """
+    URL chuẩn của một bài: https, host chuẩn (bỏ www./m./amp.), bỏ #fragment, bỏ biến thể AMP,
+    bỏ '/' cuối; query: bỏ hẳn với site trong SITE_CANON_RULES, site khác chỉ bỏ tham số theo dõi (giữ thứ tự ổn định).
+    Hàm thuần, chạy lại trên URL đã chuẩn cho kết quả không đổi.
+    """
+    if not url: return url
+    url = url.strip()
+    if base_url:
+        url = urljoin(base_url, url)
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+    host = _canonical_host(parts.hostname or "")
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    rule = SITE_CANON_RULES.get(resolve_site(f"https://{host}/"), {})
+    query = ""
+    if rule.get("keep_query", True) and parts.query:
+        params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+        query = urlencode(sorted(params))
+    return urlunsplit(("https", host, _canonical_path(parts.path), query, ""))
@@ -7,6 +7,7 @@ import uuid
 import re 
 from .base_crawler import BaseCrawler
 from utils import parse_vietnamese_date
+from .html_parser import parse_html
 
 class VneconomyCrawler(BaseCrawler):
     
@@ -29,27 +30,29 @@ class VneconomyCrawler(BaseCrawler):
         
         try:
             print(f"[VNECONOMY] Crawling Search: {url}")
-            resp = await self.client.get(url)
+            resp = await self._get(url, cacheable=True)
             if resp.status_code != 200:
                 print(f"[VNECONOMY ERR] Search failed: {resp.status_code} | URL: {url}")
                 return None
-            return BeautifulSoup(resp.text, 'html.parser')
+            return await self._parse(resp.text, self.search_page_strainer)
         except Exception as e:
             print(f"[VNECONOMY ERR] Fetch search: {type(e).__name__} - {e}")
             return None
 
-    async def fetch_category_page(self, category_url: str, page: int) -> Optional[BeautifulSoup]:
+    def category_page_url(self, category_url: str, page: int) -> Optional[str]:
         if "?" in category_url: 
-            url = f"{category_url}&trang={page}"
-        else: 
-            url = f"{category_url}?trang={page}"
+            return f"{category_url}&trang={page}"
+        return f"{category_url}?trang={page}"
+
+    async def fetch_category_page(self, category_url: str, page: int) -> Optional[BeautifulSoup]:
+        url = self.category_page_url(category_url, page)
         
         try:
-            resp = await self.client.get(url)
+            resp = await self._get(url, cacheable=True)
             if resp.status_code != 200:
                 print(f"[VNECONOMY ERR] Category failed ({url}): {resp.status_code}")
                 return None
-            return BeautifulSoup(resp.text, 'html.parser')
+            return await self._parse(resp.text, self.category_page_strainer)
         except Exception as e:
             print(f"[VNECONOMY ERR] Fetch category: {e}")
             return None
@@ -95,7 +98,8 @@ class VneconomyCrawler(BaseCrawler):
 
                 if any(k in href for k in BLACKLIST_URL_KEYWORDS): continue
 
-                full_url = urljoin(self.base_url, href)
+                raw_url = urljoin(self.base_url, href)
+                full_url = self.canonicalize(raw_url)
                 if full_url in seen_links: continue
 
                 title = link_tag.get('title') or link_tag.text.strip()
@@ -111,24 +115,19 @@ class VneconomyCrawler(BaseCrawler):
                 if date_tag:
                     pub_date = parse_vietnamese_date(date_tag.text.strip())
 
-                articles.append({
-                    'url': full_url, 
-                    'title': title,
-                    'publish_date': pub_date 
-                })
+                articles.append(self._link(full_url, raw_url, title, pub_date))
                 seen_links.add(full_url)
                 
             except Exception: continue
             
         return articles
 
-    async def crawl_article_detail(self, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+    @staticmethod
+    def extract_article_detail(html: str, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+        """Hàm thuần, chạy trong process pool: HTML thô của trang chi tiết -> dict bài viết."""
         url = article_data['url']
         try:
-            resp = await self.client.get(url)
-            if resp.status_code != 200: return None
-            
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            soup = parse_html(html)
             
             # [FIX] Đã XÓA đoạn check heuristic gây lỗi (len(story-item) > 5...)
             # Thay vào đó, tập trung tìm nội dung chính luôn.
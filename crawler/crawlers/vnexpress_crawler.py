@@ -1,5 +1,5 @@
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import List, Dict, Optional
 from urllib.parse import urlparse
 import datetime
@@ -7,8 +7,13 @@ import uuid
 import re 
 from .base_crawler import BaseCrawler
 from utils import parse_vietnamese_date
+from .html_parser import parse_html
 
 class VnExpressCrawler(BaseCrawler):
+
+    # Mỗi bài trong trang danh sách là một thẻ <article class="item-news">
+    search_page_strainer = SoupStrainer("article")
+    category_page_strainer = SoupStrainer("article")
     
     def __init__(self, client):
         super().__init__(client)
@@ -30,20 +35,24 @@ class VnExpressCrawler(BaseCrawler):
                 'date_format': 'all',
                 'latest': ''
             }
-            resp = await self.client.get(self.search_url_base, params=params)
-            return BeautifulSoup(resp.text, 'html.parser')
+            resp = await self._get(self.search_url_base, params=params, cacheable=True)
+            return await self._parse(resp.text, self.search_page_strainer)
         except: return None
 
+    def category_page_url(self, category_url: str, page: int) -> Optional[str]:
+        if page > 1: return f"{category_url}-p{page}"
+        return category_url
+
     async def fetch_category_page(self, category_url: str, page: int) -> Optional[BeautifulSoup]:
-        if page > 1: url = f"{category_url}-p{page}"
-        else: url = category_url
+        url = self.category_page_url(category_url, page)
         try:
-            resp = await self.client.get(url)
-            return BeautifulSoup(resp.text, 'html.parser')
+            resp = await self._get(url, cacheable=True)
+            return await self._parse(resp.text, self.category_page_strainer)
         except: return None
 
     def extract_article_links(self, soup: BeautifulSoup, is_search_page: bool = True) -> List[Dict]:
         articles = []
+        seen_links = set()
         if is_search_page: items = soup.select('article.item-news.item-news-common')
         else: items = soup.select('article.item-news')
         
@@ -57,6 +66,9 @@ class VnExpressCrawler(BaseCrawler):
                 
                 if url and not url.startswith('http'):
                     url = self.base_url + url
+                raw_url = url
+                url = self.canonicalize(url) if url else url
+                if not url or url in seen_links: continue
 
                 title = ""
                 if a_tag:
@@ -65,18 +77,19 @@ class VnExpressCrawler(BaseCrawler):
                 ts = item.get('data-publishtime')
                 pub_date = datetime.datetime.fromtimestamp(int(ts)) if ts else None
                 
-                if url:
-                    articles.append({'url': url, 'title': title, 'publish_date': pub_date})
+                articles.append(self._link(url, raw_url, title, pub_date))
+                seen_links.add(url)
             except: continue
         return articles
 
-    async def crawl_article_detail(self, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+    @staticmethod
+    def extract_article_detail(html: str, article_data: Dict, content_keyword: Optional[str]) -> Optional[Dict]:
+        """Hàm thuần, chạy trong process pool: HTML thô của trang chi tiết -> dict bài viết."""
         url = article_data['url']
         try:
-            resp = await self.client.get(url)
-            if "Video Player" in resp.text and "fck_detail" not in resp.text: return None
+            if "Video Player" in html and "fck_detail" not in html: return None
             
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            soup = parse_html(html)
             
             # 1. Title
             title_tag = soup.select_one('h2.title') or soup.select_one('h1.title-detail') or soup.select_one('h1.title-news')
@@ -3,7 +3,7 @@ from typing import Optional
 import sys
 from config import (
     MONGO_URI, DATABASE_NAME, COLLECTION_NAME, HISTORY_COLLECTION_NAME, 
-    SCHEDULED_JOBS_COLLECTION, TOPICS_COLLECTION_NAME, MY_COLLECTION_NAME,
+    SCHEDULED_JOBS_COLLECTION, TOPICS_COLLECTION_NAME, MY_COLLECTION_NAME, URL_ALIASES_COLLECTION, JOBS_COLLECTION, LEASES_COLLECTION,
     QDRANT_URL, QDRANT_API_KEY, MEILISEARCH_URL, MEILISEARCH_KEY
 )
 from qdrant_client import AsyncQdrantClient
@@ -50,5 +50,8 @@ def get_history_collection(): return db[HISTORY_COLLECTION_NAME]
 def get_scheduled_jobs_collection(): return db[SCHEDULED_JOBS_COLLECTION]
 def get_topics_collection(): return db[TOPICS_COLLECTION_NAME]
 def get_my_articles_collection(): return db[MY_COLLECTION_NAME]
+def get_url_aliases_collection(): return db[URL_ALIASES_COLLECTION]
+def get_jobs_collection(): return db[JOBS_COLLECTION]
+def get_leases_collection(): return db[LEASES_COLLECTION]
 def get_qdrant_client(): return qdrant_client
 def get_meili_client(): return meili_client
\ No newline at end of file
@@ -6,8 +6,6 @@ import asyncio
 import motor.motor_asyncio
 from contextlib import asynccontextmanager
 import datetime
-from bs4 import BeautifulSoup
-import httpx
 from typing import Optional, List
 import json
 
@@ -16,13 +14,26 @@ from database import (
     connect_to_mongo, close_connections, connect_external_services,
     get_articles_collection, get_history_collection, get_topics_collection
 )
-from config import HEADERS, REQUEST_TIMEOUT, RETRY_COUNT
+from config import REQUEST_TIMEOUT, RETRY_COUNT, WORK_QUEUE_ENABLED
 from crawlers.vnexpress_crawler import VnExpressCrawler
 from crawlers.vneconomy_crawler import VneconomyCrawler
 from crawlers.cafef_crawler import CafeFCrawler 
+from crawlers.http_layer import snapshot_site_stats
+from crawlers.http_cache import get_listing_cache
+from crawlers.html_archive import get_html_archive
+from crawlers.html_parser import parse_html_async
+from crawlers.extraction_pool import start_extraction_pool, shutdown_extraction_pool
+from crawlers.http_pool import open_http_pool, close_http_pool, borrow_http_pool, get_http_pool
 
 from services.crawler_service import perform_hybrid_search, save_and_clean_history, search_relevant_articles_for_chat
-from services.scheduler_service import start_scheduler, execute_topic_crawl, reschedule_topic_crawl, process_user_articles_ai
+from services.url_frontier import get_url_frontier
+from services.url_aliases import resolve_canonical
+from services.near_dup import snapshot_enrichment_stats, ensure_near_dup_index
+from services.work_queue import ensure_job_indexes, snapshot_jobs
+from services.scheduler_service import (
+    start_scheduler, stop_scheduler, execute_topic_crawl, reschedule_topic_crawl, process_user_articles_ai,
+    get_topic_scheduler, get_lease_manager
+)
 
 # [UPDATE] Registry
 CRAWLER_REGISTRY = {
@@ -36,9 +47,19 @@ async def lifespan(app: FastAPI):
     print("--- [LIFESPAN] STARTING ---")
     await connect_to_mongo()
     await connect_external_services() 
+    await open_http_pool()
+    start_extraction_pool()
+    # [NEW] Nạp seen-set URL cho auto-crawl ở nền (trong lúc nạp, frontier tự tra Mongo bằng $in)
+    frontier_warmup = asyncio.create_task(get_url_frontier().warm(get_articles_collection()))
+    await ensure_near_dup_index(get_articles_collection())
+    await ensure_job_indexes()
     start_scheduler()
     yield
     print("--- [LIFESPAN] SHUTTING DOWN ---")
+    frontier_warmup.cancel()
+    await stop_scheduler()
+    await close_http_pool()
+    shutdown_extraction_pool()
     await close_connections()
 
 app = FastAPI(title="Crawler API v4.0 (Hybrid & Intelligent)", version="4.0.0", lifespan=lifespan)
@@ -91,12 +112,12 @@ async def init_topics(
     else: raise HTTPException(400, "Website chưa được hỗ trợ.")
 
     try:
-        async with httpx.AsyncClient(headers=HEADERS, timeout=15.0, follow_redirects=True) as client:
+        async with borrow_http_pool() as client:
             resp = await client.get(target_url)
             html_content = resp.text
     except Exception as e: raise HTTPException(500, f"Lỗi truy cập: {e}")
 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = await parse_html_async(html_content)
     topics = []
     seen_urls = set()
 
@@ -174,6 +195,28 @@ async def test_cafef_auto_crawl(background_tasks: BackgroundTasks):
         "target": "cafef.vn"
     }
 
+@app.get("/admin/crawler-stats", summary="Thống kê request/lỗi/retry & circuit breaker theo site")
+async def get_crawler_stats():
+    pool = get_http_pool()
+    archive = get_html_archive()
+    return {
+        "status": "success",
+        "sites": snapshot_site_stats(),
+        "connections": pool.snapshot() if pool else {},
+        "listing_cache": get_listing_cache().snapshot(),
+        "html_archive": archive.snapshot() if archive else None,
+        "enrichment": snapshot_enrichment_stats(),
+        "topic_schedule": get_topic_scheduler().snapshot()
+    }
+
+@app.get("/admin/jobs", summary="Hàng đợi việc: số job theo loại/trạng thái và worker đang giữ lease")
+async def get_jobs():
+    return {"status": "success", "queue_enabled": WORK_QUEUE_ENABLED, **await snapshot_jobs()}
+
+@app.get("/admin/leases", summary="Replica nào đang giữ từng job định kỳ (leader)")
+async def get_leases():
+    return {"status": "success", **await get_lease_manager().snapshot()}
+
 @app.post("/admin/schedule", summary="Cập nhật tần suất Auto-Crawl")
 async def update_schedule(config: ScheduleConfig):
     success = reschedule_topic_crawl(config.minutes)
@@ -260,6 +303,7 @@ async def check_crawl_status(
         "search_id": search_id,
         "status": record.get("status", "unknown"),
         "total_saved": record.get("total_saved", 0),
+        "crawl_stats": record.get("crawl_stats"),
         "updated_at": record.get("updated_at")
     }
 
@@ -293,6 +337,20 @@ async def get_history_articles(
         }
     except Exception as e: raise HTTPException(500, str(e))
 
+@app.get("/articles/resolve", summary="URL bất kỳ (kể cả biến thể cũ trước khi chuẩn hóa) -> bài viết đang lưu")
+async def resolve_article(url: str, articles_collection = Depends(get_articles_collection)):
+    """
+    Link cũ (bài đã lưu, lịch sử, chia sẻ) có thể là biến thể URL (tracking param, mobile host...):
+    tra bảng url_aliases -> URL chuẩn -> bài trong `articles` (bài chưa migrate vẫn tìm được theo URL gốc).
+    """
+    canonical = await resolve_canonical(url)
+    projection = {'_id': 0, 'content': 0, 'minhash': 0, 'minhash_bands': 0}
+    doc = await articles_collection.find_one({'url': canonical}, projection)
+    if not doc and canonical != url:
+        doc = await articles_collection.find_one({'url': url}, projection)
+    if not doc: raise HTTPException(404, "Article not found")
+    return {"status": "success", "url": canonical, "data": doc}
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
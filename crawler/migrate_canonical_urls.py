@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import sys
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne, DeleteOne
+
+from database import (
+    connect_to_mongo, close_connections, connect_external_services,
+    get_articles_collection, get_url_aliases_collection, get_qdrant_client, get_meili_client
+)
+from config import QDRANT_COLLECTION
+from crawlers.url_canon import canonicalize_url
+from services.url_aliases import article_id_for, save_aliases
+from services.crawler_service import sync_to_meilisearch
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, FilterSelector, PointStruct
+
+# Số bài đọc mỗi lượt cursor = số thao tác ghi gom lại trước mỗi lần flush
+BATCH_SIZE = 200
+
+def _url_key(url: str) -> bytes:
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+
+class MigrationBatch:
+    """Các thao tác ghi của một lô, flush cùng lúc sang Mongo / Qdrant / Meilisearch."""
+
+    def __init__(self):
+        self.mongo_ops: List = []
+        self.deleted_article_ids: List[str] = []       # bài trùng bị xóa (Mongo + Qdrant + Meili)
+        self.renamed: List[Tuple[str, str, str]] = []  # (article_id cũ, article_id mới, URL chuẩn) -> đổi khóa điểm Qdrant
+        self.touched_keepers: set = set()              # _id bài giữ lại cần đồng bộ lại Meili
+        self.aliases: List[Tuple[str, str]] = []
+
+    def __len__(self):
+        return len(self.mongo_ops)
+
+async def _rekey_points(qdrant, old_id: str, new_id: str, url: str) -> int:
+    """
+    Điểm Qdrant của bài đổi URL: id điểm suy ra từ article_id (uuid5 của chunk_id / '<id>_summary'), payload chứa url/chunk_id
+    -> chép sang id mới với article_id/url/chunk_id mới (giữ nguyên vector), rồi xóa điểm cũ.
+    """
+    old_filter = Filter(must=[FieldCondition(key="article_id", match=MatchValue(value=old_id))])
+    points, offset = [], None
+    while True:
+        page, offset = await qdrant.scroll(
+            collection_name=QDRANT_COLLECTION, scroll_filter=old_filter, limit=256, offset=offset,
+            with_payload=True, with_vectors=True
+        )
+        points.extend(page)
+        if offset is None: break
+    if not points: return 0
+
+    new_points = []
+    for point in points:
+        payload = {**(point.payload or {}), "article_id": new_id, "url": url}
+        if payload.get('type') == 'ai_summary':
+            point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{new_id}_summary"))
+        else:
+            chunk_index = str(payload.get('chunk_id', '')).rsplit('_', 1)[-1]
+            payload['chunk_id'] = f"{new_id}_{chunk_index}"
+            point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, payload['chunk_id']))
+        new_points.append(PointStruct(id=point_id, vector=point.vector, payload=payload))
+    # Ghi điểm mới TRƯỚC khi xóa điểm cũ: lỗi giữa chừng không làm mất vector (chạy lại sẽ hoàn tất)
+    await qdrant.upsert(collection_name=QDRANT_COLLECTION, points=new_points)
+    await qdrant.delete(collection_name=QDRANT_COLLECTION, points_selector=FilterSelector(filter=old_filter))
+    return len(new_points)
+
+async def _flush(batch: MigrationBatch, articles_col, stats: Counter):
+    if not len(batch): return
+    await articles_col.bulk_write(batch.mongo_ops, ordered=False)
+    await save_aliases(batch.aliases)
+
+    qdrant = get_qdrant_client()
+    if qdrant:
+        try:
+            if batch.deleted_article_ids:
+                await qdrant.delete(
+                    collection_name=QDRANT_COLLECTION,
+                    points_selector=FilterSelector(filter=Filter(must=[
+                        FieldCondition(key="article_id", match=MatchAny(any=batch.deleted_article_ids))
+                    ]))
+                )
+            for old_id, new_id, url in batch.renamed:
+                # Bài đổi URL giữ nguyên vector; id điểm, article_id, url, chunk_id theo URL chuẩn (khớp Mongo)
+                stats['qdrant_rekeyed'] += await _rekey_points(qdrant, old_id, new_id, url)
+        except Exception as e:
+            print(f"   >> [Qdrant Error] {e}")
+
+    meili = get_meili_client()
+    if meili:
+        try:
+            # Meili dùng article_id làm khóa chính -> xóa cả bản ghi dưới article_id cũ của bài đổi URL
+            stale_ids = batch.deleted_article_ids + [old_id for old_id, _, _ in batch.renamed]
+            if stale_ids:
+                await meili.index("articles").delete_documents(stale_ids)
+            if batch.touched_keepers:
+                keepers = await articles_col.find({'_id': {'$in': list(batch.touched_keepers)}}).to_list(None)
+                await sync_to_meilisearch(keepers)
+        except Exception as e:
+            print(f"   >> [Meilisearch Error] {e}")
+
+    print(f"   >> Đã xử lý: {dict(stats)}")
+
+async def migrate_canonical_urls(dry_run: bool = False):
+    """
+    Duyệt (stream) toàn bộ `articles` theo _id, tính URL chuẩn của từng bài:
+    - Bài đầu tiên của mỗi URL chuẩn được giữ lại (ưu tiên bài đã có đúng URL chuẩn); URL/article_id được đổi sang dạng chuẩn.
+    - Các bài trùng: gộp search_id vào bài giữ lại rồi xóa khỏi Mongo, Meilisearch và Qdrant.
+    - Mọi URL biến thể được ghi vào bảng url_aliases.
+    RAM: 8 byte + (_id, article_id) cho mỗi URL chuẩn. Chạy lại an toàn (lần sau không còn gì để gộp).
+    """
+    print(f"--- [START] CHUẨN HÓA URL & GỘP BÀI TRÙNG {'(DRY RUN)' if dry_run else ''}---")
+    await connect_to_mongo()
+    await connect_external_services()
+
+    articles_col = get_articles_collection()
+    if not dry_run:
+        await get_url_aliases_collection().create_index('url')
+
+    keepers: Dict[bytes, Tuple[object, Optional[str]]] = {}
+    stats: Counter = Counter()
+    batch = MigrationBatch()
+
+    cursor = articles_col.find({}, {'url': 1, 'article_id': 1, 'search_id': 1}).sort('_id', 1).batch_size(BATCH_SIZE)
+    async for doc in cursor:
+        url = doc.get('url')
+        if not url: continue
+        stats['scanned'] += 1
+        canonical = canonicalize_url(url)
+        key = _url_key(canonical)
+        keeper = keepers.get(key)
+
+        if keeper and keeper[0] == doc['_id']:
+            continue
+        if keeper is None and canonical != url:
+            # Bài mang đúng URL chuẩn có thể nằm sau trong cursor -> giữ bài đó
+            existing = await articles_col.find_one({'url': canonical}, {'article_id': 1})
+            if existing:
+                keeper = keepers[key] = (existing['_id'], existing.get('article_id'))
+
+        if keeper is None:
+            new_id = article_id_for(canonical)
+            keepers[key] = (doc['_id'], new_id)
+            if canonical == url and doc.get('article_id') == new_id:
+                continue
+            stats['renamed'] += 1
+            batch.mongo_ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'url': canonical, 'article_id': new_id}}))
+            if doc.get('article_id') and doc['article_id'] != new_id:
+                batch.renamed.append((doc['article_id'], new_id, canonical))
+            batch.touched_keepers.add(doc['_id'])
+        else:
+            stats['merged'] += 1
+            search_ids = doc.get('search_id') or []
+            if search_ids:
+                batch.mongo_ops.append(UpdateOne({'_id': keeper[0]}, {'$addToSet': {'search_id': {'$each': search_ids}}}))
+            batch.mongo_ops.append(DeleteOne({'_id': doc['_id']}))
+            if doc.get('article_id') and doc['article_id'] != keeper[1]:
+                batch.deleted_article_ids.append(doc['article_id'])
+            batch.touched_keepers.add(keeper[0])
+        if canonical != url:
+            batch.aliases.append((url, canonical))
+
+        if len(batch) >= BATCH_SIZE:
+            if not dry_run: await _flush(batch, articles_col, stats)
+            batch = MigrationBatch()
+
+    if not dry_run: await _flush(batch, articles_col, stats)
+    print(f"--- [END] {dict(stats)} ---")
+    await close_connections()
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(migrate_canonical_urls(dry_run="--dry-run" in sys.argv))
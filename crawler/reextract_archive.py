@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import connect_to_mongo, close_connections, connect_external_services, get_articles_collection
+from config import EXTRACTION_WORKERS
+from crawlers import CRAWLER_REGISTRY
+from crawlers.html_archive import HtmlArchive, ZSTD_AVAILABLE, reextract_page
+from services.crawler_service import shape_crawled_article, sync_to_meilisearch
+from services.near_dup import mark_near_duplicates
+
+# Số trang mỗi lô: một truy vấn $in lấy bài hiện có + một bulk_write
+BATCH_SIZE = 200
+# Trường do extractor quản lý -> được ghi đè trên bài đã có (title/url/publish_date/search_id giữ nguyên)
+EXTRACTED_FIELDS = ('summary', 'content', 'site_categories')
+
+def _site_for(host: Optional[str]) -> Optional[str]:
+    if not host: return None
+    return next((site for site in CRAWLER_REGISTRY if host == site or host.endswith("." + site)), None)
+
+def _parse_date(value) -> Optional[datetime.datetime]:
+    if isinstance(value, datetime.datetime) or not value: return value or None
+    try: return datetime.datetime.fromisoformat(str(value))
+    except ValueError: return None
+
+async def _process_batch(pages: List[Dict], archive: HtmlArchive, executor, articles_col, dry_run: bool, stats: Counter):
+    existing = {
+        doc['url']: doc async for doc in articles_col.find(
+            {'url': {'$in': [p['url'] for p in pages]}},
+            {'url': 1, 'article_id': 1, 'title': 1, 'publish_date': 1, 'content': 1, 'summary': 1, 'site_categories': 1}
+        )
+    }
+    loop = asyncio.get_running_loop()
+    jobs = []
+    for page in pages:
+        site = _site_for(page['site'])
+        if not site:
+            stats['unknown_site'] += 1; continue
+        doc = existing.get(page['url'])
+        source = doc or page['link']
+        article_data = {
+            'url': page['url'],
+            'title': source.get('title'),
+            'publish_date': _parse_date(source.get('publish_date'))
+        }
+        jobs.append((page, site, doc, loop.run_in_executor(
+            executor, reextract_page, site, archive.blob_path(page['sha256']), page['encoding'], article_data
+        )))
+
+    ops, changed, inserted, updated_urls = [], [], [], []
+    for page, site, doc, future in jobs:
+        try:
+            result = await future
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"   >> [ERR] {page['url']}: {type(e).__name__} - {e}")
+            continue
+        if not result:
+            stats['empty'] += 1; continue
+        if doc is None:
+            # Có HTML nhưng chưa có bài (vd: bị lọc từ khóa lúc crawl) -> thêm như bài auto-crawl
+            article = shape_crawled_article(result, site, [], "system_auto", "system")
+            article.pop('current_search_id', None)
+            inserted.append(article)
+            continue
+        updates = {k: result[k] for k in EXTRACTED_FIELDS if k in result}
+        if result.get('publish_date') and not doc.get('publish_date'):
+            updates['publish_date'] = result['publish_date']
+        updates = {k: v for k, v in updates.items() if doc.get(k) != v}
+        if not updates:
+            stats['unchanged'] += 1; continue
+        if 'content' in updates:
+            # Nội dung đổi -> enrich lại (tóm tắt/cảm xúc/vector theo nội dung mới) + tính lại chữ ký gần trùng
+            updates['status'] = 'raw'
+            changed.append({**doc, **updates})
+        updates['reextracted_at'] = datetime.datetime.now()
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': updates}))
+        updated_urls.append(doc['url'])
+        stats['updated'] += 1
+
+    stats['inserted'] += len(inserted)
+    if dry_run: return
+
+    await mark_near_duplicates(articles_col, inserted + changed)
+    for art in changed:
+        fields = {k: art.get(k) for k in ('minhash', 'minhash_bands', 'dup_of', 'dup_similarity') if k in art}
+        if fields: ops.append(UpdateOne({'_id': art['_id']}, {'$set': fields}))
+    for art in inserted:
+        ops.append(UpdateOne({'url': art['url']}, {'$set': art, '$addToSet': {'search_id': "system_auto"}}, upsert=True))
+    if not ops: return
+    await articles_col.bulk_write(ops, ordered=False)
+
+    written = updated_urls + [a['url'] for a in inserted]
+    await sync_to_meilisearch(await articles_col.find({'url': {'$in': written}}).to_list(None))
+
+async def reextract_archive(site: Optional[str], days: Optional[float], limit: Optional[int], workers: int, dry_run: bool, prune: bool):
+    """
+    Chạy lại extractor HIỆN TẠI của từng site trên HTML trong kho (không gọi mạng), song song trên process pool:
+    - Bài đã có: ghi đè trường do extractor quản lý nếu khác; nội dung đổi -> status 'raw' để enrich lại.
+    - Chưa có bài: upsert như bài auto-crawl.
+    """
+    archive = HtmlArchive()
+    if prune:
+        archive.prune()
+    print(f"--- [START] RE-EXTRACT TỪ KHO HTML {'(DRY RUN) ' if dry_run else ''}---")
+    await connect_to_mongo()
+    await connect_external_services()
+    articles_col = get_articles_collection()
+
+    stats: Counter = Counter()
+    since = time.time() - days * 86400 if days else None
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        batch: List[Dict] = []
+        for page in archive.iter_pages(since=since):
+            # Kho lưu hostname của URL -> lọc theo site đăng ký (kể cả subdomain)
+            if site and _site_for(page['site']) != site: continue
+            batch.append(page)
+            stats['scanned'] += 1
+            if len(batch) >= BATCH_SIZE:
+                await _process_batch(batch, archive, executor, articles_col, dry_run, stats)
+                print(f"   >> Đã xử lý: {dict(stats)}")
+                batch = []
+            if limit and stats['scanned'] >= limit: break
+        if batch:
+            await _process_batch(batch, archive, executor, articles_col, dry_run, stats)
+    finally:
+        executor.shutdown(wait=True)
+    print(f"--- [END] {dict(stats)} ---")
+    await close_connections()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract lại bài từ kho HTML thô (không crawl lại)")
+    parser.add_argument("--site", choices=list(CRAWLER_REGISTRY), help="Chỉ xử lý một site")
+    parser.add_argument("--days", type=float, help="Chỉ trang được lưu trong N ngày gần nhất")
+    parser.add_argument("--limit", type=int, help="Số trang tối đa")
+    parser.add_argument("--workers", type=int, default=max(1, EXTRACTION_WORKERS))
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ thống kê, không ghi DB")
+    parser.add_argument("--prune", action="store_true", help="Áp dụng retention (HTML_ARCHIVE_RETENTION_DAYS) trước khi chạy")
+    args = parser.parse_args()
+    if not ZSTD_AVAILABLE:
+        parser.error("Chưa cài zstandard (pip install zstandard).")
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(reextract_archive(args.site, args.days, args.limit, args.workers, args.dry_run, args.prune))
@@ -0,0 +1,141 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import PIPELINE_WORKERS, LINK_QUEUE_SIZE, SAVE_BATCH_SIZE, MAX_LISTING_PAGES, LISTING_FANOUT
+
+class ListingPrefetcher:
+    """
+    [NEW] Tải trước song song các trang danh sách: get(page) khởi động luôn page..page+fanout-1
+    (chỉ những trang dựng được URL, theo can_prefetch) rồi trả kết quả trang `page`.
+    Thứ tự XỬ LÝ vẫn tuần tự theo trang (fetch_links giữ nguyên logic dừng); số kết nối thật do limiter theo site quyết định.
+    """
+
+    def __init__(self, fetch_page: Callable[[int], Awaitable[Any]], can_prefetch: Callable[[int], bool],
+                 fanout: int = LISTING_FANOUT, max_pages: int = MAX_LISTING_PAGES):
+        self.fetch_page = fetch_page
+        self.can_prefetch = can_prefetch
+        self.fanout = max(1, fanout)
+        self.max_pages = max_pages
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def _start(self, page: int):
+        if page not in self._tasks:
+            self._tasks[page] = asyncio.create_task(self.fetch_page(page))
+
+    async def get(self, page: int) -> Any:
+        self._start(page)
+        for ahead in range(page + 1, min(page + self.fanout, self.max_pages + 1)):
+            if self.can_prefetch(ahead): self._start(ahead)
+        return await self._tasks.pop(page)
+
+    def close(self):
+        """Hủy các trang tải trước không còn dùng (topic dừng sớm / đủ quota)."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+class ListingFetchError(Exception):
+    """fetch_links raise khi TẢI trang danh sách thất bại (5xx, circuit mở, timeout) — khác với hết trang (None)."""
+
+class PipelineError(Exception):
+    """Pipeline dừng giữa chừng vì lỗi; `saved` = số bài đã lưu trước khi dừng, `cause` = lỗi gốc."""
+
+    def __init__(self, cause: BaseException, saved: int):
+        super().__init__(f"{type(cause).__name__}: {cause}")
+        self.cause = cause
+        self.saved = saved
+
+async def run_crawl_pipeline(
+    fetch_links: Callable[[int], Awaitable[Optional[List[Dict]]]],
+    process_link: Callable[[Dict], Awaitable[Optional[Dict]]],
+    save_batch: Callable[[List[Dict]], Awaitable[None]],
+    stop_event: Optional[asyncio.Event] = None,
+    workers: int = PIPELINE_WORKERS,
+    max_pages: int = MAX_LISTING_PAGES,
+) -> int:
+    """
+    [NEW] Producer/consumer cho crawl theo trang danh sách:
+    - Producer lấy lần lượt trang 1..max_pages (fetch_links(page) -> links; [] = trang không có link mới; None = dừng) và đẩy link
+      vào hàng đợi có giới hạn -> trang kế tiếp được tải trước trong khi worker còn xử lý trang hiện tại.
+    - `workers` consumer lấy link liên tục (process_link -> bài hoặc None), gom SAVE_BATCH_SIZE bài rồi save_batch.
+    - Nhịp độ do rate limiter theo site quyết định, không còn sleep cố định giữa các trang.
+    - stop_event được set (vd: đủ quota): hủy producer, bỏ các link còn trong hàng đợi, vẫn lưu phần đã xử lý.
+    - Consumer chết (vd: save_batch lỗi): hủy producer (không còn ai lấy link) rồi raise PipelineError.
+    - Producer lỗi (vd: ListingFetchError): xử lý nốt link đã xếp, lưu, rồi raise PipelineError -> caller phân biệt
+      "dừng đúng (None: chạm mốc/cutoff/hết trang)" với "dừng vì không tải được trang danh sách".
+    Trả về số bài đã lưu.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=LINK_QUEUE_SIZE)
+    stop_event = stop_event or asyncio.Event()
+    buffer: List[Dict] = []
+    saved = 0
+    save_lock = asyncio.Lock()
+
+    async def flush():
+        nonlocal saved
+        async with save_lock:
+            if not buffer: return
+            batch = buffer[:]
+            buffer.clear()
+            await save_batch(batch)
+            saved += len(batch)
+
+    async def producer():
+        for page in range(1, max_pages + 1):
+            links = await fetch_links(page)
+            if links is None: break
+            for link in links:
+                await queue.put(link)
+
+    async def consumer():
+        # Chạy tới khi bị hủy; chỉ kết thúc sớm khi lỗi -> main coroutine phát hiện qua asyncio.wait
+        while True:
+            link = await queue.get()
+            try:
+                if stop_event.is_set(): continue
+                result = await process_link(link)
+                if result:
+                    buffer.append(result)
+                    if len(buffer) >= SAVE_BATCH_SIZE:
+                        await flush()
+            finally:
+                queue.task_done()
+
+    def consumer_failure() -> Optional[BaseException]:
+        return next((t.exception() for t in consumer_tasks if t.done() and not t.cancelled() and t.exception()), None)
+
+    producer_task = asyncio.create_task(producer())
+    stop_waiter = asyncio.create_task(stop_event.wait())
+    consumer_tasks = [asyncio.create_task(consumer()) for _ in range(workers)]
+    failure: Optional[BaseException] = None
+    listing_error: Optional[BaseException] = None
+    try:
+        await asyncio.wait([producer_task, stop_waiter, *consumer_tasks], return_when=asyncio.FIRST_COMPLETED)
+        if not producer_task.done():
+            # Đủ quota (stop_event) hoặc consumer chết -> hủy lượt tải trang danh sách đang chờ / đang treo ở queue.put
+            producer_task.cancel()
+        producer_result, = await asyncio.gather(producer_task, return_exceptions=True)
+        if isinstance(producer_result, Exception):
+            print(f"[PIPELINE] Listing error: {producer_result}")
+            listing_error = producer_result
+        failure = consumer_failure()
+        if failure is None:
+            # Chờ consumer xử lý hết link đã xếp (stop_event: link còn lại bị bỏ qua), dừng ngay nếu có consumer chết
+            drained = asyncio.create_task(queue.join())
+            await asyncio.wait([drained, *consumer_tasks], return_when=asyncio.FIRST_COMPLETED)
+            drained.cancel()
+            failure = consumer_failure()
+    finally:
+        stop_waiter.cancel()
+        for task in consumer_tasks:
+            task.cancel()
+        try:
+            await flush()
+        except Exception as e:
+            failure = failure or e
+    if failure is not None:
+        print(f"[PIPELINE] Worker error: {failure}")
+        raise PipelineError(failure, saved)
+    if listing_error is not None:
+        raise PipelineError(listing_error, saved)
+    return saved
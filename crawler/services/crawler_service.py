@@ -1,21 +1,38 @@
 import datetime
 import asyncio
-import httpx
 from typing import List, Dict, Optional, Tuple, Any, Callable, Set
 import copy 
 from crawlers.base_crawler import BaseCrawler
 from config import (
     HISTORY_LIMIT, MAX_CONCURRENT_REQUESTS, QDRANT_COLLECTION, 
-    AUTO_CRAWL_MONTHS
+    AUTO_CRAWL_MONTHS, QDRANT_QUANTIZATION, QDRANT_HNSW_EF, QDRANT_RESCORE, QDRANT_OVERSAMPLING,
+    WORK_QUEUE_ENABLED
 )
 import motor.motor_asyncio
 from pymongo import UpdateOne
 from database import get_meili_client, get_qdrant_client, get_articles_collection, get_history_collection
 from services.embedding_service import get_embedding_service
-from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, MatchText
+from crawlers.http_pool import borrow_http_pool
+from services.crawl_pipeline import run_crawl_pipeline
+from services.url_aliases import record_aliases
+from services.near_dup import mark_near_duplicates
+from services.work_queue import enqueue_job
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, MatchText, SearchParams, QuantizationSearchParams
 
 SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
+def build_search_params() -> Optional[SearchParams]:
+    """[NEW] hnsw_ef + rescoring/oversampling theo profile lượng tử hóa của collection."""
+    quantization = None
+    if QDRANT_QUANTIZATION != "float32":
+        quantization = QuantizationSearchParams(rescore=QDRANT_RESCORE, oversampling=QDRANT_OVERSAMPLING)
+    hnsw_ef = QDRANT_HNSW_EF or None
+    if not hnsw_ef and not quantization:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+
+QDRANT_SEARCH_PARAMS = build_search_params()
+
 def json_serializable(obj):
     if isinstance(obj, (datetime.datetime, datetime.date)):
         return obj.isoformat()
@@ -39,11 +56,14 @@ async def qdrant_search_wrapper(client, collection_name, query_vector, **kwargs)
         print(f"[QDRANT WRAPPER ERROR] {e}")
         return []
 
+# [NEW] Trường nội bộ không cần đẩy sang Meili (chữ ký MinHash ~64 số nguyên/bài)
+MEILI_EXCLUDED_FIELDS = {'_id', 'minhash', 'minhash_bands'}
+
 async def sync_to_meilisearch(articles: List[Dict]):
     meili = get_meili_client()
     if not meili: return
     try:
-        meili_docs = [json_serializable({k:v for k,v in art.items() if k!='_id'}) for art in articles]
+        meili_docs = [json_serializable({k:v for k,v in art.items() if k not in MEILI_EXCLUDED_FIELDS}) for art in articles]
         index = meili.index("articles")
         
         # [UPDATE] Thêm ai_sentiment_label vào thuộc tính lọc
@@ -62,6 +82,45 @@ async def sync_to_meilisearch(articles: List[Dict]):
     except Exception as e:
         print(f"[MEILI ERROR] Sync failed: {e}")
 
+def matches_content_keyword(article: Dict, content_keyword: Optional[str]) -> bool:
+    """Logic OR (any): content/summary chỉ cần chứa BẤT KỲ từ khóa nào (phân tách bằng dấu phẩy)."""
+    if not content_keyword: return True
+    keywords = [k.strip().lower() for k in content_keyword.split(',') if k.strip()]
+    if not keywords: return True
+    full_text = (article.get('content') or "").lower() + " " + (article.get('summary') or "").lower()
+    return any(k in full_text for k in keywords)
+
+def shape_crawled_article(detailed: Dict, website_name, search_keyword, search_id, user_id) -> Dict:
+    """Kết quả extract_article_detail -> document bài lưu vào `articles` (dùng chung cho crawl và re-extract từ kho HTML)."""
+    extracted_tags = detailed.get('tags', [])
+    site_categories = detailed.get('site_categories', [])
+    
+    final_search_keywords = []
+    if isinstance(search_keyword, list) and search_keyword:
+        final_search_keywords.extend(search_keyword)
+    elif isinstance(search_keyword, str) and search_keyword and search_keyword != "auto_topic":
+        final_search_keywords.append(search_keyword)
+        
+    if not final_search_keywords:
+        if extracted_tags:
+            final_search_keywords = extracted_tags
+        elif site_categories:
+            final_search_keywords = site_categories[-2:]
+        else:
+            final_search_keywords = [website_name]
+
+    if 'tags' in detailed:
+        del detailed['tags']
+
+    detailed.update({
+        'website': website_name, 
+        'search_keyword': final_search_keywords, 
+        'current_search_id': search_id, 
+        'user_id': user_id, 
+        'crawled_at': datetime.datetime.now()
+    })
+    return detailed
+
 async def crawl_and_process_article(crawler, article_data, content_keyword, website_name, search_keyword, search_id, user_id):
     async with SEMAPHORE:
         try:
@@ -71,128 +130,198 @@ async def crawl_and_process_article(crawler, article_data, content_keyword, webs
             
             if detailed:
                 # [NEW LOGIC] Lọc nội dung tại đây: Tách dấu phẩy, khớp 1 từ -> lấy
-                if content_keyword:
-                    keywords = [k.strip().lower() for k in content_keyword.split(',') if k.strip()]
-                    if keywords:
-                        content_body = (detailed.get('content') or "").lower()
-                        summary_body = (detailed.get('summary') or "").lower()
-                        full_text = content_body + " " + summary_body
-                        
-                        # Logic OR (any): Chỉ cần nội dung chứa BẤT KỲ từ khóa nào trong danh sách
-                        if not any(k in full_text for k in keywords):
-                            return None # Bỏ qua bài này nếu không khớp từ nào
-
-                extracted_tags = detailed.get('tags', [])
-                site_categories = detailed.get('site_categories', [])
-                
-                final_search_keywords = []
-                if isinstance(search_keyword, list) and search_keyword:
-                    final_search_keywords.extend(search_keyword)
-                elif isinstance(search_keyword, str) and search_keyword and search_keyword != "auto_topic":
-                    final_search_keywords.append(search_keyword)
-                    
-                if not final_search_keywords:
-                    if extracted_tags:
-                        final_search_keywords = extracted_tags
-                    elif site_categories:
-                        final_search_keywords = site_categories[-2:]
-                    else:
-                        final_search_keywords = [website_name]
-
-                if 'tags' in detailed:
-                    del detailed['tags']
-
-                detailed.update({
-                    'website': website_name, 
-                    'search_keyword': final_search_keywords, 
-                    'current_search_id': search_id, 
-                    'user_id': user_id, 
-                    'crawled_at': datetime.datetime.now()
-                })
-                return detailed
+                if not matches_content_keyword(detailed, content_keyword):
+                    return None # Bỏ qua bài này nếu không khớp từ nào
+                return shape_crawled_article(detailed, website_name, search_keyword, search_id, user_id)
         except Exception as e: 
             print(f"[CRAWL ERROR] {article_data.get('url')}: {e}")
         return None
 
-async def _crawl_task_wrapper(crawler, site_name, params, s_date, e_date, s_id, col, current_quota):
-    count = 0; page = 1
-    target_count = current_quota
-    
-    print(f"[{site_name.upper()}] Start task. Quota: {target_count}")
-    
-    while count < target_count and page <= 50: 
+class CrawlQuota:
+    """
+    [NEW] Quota max_articles dùng chung cho các site crawl song song.
+    Site phải claim slot TRƯỚC khi fetch bài; bài lỗi/bị lọc thì trả slot lại cho site khác.
+    Không có await giữa đọc & ghi bộ đếm -> thao tác claim là nguyên tử trên event loop.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.claimed = 0   # slot đang giữ (bài đang fetch) + bài đã lưu
+        self.saved = 0
+        self.per_site: Dict[str, int] = {}
+        self.reused: Dict[str, int] = {}    # bài đã có trong DB, chỉ gắn thêm search_id
+        self.fetched: Dict[str, int] = {}   # link phải tải & parse lại
+        self.changed = asyncio.Condition()
+        self.filled = asyncio.Event()
+
+    async def claim(self, wanted: int) -> int:
+        """Nhận tối đa `wanted` slot; nếu hết slot nhưng site khác còn bài đang fetch thì chờ slot được trả lại."""
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.claimed < self.total or self.filled.is_set())
+            granted = min(wanted, self.total - self.claimed)
+            self.claimed += granted
+            return granted
+
+    async def settle(self, site: str, granted: int, saved: int):
+        async with self.changed:
+            self.saved += saved
+            self.claimed -= granted - saved
+            self.per_site[site] = self.per_site.get(site, 0) + saved
+            if self.saved >= self.total:
+                self.filled.set()
+            self.changed.notify_all()
+
+    def reuse_stats(self) -> Dict[str, Any]:
+        reused = sum(self.reused.values()); fetched = sum(self.fetched.values())
+        seen = reused + fetched
+        return {
+            'reused': reused, 'fetched': fetched,
+            'reuse_ratio': round(reused / seen, 3) if seen else 0.0,
+            'per_site': {site: {'reused': self.reused.get(site, 0), 'fetched': self.fetched.get(site, 0)}
+                         for site in set(self.reused) | set(self.fetched)},
+        }
+
+# Trường cần cho lọc content_keyword + cập nhật Meili của bài đã có
+_PRECHECK_PROJECTION = {'url': 1, 'article_id': 1, 'search_id': 1, 'content': 1, 'summary': 1}
+
+async def attach_existing_articles(col, links: List[Dict], params, s_id, site_name, quota: CrawlQuota) -> List[Dict]:
+    """
+    [NEW] Pre-check 1 trang kết quả: tra MỘT truy vấn $in theo url cho mọi link.
+    - Bài đã có (auto crawl / search của user khác) & khớp content_keyword: claim quota rồi gắn search_id hàng loạt
+      (update_many $addToSet + cập nhật một phần trên Meili) -> không tải/parse lại.
+    - Bài đã có nhưng không khớp content_keyword: bỏ qua luôn (tải lại cũng bị lọc).
+    Trả về các link chưa có trong DB (cần fetch).
+    """
+    urls = [l['url'] for l in links if l.get('url')]
+    if not urls: return links
+    existing = {}
+    async for doc in col.find({'url': {'$in': urls}, 'content': {'$nin': [None, ""]}}, _PRECHECK_PROJECTION):
+        existing[doc['url']] = doc
+    if not existing: return links
+
+    unknown = [l for l in links if l.get('url') not in existing]
+    matched = [d for d in existing.values() if matches_content_keyword(d, params.keyword_content)]
+    fresh = [d for d in matched if s_id not in (d.get('search_id') or [])]
+    granted = await quota.claim(len(fresh)) if fresh else 0
+    reuse = fresh[:granted]
+    if reuse:
+        try:
+            await col.update_many({'_id': {'$in': [d['_id'] for d in reuse]}}, {'$addToSet': {'search_id': s_id}})
+        except BaseException:
+            await quota.settle(site_name, granted, 0)
+            raise
+        await quota.settle(site_name, granted, granted)
+        await update_meili_search_ids(reuse, s_id)
+    quota.reused[site_name] = quota.reused.get(site_name, 0) + len(reuse)
+    return unknown
+
+async def update_meili_search_ids(docs: List[Dict], s_id):
+    """Cập nhật một phần (chỉ search_id) trên Meili cho bài đã có, không gửi lại toàn bộ nội dung."""
+    meili = get_meili_client()
+    if not meili or not docs: return
+    try:
+        partial = [
+            {'article_id': d['article_id'], 'search_id': list(dict.fromkeys((d.get('search_id') or []) + [s_id]))}
+            for d in docs if d.get('article_id')
+        ]
+        if partial:
+            await meili.index("articles").update_documents(partial, primary_key='article_id')
+    except Exception as e:
+        print(f"[MEILI ERROR] Partial update failed: {e}")
+
+async def _crawl_task_wrapper(crawler, site_name, params, s_date, e_date, s_id, col, quota: CrawlQuota):
+    print(f"[{site_name.upper()}] Start task. Shared quota: {quota.total}")
+
+    async def fetch_links(page: int) -> Optional[List[Dict]]:
+        if quota.filled.is_set(): return None
         soup = await crawler.fetch_search_page(params.keyword_search, page, s_date.strftime('%Y-%m-%d'), e_date.strftime('%Y-%m-%d'))
-        if not soup: break
-        
+        if not soup: return None
         links = crawler.extract_article_links(soup, is_search_page=True)
-        if not links: break
-            
-        print(f"[{site_name}] Page {page}: Found {len(links)} links.")
-        
-        sub_tasks = []
-        for link in links:
-            if count + len(sub_tasks) >= target_count: 
-                break
-            
-            sub_tasks.append(crawl_and_process_article(crawler, link, params.keyword_content, site_name, params.keyword_search, s_id, params.user_id))
-        
-        if not sub_tasks: break
-        
-        res = await asyncio.gather(*sub_tasks)
-        valid_articles = [r for r in res if r]
-        
-        if valid_articles:
-            print(f"[{site_name}] Page {page}: Success {len(valid_articles)} articles.")
-            ops = []
-            current_search_id = s_id
-            for d in valid_articles:
-                current_search_id = d.pop('current_search_id', s_id)
-                update_query = {'$set': d, '$addToSet': {'search_id': current_search_id}}
-                ops.append(UpdateOne({'url': d['url']}, update_query, upsert=True))
-            if ops: await col.bulk_write(ops, ordered=False)
-            
-            for d in valid_articles: d['search_id'] = [current_search_id]
-            await sync_to_meilisearch(valid_articles)
-            
-            count += len(valid_articles)
-        
-        if count >= target_count:
-            break
-            
-        page += 1
-        await asyncio.sleep(1)
+        if not links: return None
+        await record_aliases(links)
+        # [NEW] Chỉ fetch link chưa có trong DB; bài đã có được gắn search_id ngay tại đây
+        unknown = await attach_existing_articles(col, links, params, s_id, site_name, quota)
+        print(f"[{site_name}] Page {page}: Found {len(links)} links, {len(unknown)} to fetch.")
+        return unknown
+
+    async def process_link(link: Dict) -> Optional[Dict]:
+        # Claim slot quota TRƯỚC khi fetch; bài lỗi/bị lọc -> trả slot
+        if not await quota.claim(1): return None
+        quota.fetched[site_name] = quota.fetched.get(site_name, 0) + 1
+        try:
+            result = await crawl_and_process_article(crawler, link, params.keyword_content, site_name, params.keyword_search, s_id, params.user_id)
+        except BaseException:
+            await quota.settle(site_name, 1, 0)
+            raise
+        await quota.settle(site_name, 1, 1 if result else 0)
+        return result
+
+    async def save_batch(valid_articles: List[Dict]):
+        ops = []
+        current_search_id = s_id
+        # [NEW] Đánh dấu bản sao gần trùng trước khi lưu (enrichment_worker sẽ dùng lại kết quả bài gốc)
+        await mark_near_duplicates(col, valid_articles)
+        for d in valid_articles:
+            current_search_id = d.pop('current_search_id', s_id)
+            update_query = {'$set': d, '$addToSet': {'search_id': current_search_id}}
+            ops.append(UpdateOne({'url': d['url']}, update_query, upsert=True))
+        if ops: await col.bulk_write(ops, ordered=False)
         
-    return count
+        for d in valid_articles: d['search_id'] = [current_search_id]
+        await sync_to_meilisearch(valid_articles)
+        print(f"[{site_name}] Saved {len(valid_articles)} articles.")
+
+    # [UPDATE] Pipeline liên tục thay cho vòng lặp trang + sleep(1); dừng ngay khi đủ quota chung
+    return await run_crawl_pipeline(fetch_links, process_link, save_batch, stop_event=quota.filled)
 
 async def execute_crawl_task(crawlers_map, params, search_id):
     articles_col = get_articles_collection()
     start_dt = datetime.datetime.strptime(params.start_date, '%d/%m/%Y')
     end_dt = datetime.datetime.strptime(params.end_date, '%d/%m/%Y')
     
-    total_new_articles = 0
-    remaining_quota = params.max_articles
+    quota = CrawlQuota(params.max_articles)
     
-    browser_headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7'
-    }
-    
-    async with httpx.AsyncClient(headers=browser_headers, timeout=60.0, follow_redirects=True) as client:
+    # [UPDATE] Mượn pool HTTP dùng chung của ứng dụng thay vì tạo AsyncClient mới cho mỗi request
+    # [UPDATE] Các site chạy SONG SONG trên cùng một quota; đủ max_articles thì pipeline của mỗi site
+    # tự hủy lượt tải trang danh sách đang chờ và bỏ các link còn lại (bài đã xử lý vẫn được lưu).
+    async with borrow_http_pool() as client:
+        site_tasks = {}
         for name, crawler in crawlers_map.items():
-            if remaining_quota <= 0:
-                print(f"[CRAWL MANAGER] Quota reached ({params.max_articles}). Skipping {name}.")
-                continue
-                
             crawler.client = client
-            count_from_site = await _crawl_task_wrapper(crawler, name, params, start_dt, end_dt, search_id, articles_col, remaining_quota)
-            
-            total_new_articles += count_from_site
-            remaining_quota -= count_from_site
-            
-            print(f"[CRAWL MANAGER] {name} got {count_from_site}. Remaining quota: {remaining_quota}")
+            site_tasks[name] = asyncio.create_task(
+                _crawl_task_wrapper(crawler, name, params, start_dt, end_dt, search_id, articles_col, quota)
+            )
+        results = await asyncio.gather(*site_tasks.values(), return_exceptions=True)
+
+    for name, result in zip(site_tasks, results):
+        if isinstance(result, Exception):
+            print(f"[CRAWL MANAGER] {name} error: {result}")
+        print(f"[CRAWL MANAGER] {name} got {quota.per_site.get(name, 0)}.")
+    print(f"[CRAWL MANAGER] Total {quota.saved}/{quota.total}.")
 
-    return total_new_articles
+    # [NEW] Tỉ lệ tái sử dụng bài đã có (không phải tải lại) của lượt crawl này
+    stats = quota.reuse_stats()
+    print(f"[CRAWL MANAGER] Reused {stats['reused']} / fetched {stats['fetched']} (reuse ratio {stats['reuse_ratio']:.0%}).")
+    try:
+        await get_history_collection().update_one({'search_id': search_id}, {'$set': {'crawl_stats': stats}})
+    except Exception as e:
+        print(f"[CRAWL MANAGER] Save crawl stats failed: {e}")
+
+    return quota.saved
+
+async def run_search_crawl(crawlers_map, crawl_params, search_id, total_found_in_db: int) -> int:
+    """Crawl phần còn thiếu của một lượt tìm kiếm rồi đánh dấu history 'completed' (chạy nền hoặc trong worker.py)."""
+    print(f"[BACKGROUND] Starting crawl for {crawl_params.max_articles} items...")
+    new_count = await execute_crawl_task(crawlers_map, crawl_params, search_id)
+    final_total = total_found_in_db + new_count
+    
+    history_col = get_history_collection()
+    await history_col.update_one(
+        {'search_id': search_id},
+        {'$set': {'status': 'completed', 'total_saved': final_total, 'updated_at': datetime.datetime.now()}}
+    )
+    print(f"[BACKGROUND] Finished. Total: {final_total}")
+    return final_total
 
 async def perform_hybrid_search(params, crawlers_map, search_id) -> Tuple[int, str, Optional[Callable]]:
     meili = get_meili_client()
@@ -292,16 +421,18 @@ async def perform_hybrid_search(params, crawlers_map, search_id) -> Tuple[int, s
             crawl_params.end_date = new_end_date
 
         async def background_crawl_and_update():
-            print(f"[BACKGROUND] Starting crawl for {missing_count} items...")
-            new_count = await execute_crawl_task(crawlers_map, crawl_params, search_id)
-            final_total = total_found_in_db + new_count
-            
-            history_col = get_history_collection()
-            await history_col.update_one(
-                {'search_id': search_id},
-                {'$set': {'status': 'completed', 'total_saved': final_total, 'updated_at': datetime.datetime.now()}}
-            )
-            print(f"[BACKGROUND] Finished. Total: {final_total}")
+            if WORK_QUEUE_ENABLED:
+                # [NEW] Chế độ hàng đợi: API chỉ xếp job, worker.py dựng lại crawler theo tên site và crawl
+                try: params_doc = crawl_params.model_dump()
+                except AttributeError: params_doc = crawl_params.dict()
+                await enqueue_job(
+                    'search_crawl',
+                    {'params': params_doc, 'sites': list(crawlers_map), 'search_id': search_id, 'total_found_in_db': total_found_in_db},
+                    dedupe_key=f"search:{search_id}", priority=2
+                )
+                print(f"[QUEUE] Đã xếp job crawl cho search {search_id}.")
+                return
+            await run_search_crawl(crawlers_map, crawl_params, search_id, total_found_in_db)
 
         return total_found_in_db, "processing", background_crawl_and_update
 
@@ -354,6 +485,7 @@ async def search_relevant_articles_for_chat(user_query: str, top_k: int = 3, use
             query_vector=query_vector, 
             query_filter=search_filter, 
             limit=top_k, 
+            search_params=QDRANT_SEARCH_PARAMS,
             with_payload=True
         )
         
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import functools
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from config import LEASE_TTL_SECONDS, LEASE_RENEW_SECONDS
+from database import get_leases_collection
+from services.work_queue import make_worker_id
+
+class LeaseManager:
+    """
+    [NEW] Bầu leader theo TỪNG job định kỳ qua collection lease trên Mongo (mỗi job một document _id = tên job):
+    - Replica giữ lease gia hạn mỗi LEASE_RENEW_SECONDS; lease hết hạn sau LEASE_TTL_SECONDS không gia hạn.
+    - Replica chết/treo -> lease hết hạn -> replica khác chiếm ở nhịp kế tiếp (failover tự động).
+    - Tắt êm (stop) trả lease ngay -> replica khác nhận không cần chờ TTL.
+    Các job khác nhau có thể do các replica khác nhau giữ -> tải định kỳ được chia ra.
+    """
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or make_worker_id()
+        self._held: Dict[str, datetime.datetime] = {}     # tên job -> hạn lease theo đồng hồ cục bộ
+        self._callbacks: Dict[str, tuple] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, on_acquire: Optional[Callable] = None, on_release: Optional[Callable[[], Awaitable]] = None):
+        """on_acquire/on_release: bật/tắt việc chạy liên tục (vd: lịch thích ứng) khi nhận/mất lease."""
+        self._callbacks[name] = (on_acquire, on_release)
+
+    def is_leader(self, name: str) -> bool:
+        expires = self._held.get(name)
+        return bool(expires and expires > datetime.datetime.utcnow())
+
+    def leader_only(self, name: str, func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Bọc job APScheduler: replica không giữ lease bỏ qua lượt chạy."""
+        if name not in self._callbacks:
+            self.register(name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not self.is_leader(name): return None
+            return await func(*args, **kwargs)
+        return wrapper
+
+    async def _try_acquire(self, name: str) -> bool:
+        now = datetime.datetime.utcnow()
+        update = {'holder': self.owner, 'expires_at': now + datetime.timedelta(seconds=LEASE_TTL_SECONDS), 'renewed_at': now}
+        if name not in self._held:
+            update['acquired_at'] = now
+        try:
+            # Chỉ khớp khi lease là của mình hoặc đã hết hạn; document chưa tồn tại -> upsert.
+            # Lease đang do replica khác giữ -> upsert đụng _id -> DuplicateKeyError = không giành được.
+            await get_leases_collection().update_one(
+                {'_id': name, '$or': [{'holder': self.owner}, {'expires_at': {'$lt': now}}]},
+                {'$set': update, '$inc': {'terms': 1 if name not in self._held else 0}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        self._held[name] = update['expires_at']
+        return True
+
+    async def _tick(self):
+        for name, (on_acquire, on_release) in self._callbacks.items():
+            was_leader = name in self._held
+            try:
+                leader = await self._try_acquire(name)
+            except Exception as e:
+                # Không liên lạc được Mongo: còn giữ tới hạn cục bộ; quá hạn thì tự coi như mất lease
+                print(f"[LEASE] Renew '{name}' failed: {e}")
+                leader = self.is_leader(name)
+            if not leader:
+                self._held.pop(name, None)
+            if leader and not was_leader:
+                print(f"[LEASE] {self.owner} nhận lease '{name}'.")
+                if on_acquire: on_acquire()
+            elif was_leader and not leader:
+                print(f"[LEASE] {self.owner} mất lease '{name}'.")
+                if on_release: await on_release()
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[LEASE] Loop error: {e}")
+            await asyncio.sleep(LEASE_RENEW_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for name in list(self._held):
+            _, on_release = self._callbacks.get(name, (None, None))
+            if on_release: await on_release()
+            try:
+                await get_leases_collection().update_one(
+                    {'_id': name, 'holder': self.owner},
+                    {'$set': {'expires_at': datetime.datetime.utcnow()}}
+                )
+            except Exception as e:
+                print(f"[LEASE] Release '{name}' failed: {e}")
+        self._held.clear()
+
+    async def snapshot(self) -> Dict:
+        now = datetime.datetime.utcnow()
+        leases = await get_leases_collection().find({}).to_list(length=None)
+        return {
+            'instance': self.owner,
+            'leases': [
+                {
+                    'job': doc['_id'],
+                    'holder': doc.get('holder'),
+                    'is_me': doc.get('holder') == self.owner,
+                    'alive': bool(doc.get('expires_at') and doc['expires_at'] > now),
+                    'expires_in_seconds': round((doc['expires_at'] - now).total_seconds(), 1) if doc.get('expires_at') else None,
+                    'acquired_at': doc.get('acquired_at'),
+                    'terms': doc.get('terms', 0)
+                }
+                for doc in leases
+            ]
+        }
@@ -0,0 +1,114 @@
+import hashlib
+import random
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import (
+    NEAR_DUP_ENABLED, NEAR_DUP_MIN_CHARS, NEAR_DUP_SHINGLE, NEAR_DUP_THRESHOLD,
+    MINHASH_PERMUTATIONS, MINHASH_BANDS
+)
+from utils import normalize_keyword
+
+# MinHash-LSH trên shingle k-từ: chữ ký MINHASH_PERMUTATIONS giá trị, chia MINHASH_BANDS dải.
+# Hai bài có Jaccard J trùng ít nhất 1 dải với xác suất 1 - (1 - J^r)^b (r = số hàng/dải):
+# với 64/16 -> J=0.8: ~100%, J=0.3: ~12%, bài không liên quan (J~0): ~0 -> ứng viên ít, rồi xác nhận bằng Jaccard ước lượng.
+_MERSENNE_PRIME = (1 << 61) - 1
+_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+_rng = random.Random(20240101)   # seed cố định: chữ ký phải giống nhau giữa các tiến trình/lần chạy
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+
+def _shingles(text: str, k: int = NEAR_DUP_SHINGLE) -> Set[str]:
+    # So khớp trên văn bản đã bỏ dấu/chữ thường -> khác biệt nhỏ về định dạng, dấu câu không làm lệch chữ ký
+    words = [w for w in normalize_keyword(text).split() if w.isalnum()]
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def minhash(text: str) -> Optional[List[int]]:
+    """Chữ ký MinHash của nội dung bài (None nếu không có shingle)."""
+    hashes = [int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big") for sh in _shingles(text)]
+    if not hashes: return None
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+def minhash_bands(signature: List[int]) -> List[str]:
+    bands = []
+    for i in range(MINHASH_BANDS):
+        rows = ",".join(str(v) for v in signature[i * _ROWS:(i + 1) * _ROWS])
+        bands.append(f"{i}:{hashlib.blake2b(rows.encode('ascii'), digest_size=8).hexdigest()}")
+    return bands
+
+def estimated_jaccard(a: List[int], b: List[int]) -> float:
+    if not a or not b or len(a) != len(b): return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+async def mark_near_duplicates(articles_col, articles: List[Dict]) -> int:
+    """
+    [NEW] Chạy lúc lưu (trước bulk_write): gắn minhash/minhash_bands cho từng bài, và 'dup_of' = article_id
+    bài gốc nếu tìm thấy bài khác (trong DB hoặc cùng lô) có Jaccard ước lượng >= NEAR_DUP_THRESHOLD.
+    Bài gốc luôn là bài KHÔNG phải bản sao -> chuỗi dup_of chỉ sâu 1 cấp. Trả về số bản sao tìm thấy.
+    """
+    if not NEAR_DUP_ENABLED or not articles: return 0
+    fingerprints: List[Tuple[Dict, List[int]]] = []
+    for art in articles:
+        content = art.get('content') or ""
+        if len(content) < NEAR_DUP_MIN_CHARS: continue
+        signature = minhash(content)
+        if signature is None: continue
+        art['minhash'] = signature
+        art['minhash_bands'] = minhash_bands(signature)
+        fingerprints.append((art, signature))
+    if not fingerprints: return 0
+
+    all_bands = list({band for art, _ in fingerprints for band in art['minhash_bands']})
+    urls = [art['url'] for art, _ in fingerprints]
+    candidates: List[Tuple[str, str, List[int]]] = []
+    try:
+        # Một truy vấn $in cho cả lô trên index multikey minhash_bands
+        cursor = articles_col.find(
+            {'minhash_bands': {'$in': all_bands}, 'dup_of': None, 'url': {'$nin': urls}},
+            {'article_id': 1, 'url': 1, 'minhash': 1, '_id': 0}
+        )
+        async for doc in cursor:
+            if doc.get('article_id') and doc.get('minhash'):
+                candidates.append((doc['article_id'], doc['url'], doc['minhash']))
+    except Exception as e:
+        print(f"[NEAR-DUP] Lookup failed: {e}")
+        return 0
+
+    found = 0
+    for art, signature in fingerprints:
+        best = None
+        for article_id, url, other in candidates:
+            if url == art['url']: continue
+            similarity = estimated_jaccard(signature, other)
+            if similarity >= NEAR_DUP_THRESHOLD and (best is None or similarity > best[1]):
+                best = (article_id, similarity)
+        if best:
+            art['dup_of'] = best[0]
+            art['dup_similarity'] = round(best[1], 3)
+            found += 1
+        else:
+            art['dup_of'] = None
+            # Bài gốc mới -> bài sau trong cùng lô có thể là bản sao của nó
+            if art.get('article_id'):
+                candidates.append((art['article_id'], art['url'], signature))
+    if found:
+        print(f"[NEAR-DUP] {found}/{len(fingerprints)} bài là bản sao gần trùng.")
+    return found
+
+# Thống kê compute enrichment tiết kiệm được nhờ dùng lại kết quả của bài gốc (theo tiến trình)
+enrichment_stats: Counter = Counter()
+
+def snapshot_enrichment_stats() -> Dict:
+    total = enrichment_stats['computed'] + enrichment_stats['reused']
+    return {
+        **enrichment_stats,
+        'reuse_ratio': round(enrichment_stats['reused'] / total, 3) if total else 0.0
+    }
+
+async def ensure_near_dup_index(articles_col):
+    """Index multikey cho tra cứu ứng viên theo dải MinHash (chạy lúc khởi động, idempotent)."""
+    try:
+        await articles_col.create_index('minhash_bands', sparse=True)
+    except Exception as e:
+        print(f"[NEAR-DUP] Create index failed: {e}")
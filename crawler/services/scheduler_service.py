@@ -2,8 +2,7 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import datetime
 import asyncio
-import httpx
-from typing import List, Optional
+from typing import List, Dict, Optional
 import sys
 import uuid 
 
@@ -14,14 +13,24 @@ from database import (
 from services.ai_service import analyze_content_local
 from services.embedding_service import get_embedding_service
 from services.crawler_service import crawl_and_process_article, sync_to_meilisearch
-from config import AUTO_CRAWL_MONTHS, HEADERS, REQUEST_TIMEOUT, RETRY_COUNT, QDRANT_COLLECTION
+from config import AUTO_CRAWL_MONTHS, HEADERS, RETRY_COUNT, QDRANT_COLLECTION, HIGH_WATER_WINDOW_HOURS, AUTO_CRAWL_MODE
+from config import WORK_QUEUE_ENABLED, ENRICH_CLAIM_TIMEOUT_MINUTES
 from pymongo import UpdateOne
-from utils import split_text_into_chunks
+from utils import split_text_into_chunks, normalize_topics, normalize_sentiment
 
 from crawlers.vnexpress_crawler import VnExpressCrawler
 from crawlers.vneconomy_crawler import VneconomyCrawler
 from crawlers.cafef_crawler import CafeFCrawler
-from qdrant_client.models import PointStruct 
+from crawlers.http_pool import borrow_http_pool
+from services.crawl_pipeline import run_crawl_pipeline, ListingPrefetcher, ListingFetchError, PipelineError
+from services.url_frontier import get_url_frontier
+from services.url_aliases import record_aliases, article_id_for
+from services.near_dup import mark_near_duplicates, enrichment_stats, snapshot_enrichment_stats
+from services.topic_scheduler import AdaptiveTopicScheduler, merge_publish_dates, plan_next_visit
+from services.work_queue import enqueue_job
+from services.leader_lease import LeaseManager
+from bson import ObjectId
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
 
 scheduler = AsyncIOScheduler()
 
@@ -90,7 +99,10 @@ async def process_user_articles_ai(user_id: str, update_id: str) -> int:
                     "user_id": user_id,
                     "update_id": update_id,
                     "sentiment_label": updates['ai_sentiment_label'],
-                    "sentiment_score": updates['ai_sentiment_score']
+                    "sentiment_score": updates['ai_sentiment_score'],
+                    # [NEW] Trường chuẩn hóa để lọc bằng một MatchValue
+                    "topic_norm": normalize_topics(article.get('site_categories') or article.get('topic')),
+                    "sentiment_norm": normalize_sentiment(updates['ai_sentiment_label'])
                 }
                 
                 # Chuẩn hóa ngày tháng
@@ -134,7 +146,185 @@ async def process_user_articles_ai(user_id: str, update_id: str) -> int:
     print(f"[MY_ARTICLES] Hoàn tất. Đã xử lý {processed_count}/{len(articles)} bài.")
     return processed_count
 
-# [BACKGROUND] Worker chạy ngầm định kỳ cho bài Crawl (Giữ nguyên)
+def _normalize_search_ids(article: Dict) -> List[str]:
+    s_id_val = article.get('search_id')
+    if not s_id_val: s_id_val = ['system_auto']
+    elif isinstance(s_id_val, str): s_id_val = [s_id_val]
+    return s_id_val
+
+def _build_article_payload(article: Dict, updates: Dict) -> Dict:
+    return {
+        "article_id": article.get('article_id'),
+        "user_id": article.get('user_id', 'system'),
+        "search_id": _normalize_search_ids(article), 
+        "title": article.get('title', ''),
+        "url": article.get('url', ''),
+        "website": article.get('website'),
+        "publish_date": article.get('publish_date').isoformat() if article.get('publish_date') else None,
+        "sentiment": updates.get('ai_sentiment_score', 0.0),
+        "sentiment_label": updates.get('ai_sentiment_label', "Trung tính"),
+        "topic": article.get('site_categories', []),
+        # [NEW] Trường chuẩn hóa để lọc bằng một MatchValue
+        "topic_norm": normalize_topics(article.get('site_categories', [])),
+        "sentiment_norm": normalize_sentiment(updates.get('ai_sentiment_label'))
+    }
+
+async def _sync_enriched_to_meili(article: Dict, updates: Dict):
+    try:
+        article.update(updates)
+        article['search_id'] = _normalize_search_ids(article)
+        await sync_to_meilisearch([article])
+    except Exception as e:
+        print(f"[MEILI ERROR] Sync failed: {e}")
+
+async def enrich_article(article: Dict, articles_col, qdrant, meili, embed_service):
+    content_for_analysis = article.get('content', '')
+    if not content_for_analysis:
+        content_for_analysis = article.get('summary', '')
+
+    if len(content_for_analysis) < 50:
+        updates = {
+            'last_enriched_at': datetime.datetime.now(),
+            'ai_summary': [],
+            'ai_sentiment_score': 0.0,
+            'ai_sentiment_label': "Trung tính",
+            'status': 'enriched'
+        }
+    else:
+        ai_result = await analyze_content_local(content_for_analysis)
+        raw_summary = ai_result.get('summary', [])
+        final_summary = raw_summary[:3] if raw_summary else []
+
+        updates = {
+            'last_enriched_at': datetime.datetime.now(),
+            'ai_summary': final_summary,
+            'ai_sentiment_score': ai_result.get('sentiment_score', 0.0),
+            'ai_sentiment_label': ai_result.get('sentiment_label', "Trung tính"),
+            'status': 'enriched'
+        }
+    
+    await articles_col.update_one({'_id': article['_id']}, {'$set': updates})
+    
+    if meili:
+        await _sync_enriched_to_meili(article, updates)
+
+    if qdrant and updates['status'] == 'enriched':
+        points = []
+        content_text = article.get('content', '') or article.get('summary', '')
+        base_payload = _build_article_payload(article, updates)
+
+        chunks = split_text_into_chunks(article.get('article_id'), content_text)
+        for chunk in chunks:
+            vector = await embed_service.get_embedding_async(chunk['text'])
+            if not vector: continue
+            qdrant_chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk['chunk_id']))
+            chunk_payload = base_payload.copy()
+            chunk_payload.update({
+                "type": "chunk",
+                "chunk_id": chunk['chunk_id'],
+                "text": chunk['text']
+            })
+            points.append(PointStruct(id=qdrant_chunk_id, vector=vector, payload=chunk_payload))
+        
+        ai_summary_list = updates.get('ai_summary', [])
+        if ai_summary_list:
+            summary_text_joined = "\n".join(ai_summary_list)
+            summary_vector = await embed_service.get_embedding_async(summary_text_joined)
+            if summary_vector:
+                summary_point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{article.get('article_id')}_summary"))
+                summary_payload = base_payload.copy()
+                summary_payload.update({
+                    "type": "ai_summary",
+                    "summary_text": ai_summary_list
+                })
+                points.append(PointStruct(id=summary_point_id, vector=summary_vector, payload=summary_payload))
+
+        if points:
+            if hasattr(qdrant, 'upsert'):
+                await qdrant.upsert(collection_name=QDRANT_COLLECTION, points=points)
+        enrichment_stats['embeddings_computed'] += len(points)
+    enrichment_stats['computed'] += 1
+
+async def reuse_canonical_enrichment(article: Dict, canonical: Dict, articles_col, qdrant, meili) -> bool:
+    """
+    [NEW] Bản sao gần trùng: chép ai_summary/sentiment của bài gốc và nhân bản các điểm Qdrant
+    (chunk + ai_summary) của bài gốc với id/payload của bản sao -> không chạy lại model nào.
+    False nếu bài gốc chưa có vector (để worker tự enrich như bài thường).
+    """
+    reused_points = []
+    if qdrant:
+        # Bài dài có thể > 1 trang scroll -> đi hết next_page_offset, thiếu chunk thì bản sao tìm không ra đoạn đó
+        source_points, offset = [], None
+        while True:
+            page, offset = await qdrant.scroll(
+                collection_name=QDRANT_COLLECTION,
+                scroll_filter=Filter(must=[FieldCondition(key="article_id", match=MatchValue(value=canonical['article_id']))]),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            source_points.extend(page)
+            if offset is None: break
+        if not source_points: return False
+
+    updates = {
+        'last_enriched_at': datetime.datetime.now(),
+        'ai_summary': canonical.get('ai_summary', []),
+        'ai_sentiment_score': canonical.get('ai_sentiment_score', 0.0),
+        'ai_sentiment_label': canonical.get('ai_sentiment_label', "Trung tính"),
+        'status': 'enriched',
+        'enrichment_source': canonical['article_id']
+    }
+
+    if qdrant:
+        base_payload = _build_article_payload(article, updates)
+        article_id = article.get('article_id')
+        for point in source_points:
+            src = point.payload or {}
+            payload = base_payload.copy()
+            if src.get('type') == 'ai_summary':
+                point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{article_id}_summary"))
+                payload.update({"type": "ai_summary", "summary_text": src.get('summary_text', [])})
+            else:
+                chunk_index = str(src.get('chunk_id', '')).rsplit('_', 1)[-1]
+                chunk_id = f"{article_id}_{chunk_index}"
+                point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk_id))
+                payload.update({"type": "chunk", "chunk_id": chunk_id, "text": src.get('text', '')})
+            reused_points.append(PointStruct(id=point_id, vector=point.vector, payload=payload))
+        await qdrant.upsert(collection_name=QDRANT_COLLECTION, points=reused_points)
+
+    await articles_col.update_one({'_id': article['_id']}, {'$set': updates})
+    if meili:
+        await _sync_enriched_to_meili(article, updates)
+
+    enrichment_stats['reused'] += 1
+    enrichment_stats['inference_saved'] += 1           # 1 lượt summarize + sentiment
+    enrichment_stats['embeddings_saved'] += len(reused_points)
+    return True
+
+async def claim_articles_for_enrichment(articles_col, limit: int = 20) -> List[Dict]:
+    """
+    [NEW] Nhận bài cần enrich an toàn khi NHIỀU worker cùng chạy: chỉ bài còn ở trạng thái chờ lúc update
+    mới được gắn claim_token của lượt này -> hai worker không bao giờ xử lý trùng một bài.
+    Bài kẹt 'processing' quá ENRICH_CLAIM_TIMEOUT_MINUTES (worker chết giữa chừng) được nhận lại.
+    """
+    now = datetime.datetime.now()
+    claimable = {'$or': [
+        {'status': {'$in': ['raw', 'ai_error']}},
+        {'status': 'processing', 'claimed_at': {'$lt': now - datetime.timedelta(minutes=ENRICH_CLAIM_TIMEOUT_MINUTES)}}
+    ]}
+    # Bài gốc (dup_of = null) được lấy trước bản sao -> bản sao thường gặp bài gốc đã enrich
+    candidates = await articles_col.find(claimable, {'_id': 1}).sort('dup_of', 1).limit(limit).to_list(length=limit)
+    if not candidates: return []
+    token = uuid.uuid4().hex
+    await articles_col.update_many(
+        {'_id': {'$in': [doc['_id'] for doc in candidates]}, **claimable},
+        {'$set': {'status': 'processing', 'claim_token': token, 'claimed_at': now}}
+    )
+    return await articles_col.find({'claim_token': token, 'status': 'processing'}).sort('dup_of', 1).to_list(length=limit)
+
+# [BACKGROUND] Worker chạy ngầm định kỳ cho bài Crawl
 async def enrichment_worker():
     articles_col = get_articles_collection()
     qdrant = get_qdrant_client()
@@ -142,173 +332,272 @@ async def enrichment_worker():
     embed_service = get_embedding_service()
     
     try:
-        cursor = articles_col.find({'status': {'$in': ['raw', 'ai_error']}}).limit(20)
-        articles = await cursor.to_list(length=20)
+        # [UPDATE] find + update_many cũ có thể cho 2 worker cùng một bài -> nhận bài nguyên tử theo claim_token
+        articles = await claim_articles_for_enrichment(articles_col)
     except Exception: return
 
     if not articles: return
     
     print(f"[WORKER] Bắt đầu xử lý AI cho {len(articles)} bài viết...")
-    
-    ids_to_process = [doc['_id'] for doc in articles]
-    await articles_col.update_many(
-        {'_id': {'$in': ids_to_process}},
-        {'$set': {'status': 'processing'}}
-    )
 
-    for article in articles:
-        try:
-            content_for_analysis = article.get('content', '')
-            if not content_for_analysis:
-                content_for_analysis = article.get('summary', '')
-
-            if len(content_for_analysis) < 50:
-                updates = {
-                    'last_enriched_at': datetime.datetime.now(),
-                    'ai_summary': [],
-                    'ai_sentiment_score': 0.0,
-                    'ai_sentiment_label': "Trung tính",
-                    'status': 'enriched'
-                }
-            else:
-                ai_result = await analyze_content_local(content_for_analysis)
-                raw_summary = ai_result.get('summary', [])
-                final_summary = raw_summary[:3] if raw_summary else []
-
-                updates = {
-                    'last_enriched_at': datetime.datetime.now(),
-                    'ai_summary': final_summary,
-                    'ai_sentiment_score': ai_result.get('sentiment_score', 0.0),
-                    'ai_sentiment_label': ai_result.get('sentiment_label', "Trung tính"),
-                    'status': 'enriched'
-                }
-            
-            await articles_col.update_one({'_id': article['_id']}, {'$set': updates})
-            
-            if meili:
-                try:
-                    article.update(updates)
-                    s_id_val = article.get('search_id')
-                    if not s_id_val: s_id_val = ['system_auto']
-                    elif isinstance(s_id_val, str): s_id_val = [s_id_val]
-                    article['search_id'] = s_id_val
-                    await sync_to_meilisearch([article])
-                except Exception as e:
-                    print(f"[MEILI ERROR] Sync failed: {e}")
-
-            if qdrant and updates['status'] == 'enriched':
-                points = []
-                content_text = article.get('content', '') or article.get('summary', '')
-                
-                s_id_val = article.get('search_id')
-                if not s_id_val: s_id_val = ['system_auto']
-                elif isinstance(s_id_val, str): s_id_val = [s_id_val]
+    originals = [a for a in articles if not a.get('dup_of')]
+    duplicates = [a for a in articles if a.get('dup_of')]
 
-                base_payload = {
-                    "article_id": article.get('article_id'),
-                    "user_id": article.get('user_id', 'system'),
-                    "search_id": s_id_val, 
-                    "title": article.get('title', ''),
-                    "url": article.get('url', ''),
-                    "website": article.get('website'),
-                    "publish_date": article.get('publish_date').isoformat() if article.get('publish_date') else None,
-                    "sentiment": updates.get('ai_sentiment_score', 0.0),
-                    "sentiment_label": updates.get('ai_sentiment_label', "Trung tính"),
-                    "topic": article.get('site_categories', []) 
-                }
+    for article in originals:
+        try:
+            await enrich_article(article, articles_col, qdrant, meili, embed_service)
+        except Exception as e:
+            print(f"[WORKER ERROR] Lỗi bài {article.get('url')}: {e}")
+            await articles_col.update_one({'_id': article['_id']}, {'$set': {'status': 'ai_error'}})
 
-                chunks = split_text_into_chunks(article.get('article_id'), content_text)
-                for chunk in chunks:
-                    vector = await embed_service.get_embedding_async(chunk['text'])
-                    if not vector: continue
-                    qdrant_chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk['chunk_id']))
-                    chunk_payload = base_payload.copy()
-                    chunk_payload.update({
-                        "type": "chunk",
-                        "chunk_id": chunk['chunk_id'],
-                        "text": chunk['text']
-                    })
-                    points.append(PointStruct(id=qdrant_chunk_id, vector=vector, payload=chunk_payload))
-                
-                ai_summary_list = updates.get('ai_summary', [])
-                if ai_summary_list:
-                    summary_text_joined = "\n".join(ai_summary_list)
-                    summary_vector = await embed_service.get_embedding_async(summary_text_joined)
-                    if summary_vector:
-                        summary_point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{article.get('article_id')}_summary"))
-                        summary_payload = base_payload.copy()
-                        summary_payload.update({
-                            "type": "ai_summary",
-                            "summary_text": ai_summary_list
-                        })
-                        points.append(PointStruct(id=summary_point_id, vector=summary_vector, payload=summary_payload))
+    # [NEW] Bản sao gần trùng: tra bài gốc SAU khi xử lý bài gốc cùng lô
+    canonicals = {}
+    if duplicates:
+        cursor = articles_col.find(
+            {'article_id': {'$in': list({a['dup_of'] for a in duplicates})}},
+            {'article_id': 1, 'status': 1, 'ai_summary': 1, 'ai_sentiment_score': 1, 'ai_sentiment_label': 1}
+        )
+        canonicals = {doc['article_id']: doc async for doc in cursor}
 
-                if points:
-                    if hasattr(qdrant, 'upsert'):
-                        await qdrant.upsert(collection_name=QDRANT_COLLECTION, points=points)
-                    
+    for article in duplicates:
+        try:
+            canonical = canonicals.get(article['dup_of'])
+            if canonical and canonical.get('status') in ('raw', 'processing'):
+                # Bài gốc chưa enrich xong -> trả bản sao về hàng đợi, lượt sau dùng lại kết quả
+                await articles_col.update_one({'_id': article['_id']}, {'$set': {'status': 'raw'}})
+                continue
+            if canonical and canonical.get('status') == 'enriched':
+                if await reuse_canonical_enrichment(article, canonical, articles_col, qdrant, meili):
+                    continue
+            await enrich_article(article, articles_col, qdrant, meili, embed_service)
         except Exception as e:
             print(f"[WORKER ERROR] Lỗi bài {article.get('url')}: {e}")
             await articles_col.update_one({'_id': article['_id']}, {'$set': {'status': 'ai_error'}})
             
-    print(f"[WORKER] Hoàn tất batch {len(articles)} bài.")
+    print(f"[WORKER] Hoàn tất batch {len(articles)} bài. Enrichment: {snapshot_enrichment_stats()}")
 
-# [BACKGROUND] Auto Crawl Logic (Giữ nguyên)
-async def process_single_topic(topic, crawler, articles_col, topics_col, cutoff_date):
+class TopicHighWater:
+    """
+    [NEW] Mốc high-water của topic: bài MỚI NHẤT (url, article_id, publish_date) đã có trong DB ở lượt trước.
+    Trang chuyên mục xếp mới -> cũ, nên lượt sau dừng ngay khi gặp lại mốc mà không cần tra DB.
+    Cửa sổ an toàn HIGH_WATER_WINDOW_HOURS: bài có ngày nằm ngay dưới mốc (sửa/đăng muộn, đổi thứ tự) vẫn được xét tiếp.
+    """
+
+    def __init__(self, mark: Optional[Dict]):
+        self.mark = mark or {}
+        self.reached = False
+        self.newest: Optional[Dict] = None
+        mark_date = self.mark.get('publish_date')
+        self.window_start = mark_date - datetime.timedelta(hours=HIGH_WATER_WINDOW_HOURS) if mark_date else None
+
+    def should_stop(self, link: Dict) -> bool:
+        """True khi link đã ở sau mốc VÀ ra ngoài cửa sổ an toàn."""
+        if not self.mark: return False
+        if link['url'] == self.mark.get('url'):
+            self.reached = True
+        pub_date = link.get('publish_date')
+        if pub_date is None or self.window_start is None:
+            return self.reached
+        if not self.reached and pub_date > self.mark['publish_date']:
+            return False
+        return pub_date < self.window_start
+
+    def observe(self, url: str, article_id: Optional[str], publish_date):
+        """Ghi nhận bài đã có trong DB (vừa lưu hoặc đã biết) làm ứng viên mốc mới."""
+        if not publish_date: return
+        if self.newest is None or publish_date > self.newest['publish_date']:
+            self.newest = {'url': url, 'article_id': article_id, 'publish_date': publish_date}
+
+    def updated_mark(self) -> Optional[Dict]:
+        if not self.newest: return None
+        if self.mark.get('publish_date') and self.newest['publish_date'] <= self.mark['publish_date']:
+            return None
+        return {**self.newest, 'updated_at': datetime.datetime.now()}
+
+# [BACKGROUND] Auto Crawl Logic
+async def process_single_topic(topic, crawler, articles_col, topics_col, cutoff_date, use_high_water: bool = True):
     async with topic_semaphore: 
         site = topic['website']
         url = topic['url']
+        # [NEW] Có mốc high-water -> dừng theo mốc (không tra DB); chưa có/force -> dùng cutoff theo ngày như cũ
+        high_water = TopicHighWater(topic.get('high_water') if use_high_water else None)
         cutoff_log = cutoff_date.strftime('%d/%m %H:%M')
-        print(f"[AUTO] >> Quét: {topic['name']} | Stop at: {cutoff_log}")
+        mark_log = f" | Mốc: {high_water.mark['publish_date']}" if high_water.mark.get('publish_date') else ""
+        print(f"[AUTO] >> Quét: {topic['name']} | Stop at: {cutoff_log}{mark_log}")
         
-        page = 1
         stop_topic = False
-        new_count = 0
-        
-        while page <= 50 and not stop_topic: 
-            try:
-                soup = await crawler.fetch_category_page(url, page)
-                if not soup: break
-                
-                links = crawler.extract_article_links(soup, is_search_page=False)
-                if not links: break
-                
-                tasks = []
-                for link in links:
-                    url_check = link['url']
+        frontier = get_url_frontier()
+        queued_urls = set()  # Link đã đưa vào pipeline ở lượt này (trang sau có thể lặp lại bài của trang trước)
+        seen_dates = []      # Ngày đăng thấy trên trang danh sách -> ước lượng tốc độ đăng bài của topic
+
+        # [NEW] Trạng thái phân trang lưu trên topic (Zone ID CafeF) -> biết URL trang N ngay, tải song song nhiều trang
+        saved_state = topic.get('listing_state') or {}
+        crawler.load_topic_state(url, saved_state)
+        listing_pages = ListingPrefetcher(
+            lambda page: crawler.fetch_category_page_with_status(url, page),
+            lambda page: crawler.category_page_url(url, page) is not None
+        )
+
+        async def fetch_links(page: int) -> Optional[List[Dict]]:
+            nonlocal stop_topic
+            if stop_topic: return None
+            soup, status = await listing_pages.get(page)
+            if not soup:
+                # 404/410 sau trang 1 = đã qua trang cuối của chuyên mục -> hết trang (dừng đúng)
+                if page > 1 and status in (404, 410): return None
+                # Không tải được trang (5xx/circuit mở/timeout) != đã dừng đúng: báo lỗi để lượt này không dời mốc high-water
+                raise ListingFetchError(f"{url} (trang {page}, HTTP {status})")
+            
+            links = crawler.extract_article_links(soup, is_search_page=False)
+            if not links: return None
+            seen_dates.extend(link['publish_date'] for link in links if link.get('publish_date'))
+            # [NEW] URL đã được chuẩn hóa trong extract_article_links; lưu alias của biến thể
+            await record_aliases(links)
+            
+            # [UPDATE] Một lần tra cứu cho cả trang (seen-set trong RAM + một truy vấn $in) thay cho 2 find_one/link
+            known_urls = await frontier.resolve(articles_col, [link['url'] for link in links])
+            
+            new_links = []
+            for link in links:
+                if high_water.should_stop(link):
+                    print(f"[AUTO] Đã qua mốc high-water ({link.get('publish_date')}). Dừng topic {topic['name']}.")
+                    stop_topic = True
+                    break
+                if link['url'] in known_urls:
+                    # article_id = uuid5 của URL chuẩn -> tính được ngay, không cần đọc DB
+                    high_water.observe(link['url'], article_id_for(link['url']), link.get('publish_date'))
                     if link.get('publish_date') and link['publish_date'] < cutoff_date:
-                        existing_doc = await articles_col.find_one({'url': url_check}, {'search_id': 1})
-                        if existing_doc and 'system_auto' in existing_doc.get('search_id', []):
-                            print(f"[AUTO] Bài cũ ({link['publish_date']}) ĐÃ CÓ 'system_auto'. Dừng topic {topic['name']}.")
-                            stop_topic = True
-                            break
-                        else: pass
-
-                    existing_full = await articles_col.find_one({'url': url_check}, {'search_id': 1})
-                    if existing_full:
-                        if 'system_auto' in existing_full.get('search_id', []): continue 
-                    
-                    tasks.append(crawl_and_process_article(crawler, link, None, site, [], "system_auto", "system"))
-                
-                if tasks:
-                    results = await asyncio.gather(*tasks)
-                    valid_res = [r for r in results if r]
-                    if valid_res:
-                        ops = []
-                        for d in valid_res:
-                            if 'current_search_id' in d: del d['current_search_id']
-                            ops.append(UpdateOne({'url': d['url']}, {'$set': d, '$addToSet': {'search_id': "system_auto"}}, upsert=True))
-                        await articles_col.bulk_write(ops, ordered=False)
-                        for d in valid_res: d['search_id'] = ["system_auto"] 
-                        await sync_to_meilisearch(valid_res)
-                        new_count += len(valid_res)
+                        print(f"[AUTO] Bài cũ ({link['publish_date']}) ĐÃ CÓ 'system_auto'. Dừng topic {topic['name']}.")
+                        stop_topic = True
+                        break
+                    continue
+                if link['url'] in queued_urls: continue
                 
-                page += 1
-                await asyncio.sleep(1)
-            except Exception as e: print(f"[AUTO ERR] {topic['name']}: {e}"); break
+                queued_urls.add(link['url'])
+                new_links.append(link)
+            # Trang toàn bài đã có -> [] (vẫn sang trang sau); chạm mốc cutoff -> lượt gọi sau trả None
+            return new_links
+
+        async def process_link(link: Dict) -> Optional[Dict]:
+            return await crawl_and_process_article(crawler, link, None, site, [], "system_auto", "system")
+
+        async def save_batch(valid_res: List[Dict]):
+            ops = []
+            # [NEW] Đánh dấu bản sao gần trùng trước khi lưu (enrichment_worker sẽ dùng lại kết quả bài gốc)
+            await mark_near_duplicates(articles_col, valid_res)
+            for d in valid_res:
+                if 'current_search_id' in d: del d['current_search_id']
+                ops.append(UpdateOne({'url': d['url']}, {'$set': d, '$addToSet': {'search_id': "system_auto"}}, upsert=True))
+            await articles_col.bulk_write(ops, ordered=False)
+            frontier.add(d['url'] for d in valid_res)
+            for d in valid_res:
+                high_water.observe(d['url'], d.get('article_id'), d.get('publish_date'))
+            for d in valid_res: d['search_id'] = ["system_auto"] 
+            await sync_to_meilisearch(valid_res)
+
+        # [UPDATE] Pipeline liên tục (tải trước trang danh sách, không sleep cố định giữa các trang)
+        # completed = dừng đúng (chạm mốc/cutoff hoặc hết link); lỗi tải trang danh sách / lưu bài -> PipelineError
+        completed = False
+        try:
+            new_count = await run_crawl_pipeline(fetch_links, process_link, save_batch)
+            completed = True
+        except PipelineError as e:
+            print(f"[AUTO ERR] {topic['name']}: {e} (giữ nguyên mốc high-water)")
+            new_count = e.saved
+        except Exception as e:
+            print(f"[AUTO ERR] {topic['name']}: {e}")
+            new_count = 0
+        finally:
+            listing_pages.close()
         
-        await topics_col.update_one({'_id': topic['_id']}, {'$set': {'last_crawled_at': datetime.datetime.now()}})
+        topic_updates = {'last_crawled_at': datetime.datetime.now()}
+        listing_state = crawler.topic_state(url)
+        if listing_state and listing_state != saved_state:
+            topic_updates['listing_state'] = listing_state
+        # Lượt lỗi giữa chừng không dời mốc (tránh bỏ sót bài chưa kịp lưu ở dưới mốc mới)
+        new_mark = high_water.updated_mark() if completed else None
+        if new_mark:
+            topic_updates['high_water'] = new_mark
+        if seen_dates:
+            topic_updates['recent_publish_dates'] = merge_publish_dates(topic.get('recent_publish_dates'), seen_dates)
+        await topics_col.update_one({'_id': topic['_id']}, {'$set': topic_updates})
         if new_count > 0: print(f"[AUTO] << Xong {topic['name']}: +{new_count} bài mới.")
+        return topic_updates
+
+SITE_CRAWLERS = {
+    'vneconomy.vn': VneconomyCrawler,
+    'vnexpress.net': VnExpressCrawler,
+    'cafef.vn': CafeFCrawler,
+}
+
+def topic_cutoff(topic: Dict, now: datetime.datetime, force_days_back: Optional[int] = None) -> datetime.datetime:
+    last_crawled = topic.get('last_crawled_at')
+    if force_days_back:
+        return now - datetime.timedelta(days=force_days_back)
+    if last_crawled:
+        time_diff = now - last_crawled
+        if time_diff.days > 60: return now - datetime.timedelta(days=60)
+        return last_crawled - datetime.timedelta(days=1)
+    return now - datetime.timedelta(days=60)
+
+async def crawl_topic(topic: Dict, force_days_back: Optional[int] = None) -> Optional[Dict]:
+    """[NEW] Một lượt crawl cho MỘT topic (dùng bởi lịch thích ứng và worker hàng đợi)."""
+    crawler_cls = SITE_CRAWLERS.get(topic.get('website'))
+    if not crawler_cls: return None
+    async with borrow_http_pool() as client:
+        return await process_single_topic(
+            topic, crawler_cls(client), get_articles_collection(), get_topics_collection(),
+            topic_cutoff(topic, datetime.datetime.now(), force_days_back), use_high_water=not force_days_back
+        )
+
+async def run_topic_crawl_job(payload: Dict) -> Dict:
+    """[NEW] Handler job 'topic_crawl' (worker.py): crawl topic rồi lưu lịch ghé tiếp theo."""
+    topics_col = get_topics_collection()
+    topic = await topics_col.find_one({'_id': ObjectId(payload['topic_id'])})
+    if not topic or not topic.get('is_active'):
+        return {'skipped': True}
+    updates: Dict = {}
+    try:
+        updates = await crawl_topic(topic, payload.get('force_days_back')) or {}
+    finally:
+        # Lượt lỗi vẫn dời next_crawl_at -> dispatcher không xếp lại topic này mỗi phút (job tự retry theo backoff)
+        schedule = plan_next_visit(topic, updates, payload.get('max_interval') or topic_scheduler.max_interval, datetime.datetime.now())
+        await topics_col.update_one({'_id': topic['_id']}, {'$set': schedule})
+    return {'topic': topic.get('name'), 'crawl_interval_minutes': schedule['crawl_interval_minutes']}
+
+async def enqueue_topic_crawl(topic: Dict, force_days_back: Optional[int] = None) -> Optional[str]:
+    # dedupe theo topic: topic đang chờ/đang chạy ở worker nào đó thì không xếp thêm lượt
+    return await enqueue_job(
+        'topic_crawl',
+        {'topic_id': str(topic['_id']), 'force_days_back': force_days_back, 'max_interval': topic_scheduler.max_interval},
+        dedupe_key=f"topic:{topic['_id']}", priority=1 if force_days_back else 0
+    )
+
+async def dispatch_due_topics():
+    """[NEW] Chế độ hàng đợi: xếp job cho mọi topic đã tới next_crawl_at (worker cập nhật next_crawl_at sau mỗi lượt)."""
+    now = datetime.datetime.now()
+    query = {'is_active': True, '$or': [{'next_crawl_at': {'$lte': now}}, {'next_crawl_at': None}]}
+    try:
+        topics = await get_topics_collection().find(query, {'_id': 1}).to_list(length=None)
+        queued = [job for job in [await enqueue_topic_crawl(t) for t in topics] if job]
+    except Exception as e:
+        print(f"[QUEUE] Dispatch topics failed: {e}"); return
+    if queued: print(f"[QUEUE] Đã xếp {len(queued)}/{len(topics)} topic đến hạn vào hàng đợi.")
+
+async def enqueue_enrichment():
+    # Một job enrichment chờ tại một thời điểm là đủ: mỗi job nhận tối đa 20 bài, worker rảnh sẽ lấy job kế tiếp
+    if await get_articles_collection().find_one({'status': {'$in': ['raw', 'ai_error']}}, {'_id': 1}):
+        await enqueue_job('enrichment', {}, dedupe_key='enrichment')
+
+topic_scheduler = AdaptiveTopicScheduler(crawl_topic, get_topics_collection)
+# [NEW] Mỗi job định kỳ chỉ chạy trên replica đang giữ lease của job đó
+lease_manager = LeaseManager()
+
+def get_topic_scheduler() -> AdaptiveTopicScheduler:
+    return topic_scheduler
+
+def get_lease_manager() -> LeaseManager:
+    return lease_manager
 
 async def execute_topic_crawl(website_filter: Optional[str] = None, force_days_back: int = None):
     filter_log = f"Filter: {website_filter}" if website_filter else "Filter: ALL"
@@ -321,16 +610,19 @@ async def execute_topic_crawl(website_filter: Optional[str] = None, force_days_b
     try: topics = await topics_col.find(query).to_list(length=100)
     except: return
     if not topics: return
+
+    if WORK_QUEUE_ENABLED:
+        # [NEW] API chỉ xếp việc; worker.py thực hiện crawl
+        queued = [job for job in [await enqueue_topic_crawl(t, force_days_back) for t in topics] if job]
+        print(f"--- [AUTO CRAWL] QUEUED {len(queued)}/{len(topics)} topics ---")
+        return
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    async with httpx.AsyncClient(headers=headers, timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
-        crawler_instances = {}
-        if website_filter == 'vneconomy.vn' or website_filter is None: crawler_instances['vneconomy.vn'] = VneconomyCrawler(client)
-        if website_filter == 'vnexpress.net' or website_filter is None: crawler_instances['vnexpress.net'] = VnExpressCrawler(client)
-        if website_filter == 'cafef.vn' or website_filter is None: crawler_instances['cafef.vn'] = CafeFCrawler(client)
+    # [UPDATE] Mượn pool HTTP dùng chung (keep-alive/TLS được tái sử dụng giữa các lần auto-crawl)
+    async with borrow_http_pool() as client:
+        crawler_instances = {
+            site: crawler_cls(client) for site, crawler_cls in SITE_CRAWLERS.items()
+            if website_filter is None or website_filter == site
+        }
         
         tasks = []
         now = datetime.datetime.now()
@@ -338,20 +630,18 @@ async def execute_topic_crawl(website_filter: Optional[str] = None, force_days_b
         for topic in topics:
             site = topic['website']; crawler = crawler_instances.get(site)
             if crawler:
-                last_crawled = topic.get('last_crawled_at')
-                if force_days_back:
-                    topic_cutoff = now - datetime.timedelta(days=force_days_back)
-                elif last_crawled:
-                    time_diff = now - last_crawled
-                    if time_diff.days > 60: topic_cutoff = now - datetime.timedelta(days=60)
-                    else: topic_cutoff = last_crawled - datetime.timedelta(days=1)
-                else: topic_cutoff = now - datetime.timedelta(days=60)
-
-                tasks.append(process_single_topic(topic, crawler, articles_col, topics_col, topic_cutoff))
+                cutoff = topic_cutoff(topic, now, force_days_back)
+                # force_days_back: quét lại toàn bộ khoảng ngày, bỏ qua mốc high-water
+                tasks.append(process_single_topic(topic, crawler, articles_col, topics_col, cutoff, use_high_water=not force_days_back))
         if tasks: await asyncio.gather(*tasks)
     print(f"--- [AUTO CRAWL] END ---")
 
 def reschedule_topic_crawl(minutes: int):
+    if AUTO_CRAWL_MODE == "adaptive" or WORK_QUEUE_ENABLED:
+        # [UPDATE] Lịch thích ứng: giá trị admin đặt là khoảng ghé tối đa của mỗi topic
+        topic_scheduler.set_max_interval(minutes)
+        print(f"[SCHEDULER] Adaptive: khoảng ghé tối đa mỗi topic = {minutes} phút.")
+        return True
     try:
         scheduler.reschedule_job('topic_crawl', trigger=IntervalTrigger(minutes=minutes))
         print(f"[SCHEDULER] Đã cập nhật lịch Auto-Crawl: {minutes} phút/lần.")
@@ -366,10 +656,29 @@ def start_scheduler():
     import threading
     threading.Thread(target=local_ai_service.load_model).start()
     
-    scheduler.add_job(enrichment_worker, IntervalTrigger(seconds=30), id='enrichment', replace_existing=True, max_instances=2)
-    scheduler.add_job(execute_topic_crawl, IntervalTrigger(hours=2), id='topic_crawl', replace_existing=True)
+    # [UPDATE] Mọi replica đều đăng ký job, nhưng chỉ replica giữ lease tương ứng mới thực sự chạy
+    if WORK_QUEUE_ENABLED:
+        # [NEW] Tiến trình API chỉ xếp việc vào hàng đợi Mongo; worker.py crawl/enrich
+        scheduler.add_job(lease_manager.leader_only('enrichment', enqueue_enrichment), IntervalTrigger(seconds=30), id='enrichment', replace_existing=True)
+        scheduler.add_job(lease_manager.leader_only('topic_crawl', dispatch_due_topics), IntervalTrigger(minutes=1), id='topic_crawl', replace_existing=True)
+    else:
+        scheduler.add_job(lease_manager.leader_only('enrichment', enrichment_worker), IntervalTrigger(seconds=30), id='enrichment', replace_existing=True, max_instances=2)
+        if AUTO_CRAWL_MODE == "adaptive":
+            # [NEW] Mỗi topic một lịch riêng theo tốc độ đăng bài (thay cho IntervalTrigger 2 giờ chung)
+            # Vòng lặp lịch chỉ chạy khi giữ lease 'topic_crawl'; mất lease -> dừng, replica mới nạp lịch từ DB
+            lease_manager.register('topic_crawl', on_acquire=topic_scheduler.start, on_release=topic_scheduler.stop)
+        else:
+            scheduler.add_job(lease_manager.leader_only('topic_crawl', execute_topic_crawl), IntervalTrigger(hours=2), id='topic_crawl', replace_existing=True)
+    lease_manager.start()
     scheduler.start()
 
+async def stop_scheduler():
+    # Trả lease trước -> replica khác nhận job ngay ở nhịp gia hạn kế tiếp
+    await lease_manager.stop()
+    await topic_scheduler.stop()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
 
 
 
@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import heapq
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    TOPIC_MIN_INTERVAL_MINUTES, TOPIC_MAX_INTERVAL_MINUTES, TOPIC_DEFAULT_INTERVAL_MINUTES,
+    TOPIC_TARGET_NEW_PER_VISIT, TOPIC_RATE_SAMPLES, SITE_TOPIC_CONCURRENCY, TOPIC_RELOAD_MINUTES
+)
+
+def merge_publish_dates(previous: List[datetime.datetime], seen: List[datetime.datetime]) -> List[datetime.datetime]:
+    """Giữ TOPIC_RATE_SAMPLES ngày đăng mới nhất (không trùng) của topic, mới -> cũ."""
+    merged = {d for d in (previous or []) + (seen or []) if isinstance(d, datetime.datetime)}
+    return sorted(merged, reverse=True)[:TOPIC_RATE_SAMPLES]
+
+def estimate_arrival_rate(publish_dates: List[datetime.datetime], now: datetime.datetime) -> Optional[float]:
+    """
+    Số bài mới / giờ ước lượng từ n ngày đăng gần nhất: n / (now - cũ nhất).
+    Tính tới 'now' -> chuyên mục ngừng đăng bài thì tốc độ tự giảm dần qua các lượt.
+    """
+    if not publish_dates: return None
+    oldest = min(publish_dates)
+    hours = max((now - oldest).total_seconds() / 3600, 1 / 60)
+    return len(publish_dates) / hours
+
+def next_interval_minutes(rate_per_hour: Optional[float], max_minutes: float = TOPIC_MAX_INTERVAL_MINUTES) -> float:
+    """Ghé lại khi kỳ vọng có ~TOPIC_TARGET_NEW_PER_VISIT bài mới, kẹp trong [min, max]."""
+    if not rate_per_hour:
+        return min(TOPIC_DEFAULT_INTERVAL_MINUTES, max_minutes)
+    minutes = TOPIC_TARGET_NEW_PER_VISIT / rate_per_hour * 60
+    return max(TOPIC_MIN_INTERVAL_MINUTES, min(max_minutes, minutes))
+
+def plan_next_visit(topic: Dict, updates: Dict, max_interval: float, now: datetime.datetime) -> Dict:
+    """Lịch ghé tiếp theo của topic sau một lượt crawl (dùng chung cho lịch trong tiến trình và worker hàng đợi)."""
+    dates = updates.get('recent_publish_dates') or topic.get('recent_publish_dates') or []
+    rate = estimate_arrival_rate(dates, now)
+    interval = next_interval_minutes(rate, max_interval)
+    return {
+        'arrival_rate_per_hour': round(rate, 3) if rate else 0.0,
+        'crawl_interval_minutes': round(interval, 1),
+        'next_crawl_at': now + datetime.timedelta(minutes=interval)
+    }
+
+class AdaptiveTopicScheduler:
+    """
+    [NEW] Lịch crawl riêng từng topic thay cho một IntervalTrigger chung:
+    - Hàng đợi ưu tiên (heap) theo next_crawl_at; vòng lặp ngủ tới hạn sớm nhất.
+    - Mỗi site chạy tối đa SITE_TOPIC_CONCURRENCY topic cùng lúc (request vẫn qua limiter theo site);
+      topic đến hạn của site đang bận chờ slot, topic của site khác vẫn được chạy.
+    - Sau mỗi lượt: tốc độ đăng bài (từ publish_date gần nhất) -> khoảng ghé tiếp theo, lưu lên topic.
+    run_topic(topic) -> dict các trường topic vừa cập nhật (có 'recent_publish_dates').
+    """
+
+    def __init__(self, run_topic: Callable[[Dict], Awaitable[Optional[Dict]]], get_topics_collection: Callable):
+        self.run_topic = run_topic
+        self.get_topics_collection = get_topics_collection
+        self.max_interval = TOPIC_MAX_INTERVAL_MINUTES
+        self._heap: List[Tuple[datetime.datetime, str]] = []
+        self._topics: Dict[str, Dict] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._site_busy: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._last_reload: Optional[datetime.datetime] = None
+        self.visits = 0
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        for task in [self._loop_task, *self._running.values()]:
+            if task: task.cancel()
+        self._loop_task = None
+        # Bỏ trạng thái trong RAM: lần start sau (vd: nhận lại lease leader) nạp lịch mới nhất từ DB
+        self._heap.clear(); self._topics.clear(); self._running.clear(); self._site_busy.clear()
+        self._last_reload = None
+
+    def set_max_interval(self, minutes: float):
+        """/admin/schedule: ở chế độ adaptive, giá trị này là khoảng ghé TỐI ĐA của mọi topic."""
+        self.max_interval = max(TOPIC_MIN_INTERVAL_MINUTES, minutes)
+        now = datetime.datetime.now()
+        cap = now + datetime.timedelta(minutes=self.max_interval)
+        self._heap = [(min(due, cap), key) for due, key in self._heap]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    async def _reload_topics(self):
+        topics = await self.get_topics_collection().find({'is_active': True}).to_list(length=None)
+        now = datetime.datetime.now()
+        active = set()
+        for topic in topics:
+            key = str(topic['_id'])
+            active.add(key)
+            known = key in self._topics
+            self._topics[key] = topic
+            if known or key in self._running: continue
+            due = topic.get('next_crawl_at')
+            if not isinstance(due, datetime.datetime):
+                # Topic mới / chưa có lịch: rải đều trong vài phút đầu, tránh dồn request lúc khởi động
+                due = now + datetime.timedelta(seconds=random.uniform(0, 300))
+            heapq.heappush(self._heap, (due, key))
+        for key in list(self._topics):
+            if key not in active:
+                self._topics.pop(key, None)
+        self._heap = [(due, key) for due, key in self._heap if key in active]
+        heapq.heapify(self._heap)
+        self._last_reload = now
+
+    def _dispatch_due(self, now: datetime.datetime):
+        deferred = []
+        while self._heap and self._heap[0][0] <= now:
+            due, key = heapq.heappop(self._heap)
+            topic = self._topics.get(key)
+            if not topic or key in self._running: continue
+            site = topic.get('website')
+            if self._site_busy.get(site, 0) >= SITE_TOPIC_CONCURRENCY:
+                deferred.append((due, key))
+                continue
+            self._site_busy[site] = self._site_busy.get(site, 0) + 1
+            self._running[key] = asyncio.create_task(self._visit(key, topic))
+        for item in deferred:
+            heapq.heappush(self._heap, item)
+
+    async def _visit(self, key: str, topic: Dict):
+        site = topic.get('website')
+        updates: Dict = {}
+        try:
+            updates = await self.run_topic(topic) or {}
+        except Exception as e:
+            print(f"[TOPIC SCHEDULER] {topic.get('name')} error: {e}")
+        finally:
+            self._site_busy[site] = max(0, self._site_busy.get(site, 1) - 1)
+            self._running.pop(key, None)
+
+        schedule = plan_next_visit(topic, updates, self.max_interval, datetime.datetime.now())
+        next_at = schedule['next_crawl_at']
+        try:
+            await self.get_topics_collection().update_one({'_id': topic['_id']}, {'$set': schedule})
+        except Exception as e:
+            print(f"[TOPIC SCHEDULER] Save schedule failed: {e}")
+        self.visits += 1
+        if key in self._topics:
+            self._topics[key].update(updates, **schedule)
+            heapq.heappush(self._heap, (next_at, key))
+        print(f"[TOPIC SCHEDULER] {topic.get('name')}: {schedule['arrival_rate_per_hour']} bài/giờ -> ghé lại sau {schedule['crawl_interval_minutes']:.0f} phút.")
+        self._wakeup.set()
+
+    async def _run_forever(self):
+        while True:
+            try:
+                now = datetime.datetime.now()
+                if not self._last_reload or now - self._last_reload > datetime.timedelta(minutes=TOPIC_RELOAD_MINUTES):
+                    await self._reload_topics()
+                self._dispatch_due(now)
+                timeout = TOPIC_RELOAD_MINUTES * 60
+                # Topic đã đến hạn còn trong heap = site đang bận -> chờ _visit báo xong (wakeup)
+                upcoming = [due for due, _ in self._heap if due > now]
+                if upcoming:
+                    timeout = min(timeout, max(1.0, (min(upcoming) - now).total_seconds()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[TOPIC SCHEDULER] Loop error: {e}")
+                await asyncio.sleep(30)
+
+    def snapshot(self) -> Dict:
+        now = datetime.datetime.now()
+        return {
+            'visits': self.visits,
+            'running': len(self._running),
+            'topics': sorted([
+                {
+                    'name': self._topics[key].get('name'),
+                    'website': self._topics[key].get('website'),
+                    'arrival_rate_per_hour': self._topics[key].get('arrival_rate_per_hour'),
+                    'crawl_interval_minutes': self._topics[key].get('crawl_interval_minutes'),
+                    'due_in_minutes': round((due - now).total_seconds() / 60, 1)
+                }
+                for due, key in self._heap if key in self._topics
+            ], key=lambda t: t['due_in_minutes'])
+        }
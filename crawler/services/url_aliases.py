@@ -0,0 +1,43 @@
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from crawlers.url_canon import canonicalize_url
+from database import get_url_aliases_collection
+
+def article_id_for(url: str) -> str:
+    """article_id = uuid5 của URL CHUẨN (mọi biến thể của một bài cho cùng một id)."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, canonicalize_url(url)))
+
+def _alias_op(alias: str, canonical: str) -> UpdateOne:
+    # _id = URL biến thể -> mỗi alias trỏ về đúng một URL chuẩn
+    return UpdateOne(
+        {'_id': alias},
+        {'$set': {'url': canonical, 'article_id': article_id_for(canonical)}},
+        upsert=True
+    )
+
+async def save_aliases(pairs: Iterable[Tuple[str, str]]):
+    """Ghi hàng loạt cặp (alias, url chuẩn) vào bảng url_aliases."""
+    ops = [_alias_op(alias, canonical) for alias, canonical in pairs if alias and canonical and alias != canonical]
+    if not ops: return
+    try:
+        await get_url_aliases_collection().bulk_write(ops, ordered=False)
+    except Exception as e:
+        print(f"[ALIAS ERROR] {e}")
+
+async def record_aliases(links: List[Dict]):
+    """
+    [NEW] Gọi ngay sau extract_article_links: tách 'raw_url' khỏi link (không lưu vào bài)
+    và ghi cặp raw_url -> url chuẩn vào bảng alias.
+    """
+    pairs = [(link.pop('raw_url'), link['url']) for link in links if 'raw_url' in link]
+    await save_aliases(pairs)
+
+async def resolve_canonical(url: str) -> Optional[str]:
+    """URL bất kỳ (kể cả biến thể đã gặp trước khi có bộ chuẩn hóa) -> URL chuẩn đang dùng trong `articles`."""
+    if not url: return url
+    doc = await get_url_aliases_collection().find_one({'_id': url}, {'url': 1})
+    if doc: return doc['url']
+    return canonicalize_url(url)
@@ -0,0 +1,54 @@
+import hashlib
+from typing import Iterable, List, Set
+
+from config import FRONTIER_WARM_BATCH
+
+AUTO_SEARCH_ID = "system_auto"
+
+def _url_key(url: str) -> bytes:
+    # 8 byte/URL thay vì cả chuỗi URL -> vài trăm nghìn URL chỉ tốn vài MB RAM
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+
+class UrlFrontier:
+    """
+    [NEW] Tập URL đã được auto-crawl (search_id chứa 'system_auto') dùng chung toàn tiến trình.
+    - warm(): nạp từ Mongo lúc khởi động.
+    - resolve(): link có trong tập -> biết ngay, không chạm DB; phần còn lại tra bằng MỘT truy vấn $in.
+    - add(): cập nhật ngay khi bài được lưu.
+    """
+
+    def __init__(self):
+        self._seen: Set[bytes] = set()
+        self.warmed = False
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add(self, urls: Iterable[str]):
+        self._seen.update(_url_key(u) for u in urls if u)
+
+    def contains(self, url: str) -> bool:
+        return _url_key(url) in self._seen
+
+    async def warm(self, articles_col):
+        cursor = articles_col.find({'search_id': AUTO_SEARCH_ID}, {'url': 1, '_id': 0}).batch_size(FRONTIER_WARM_BATCH)
+        async for doc in cursor:
+            if doc.get('url'): self._seen.add(_url_key(doc['url']))
+        self.warmed = True
+        print(f"[FRONTIER] Warmed {len(self._seen)} URLs.")
+
+    async def resolve(self, articles_col, urls: List[str]) -> Set[str]:
+        """Trả về tập URL (trong `urls`) đã được auto-crawl."""
+        known = {u for u in urls if self.contains(u)}
+        unknown = [u for u in urls if u not in known]
+        if unknown:
+            cursor = articles_col.find({'url': {'$in': unknown}, 'search_id': AUTO_SEARCH_ID}, {'url': 1, '_id': 0})
+            found = [doc['url'] async for doc in cursor]
+            self.add(found)
+            known.update(found)
+        return known
+
+url_frontier = UrlFrontier()
+
+def get_url_frontier() -> UrlFrontier:
+    return url_frontier
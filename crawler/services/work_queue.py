@@ -0,0 +1,137 @@
+import datetime
+import os
+import socket
+import uuid
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY
+from database import get_jobs_collection
+
+JOB_KINDS = ("topic_crawl", "search_crawl", "enrichment")
+
+def make_worker_id() -> str:
+    """host:pid:ngẫu nhiên -> phân biệt được nhiều worker trên nhiều node."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+async def ensure_job_indexes():
+    col = get_jobs_collection()
+    await col.create_index([('status', 1), ('kind', 1), ('priority', -1), ('run_after', 1)])
+    await col.create_index('lease_expires_at', sparse=True)
+    # Một job ĐANG CHỜ/ĐANG CHẠY cho mỗi dedupe_key (vd: 'topic:<id>') -> nhiều API replica enqueue cũng không nhân đôi việc
+    await col.create_index('dedupe_key', unique=True, partialFilterExpression={'active': True})
+
+async def enqueue_job(kind: str, payload: Dict, dedupe_key: Optional[str] = None, priority: int = 0,
+                      run_after: Optional[datetime.datetime] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> Optional[str]:
+    """
+    [NEW] Đưa việc vào hàng đợi Mongo (API process chỉ gọi hàm này, worker.py mới chạy việc).
+    Trả về _id job; None nếu đã có job cùng dedupe_key đang chờ/chạy.
+    """
+    now = datetime.datetime.utcnow()
+    doc = {
+        '_id': uuid.uuid4().hex,
+        'kind': kind,
+        'payload': payload,
+        'status': 'queued',
+        'active': True,
+        'priority': priority,
+        'run_after': run_after or now,
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'created_at': now,
+        'updated_at': now,
+    }
+    if dedupe_key:
+        doc['dedupe_key'] = dedupe_key
+    try:
+        await get_jobs_collection().insert_one(doc)
+    except DuplicateKeyError:
+        return None
+    return doc['_id']
+
+async def claim_job(worker_id: str, kinds: List[str]) -> Optional[Dict]:
+    """
+    Lấy NGUYÊN TỬ một job (find_one_and_update): job đang chờ tới hạn, hoặc job 'running' đã hết lease
+    (worker cũ chết/treo) còn lượt -> lấy lại. Ưu tiên priority cao, rồi tới hạn sớm.
+    Job hết lease mà đã dùng hết max_attempts (vd: job làm worker crash mỗi lần chạy) -> 'failed', không lấy lại.
+    """
+    now = datetime.datetime.utcnow()
+    col = get_jobs_collection()
+    await col.update_many(
+        {
+            'kind': {'$in': kinds},
+            'status': 'running',
+            'lease_expires_at': {'$lt': now},
+            '$expr': {'$gte': ['$attempts', '$max_attempts']}
+        },
+        {'$set': {'status': 'failed', 'last_error': 'lease expired (hết lượt thử)', 'finished_at': now, 'updated_at': now},
+         '$unset': {'active': '', 'lease_expires_at': ''}}
+    )
+    return await col.find_one_and_update(
+        {
+            'kind': {'$in': kinds},
+            '$or': [
+                {'status': 'queued', 'run_after': {'$lte': now}},
+                {'status': 'running', 'lease_expires_at': {'$lt': now},
+                 '$expr': {'$lt': ['$attempts', '$max_attempts']}},
+            ]
+        },
+        {
+            '$set': {
+                'status': 'running',
+                'lease_owner': worker_id,
+                'lease_expires_at': now + datetime.timedelta(seconds=JOB_LEASE_SECONDS),
+                'heartbeat_at': now,
+                'started_at': now,
+                'updated_at': now,
+            },
+            '$inc': {'attempts': 1}
+        },
+        sort=[('priority', -1), ('run_after', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def heartbeat_job(job_id: str, worker_id: str) -> bool:
+    """Gia hạn lease; False = lease đã mất (job bị worker khác lấy lại) -> nên dừng việc."""
+    now = datetime.datetime.utcnow()
+    res = await get_jobs_collection().update_one(
+        {'_id': job_id, 'lease_owner': worker_id, 'status': 'running'},
+        {'$set': {'lease_expires_at': now + datetime.timedelta(seconds=JOB_LEASE_SECONDS), 'heartbeat_at': now}}
+    )
+    return res.modified_count == 1
+
+async def complete_job(job_id: str, worker_id: str, result: Optional[Dict] = None):
+    now = datetime.datetime.utcnow()
+    await get_jobs_collection().update_one(
+        {'_id': job_id, 'lease_owner': worker_id},
+        {'$set': {'status': 'done', 'result': result or {}, 'finished_at': now, 'updated_at': now},
+         '$unset': {'active': '', 'lease_expires_at': ''}}
+    )
+
+async def fail_job(job: Dict, worker_id: str, error: str):
+    """Còn lượt -> quay lại hàng đợi sau backoff lũy thừa; hết lượt -> 'failed'."""
+    now = datetime.datetime.utcnow()
+    attempts = job.get('attempts', 1)
+    if attempts < job.get('max_attempts', JOB_MAX_ATTEMPTS):
+        delay = JOB_RETRY_BASE_DELAY * (2 ** (attempts - 1))
+        update = {'$set': {'status': 'queued', 'run_after': now + datetime.timedelta(seconds=delay),
+                           'last_error': error, 'updated_at': now},
+                  '$unset': {'lease_owner': '', 'lease_expires_at': ''}}
+    else:
+        update = {'$set': {'status': 'failed', 'last_error': error, 'finished_at': now, 'updated_at': now},
+                  '$unset': {'active': '', 'lease_expires_at': ''}}
+    await get_jobs_collection().update_one({'_id': job['_id'], 'lease_owner': worker_id}, update)
+
+async def snapshot_jobs() -> Dict:
+    """Số job theo kind/status + các job đang chạy (worker nào giữ lease)."""
+    col = get_jobs_collection()
+    counts: Dict[str, Dict[str, int]] = {}
+    async for row in col.aggregate([{'$group': {'_id': {'kind': '$kind', 'status': '$status'}, 'n': {'$sum': 1}}}]):
+        counts.setdefault(row['_id']['kind'], {})[row['_id']['status']] = row['n']
+    running = await col.find(
+        {'status': 'running'},
+        {'kind': 1, 'dedupe_key': 1, 'lease_owner': 1, 'lease_expires_at': 1, 'attempts': 1, 'started_at': 1}
+    ).to_list(100)
+    return {'counts': counts, 'running': running}
@@ -1,11 +1,35 @@
 import asyncio
 from qdrant_client import AsyncQdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-from config import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, HnswConfigDiff, KeywordIndexParams, KeywordIndexType, VectorParamsDiff, CollectionParamsDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig, Disabled
+)
+from config import (
+    QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION,
+    QDRANT_QUANTIZATION, QDRANT_ON_DISK_VECTORS, QDRANT_ON_DISK_PAYLOAD,
+    QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, QDRANT_HNSW_PAYLOAD_M
+)
 
 VECTOR_SIZE = 384
+QUANTIZATION_PROFILES = ("float32", "scalar", "binary")
 
-async def setup_qdrant_collection(recreate: bool = False):
+def build_quantization_config(profile: str):
+    if profile == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if profile == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def resolve_on_disk_vectors(profile: str) -> bool:
+    if QDRANT_ON_DISK_VECTORS == "auto":
+        return profile != "float32"
+    return QDRANT_ON_DISK_VECTORS == "true"
+
+def build_hnsw_config():
+    # payload_m: dựng thêm HNSW riêng cho từng tenant user_id (dữ liệu my_page)
+    return HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT, payload_m=QDRANT_HNSW_PAYLOAD_M)
+
+async def setup_qdrant_collection(recreate: bool = False, profile: str = QDRANT_QUANTIZATION):
 
     print(f"[SETUP] Đang kết nối tới Qdrant: {QDRANT_URL}...")
     
@@ -24,15 +48,28 @@ async def setup_qdrant_collection(recreate: bool = False):
                 await client.delete_collection(collection_name=QDRANT_COLLECTION)
             else:
                 print("[INFO] Giữ nguyên dữ liệu hiện có. LƯU Ý: Nếu kích thước vector thay đổi, bạn CẦN chạy lại với --reset.")
+                # [NEW] Áp dụng profile bộ nhớ cho collection đang có (không mất dữ liệu)
+                await client.update_collection(
+                    collection_name=QDRANT_COLLECTION,
+                    vectors_config={"": VectorParamsDiff(on_disk=resolve_on_disk_vectors(profile))},
+                    hnsw_config=build_hnsw_config(),
+                    quantization_config=build_quantization_config(profile) or Disabled.DISABLED,
+                    collection_params=CollectionParamsDiff(on_disk_payload=QDRANT_ON_DISK_PAYLOAD)
+                )
+                print(f"[INFO] Đã áp dụng profile '{profile}' cho collection hiện có.")
 
         if not exists or recreate:
-            print(f"[SETUP] Đang tạo Collection '{QDRANT_COLLECTION}' với size={VECTOR_SIZE}...")
+            print(f"[SETUP] Đang tạo Collection '{QDRANT_COLLECTION}' với size={VECTOR_SIZE}, profile={profile}...")
             await client.create_collection(
                 collection_name=QDRANT_COLLECTION,
                 vectors_config=VectorParams(
                     size=VECTOR_SIZE, 
-                    distance=Distance.COSINE 
-                )
+                    distance=Distance.COSINE,
+                    on_disk=resolve_on_disk_vectors(profile)
+                ),
+                hnsw_config=build_hnsw_config(),
+                quantization_config=build_quantization_config(profile),
+                on_disk_payload=QDRANT_ON_DISK_PAYLOAD
             )
             print("[SUCCESS] Đã tạo Collection thành công.")
 
@@ -41,7 +78,15 @@ async def setup_qdrant_collection(recreate: bool = False):
         await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="article_id", field_schema="keyword")
         await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="type", field_schema="keyword")
         await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="website", field_schema="keyword")
-        await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="user_id", field_schema="keyword")
+        # [NEW] user_id là khóa tenant: dữ liệu my_page của từng user được gom cụm & có HNSW riêng (payload_m)
+        await client.create_payload_index(
+            collection_name=QDRANT_COLLECTION, field_name="user_id",
+            field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+        )
+        await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="update_id", field_schema="keyword")
+        # [NEW] Trường chuẩn hóa cho bộ lọc topic/sentiment của chatbot
+        await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="topic_norm", field_schema="keyword")
+        await client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="sentiment_norm", field_schema="keyword")
 
         print("[SUCCESS] Hoàn tất cấu hình Qdrant!")
         await client.close()
@@ -56,5 +101,13 @@ if __name__ == "__main__":
         print("[WARN] --reset được kích hoạt → XÓA collection cũ.")
         should_recreate = True
 
+    # python setup_qdrant.py [--reset] [--profile=float32|scalar|binary]
+    selected_profile = QDRANT_QUANTIZATION
+    for arg in sys.argv[1:]:
+        if arg.startswith("--profile="):
+            selected_profile = arg.split("=", 1)[1]
+    if selected_profile not in QUANTIZATION_PROFILES:
+        print(f"[ERROR] Profile không hợp lệ: {selected_profile}. Chọn một trong {QUANTIZATION_PROFILES}")
+        sys.exit(1)
 
-    asyncio.run(setup_qdrant_collection(recreate=should_recreate))
\ No newline at end of file
+    asyncio.run(setup_qdrant_collection(recreate=should_recreate, profile=selected_profile))
@@ -1,6 +1,7 @@
 import datetime
 import re
-from typing import Optional, List, Dict
+import unicodedata
+from typing import Optional, List, Dict, Union
 import uuid
 from config import CHUNK_SIZE_CHARS
 
@@ -72,4 +73,45 @@ def split_text_into_chunks(article_id: str, content: str) -> List[Dict]:
         chunks.append(chunk_data)
         chunk_index += 1
         
-    return chunks
\ No newline at end of file
+    return chunks
+
+# [NEW] Chuẩn hóa từ khóa cho các trường lọc *_norm trong Qdrant
+SENTIMENT_NORM_LABELS = {
+    "tich cuc": "positive", "positive": "positive",
+    "tieu cuc": "negative", "negative": "negative",
+    "trung tinh": "neutral", "neutral": "neutral",
+}
+
+def normalize_keyword(value: str) -> str:
+    """
+    Chuẩn hóa từ khóa để so khớp chính xác (MatchValue):
+    Unicode NFKD, bỏ dấu (kể cả 'đ'), chữ thường, gộp khoảng trắng.
+    VD: '  Bất  Động Sản ' -> 'bat dong san'
+    """
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace("đ", "d").replace("Đ", "D").lower()
+    return " ".join(text.split())
+
+def normalize_topics(topics: Union[str, List[str], None]) -> List[str]:
+    if not topics:
+        return []
+    if isinstance(topics, str):
+        topics = [topics]
+    normalized = []
+    for topic in topics:
+        norm = normalize_keyword(topic)
+        if norm and norm not in normalized:
+            normalized.append(norm)
+    return normalized
+
+def normalize_sentiment(label: Optional[str] = None) -> Optional[str]:
+    """
+    Gộp nhãn AI ('Tích cực', 'Positive'...) về một bộ nhãn: positive | negative | neutral.
+    Không có nhãn -> None (không suy từ sentiment_score: đó là độ tin cậy của model trong [0, 1], không phải cực tính).
+    """
+    if not label:
+        return None
+    return SENTIMENT_NORM_LABELS.get(normalize_keyword(label))
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import signal
+import sys
+import traceback
+from typing import Dict, List
+
+from database import (
+    connect_to_mongo, close_connections, connect_external_services, get_articles_collection
+)
+from config import JOB_HEARTBEAT_SECONDS, WORKER_POLL_SECONDS, WORKER_CONCURRENCY
+from crawlers.http_pool import open_http_pool, close_http_pool
+from crawlers.extraction_pool import start_extraction_pool, shutdown_extraction_pool
+from schemas import CrawlParams
+from services.url_frontier import get_url_frontier
+from services.near_dup import ensure_near_dup_index, snapshot_enrichment_stats
+from services.crawler_service import run_search_crawl
+from services.embedding_service import get_embedding_service
+from services.scheduler_service import SITE_CRAWLERS, run_topic_crawl_job, enrichment_worker
+from services.work_queue import (
+    JOB_KINDS, make_worker_id, ensure_job_indexes, claim_job, heartbeat_job, complete_job, fail_job
+)
+
+# Cách chạy (nhiều worker cùng trỏ vào một Mongo; API đặt WORK_QUEUE_ENABLED=true để chỉ xếp việc):
+#   python worker.py                                    # mọi loại job
+#   python worker.py --kinds topic_crawl,search_crawl   # worker chỉ crawl (không nạp model AI)
+#   python worker.py --kinds enrichment --concurrency 1 # worker chỉ enrich
+# Thử cục bộ: mở 2-3 terminal chạy worker.py, gọi /admin/auto-crawl/... rồi xem /admin/jobs
+# (mỗi job chỉ một worker giữ lease; tắt ngang một worker thì job của nó được worker khác lấy lại sau JOB_LEASE_SECONDS).
+
+async def handle_search_crawl(payload: Dict) -> Dict:
+    params = CrawlParams(**payload['params'])
+    crawlers_map = {site: SITE_CRAWLERS[site](None) for site in payload['sites'] if site in SITE_CRAWLERS}
+    total = await run_search_crawl(crawlers_map, params, payload['search_id'], payload.get('total_found_in_db', 0))
+    return {'total_saved': total}
+
+async def handle_enrichment(payload: Dict) -> Dict:
+    await enrichment_worker()
+    return {'enrichment': snapshot_enrichment_stats()}
+
+JOB_HANDLERS = {
+    'topic_crawl': run_topic_crawl_job,
+    'search_crawl': handle_search_crawl,
+    'enrichment': handle_enrichment,
+}
+
+class QueueWorker:
+    """Lấy job theo lease, chạy kèm heartbeat; mất lease (worker khác đã lấy lại) thì hủy job đang chạy."""
+
+    def __init__(self, kinds: List[str], concurrency: int):
+        self.kinds = kinds
+        self.concurrency = concurrency
+        self.worker_id = make_worker_id()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        print(f"[WORKER {self.worker_id}] Nhận tín hiệu dừng, chờ job đang chạy hoàn tất...")
+        self._stopping.set()
+
+    async def _heartbeat(self, job: Dict, task: asyncio.Task):
+        while not task.done():
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await heartbeat_job(job['_id'], self.worker_id):
+                    print(f"[WORKER {self.worker_id}] Mất lease job {job['_id']} -> hủy.")
+                    task.cancel()
+                    return
+            except Exception as e:
+                # Lỗi mạng tạm thời: thử lại ở nhịp sau (lease còn hiệu lực tới JOB_LEASE_SECONDS)
+                print(f"[WORKER {self.worker_id}] Heartbeat error: {e}")
+
+    async def _run_job(self, job: Dict):
+        print(f"[WORKER {self.worker_id}] Job {job['kind']} {job['_id']} (lần {job['attempts']})")
+        task = asyncio.create_task(JOB_HANDLERS[job['kind']](job.get('payload') or {}))
+        beat = asyncio.create_task(self._heartbeat(job, task))
+        try:
+            result = await task
+            await complete_job(job['_id'], self.worker_id, result)
+        except asyncio.CancelledError:
+            # Mất lease: job đã thuộc worker khác, không ghi trạng thái
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            await fail_job(job, self.worker_id, f"{type(e).__name__}: {e}")
+        finally:
+            beat.cancel()
+
+    async def _slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await claim_job(self.worker_id, self.kinds)
+            except Exception as e:
+                print(f"[WORKER {self.worker_id}] Claim error: {e}")
+                job = None
+            if job:
+                await self._run_job(job)
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        print(f"[WORKER {self.worker_id}] Kinds: {self.kinds} | concurrency: {self.concurrency}")
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+
+async def main(kinds: List[str], concurrency: int):
+    await connect_to_mongo()
+    await connect_external_services()
+    await ensure_job_indexes()
+    await open_http_pool()
+    start_extraction_pool()
+    frontier_warmup = None
+    if {'topic_crawl', 'search_crawl'} & set(kinds):
+        frontier_warmup = asyncio.create_task(get_url_frontier().warm(get_articles_collection()))
+        await ensure_near_dup_index(get_articles_collection())
+    if 'enrichment' in kinds:
+        from services.ai_service import local_ai_service
+        await asyncio.to_thread(get_embedding_service().load_model)
+        await asyncio.to_thread(local_ai_service.load_model)
+
+    worker = QueueWorker(kinds, concurrency)
+    if sys.platform != 'win32':
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        if frontier_warmup: frontier_warmup.cancel()
+        await close_http_pool()
+        shutdown_extraction_pool()
+        await close_connections()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker xử lý hàng đợi crawl/enrichment trên Mongo")
+    parser.add_argument("--kinds", default=",".join(JOB_KINDS), help="Danh sách loại job, phân tách bằng dấu phẩy")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip() in JOB_HANDLERS]
+    if not kinds:
+        parser.error(f"--kinds phải thuộc {list(JOB_HANDLERS)}")
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main(kinds, args.concurrency))